@@ -1,13 +1,28 @@
 import streamlit as st
-import pandas as pd
+import csv
+import io
 import json
-import os
 from datetime import datetime, date
-import plotly.express as px
-import plotly.graph_objects as go
-from typing import Dict, List, Tuple
-import numpy as np
-import google.generativeai as genai
+
+from financeia import (
+    BASE_CURRENCY,
+    CHART_BACKENDS,
+    DEFAULT_CHART_BACKEND,
+    DURABILITY_MODES,
+    EXPENSE_CATEGORIES,
+    INCOME_CATEGORIES,
+    RECURRING_FREQUENCIES,
+    ConversationSession,
+    GeminiFinancialAI,
+    format_amount,
+    month_label,
+    pdf_available,
+    render_statement_html,
+    render_statement_pdf,
+)
+
+# Pares de posibles duplicados que se muestran a la vez en el historial
+DUPLICATES_PAGE_SIZE = 20
 
 # Configuración de la página
 st.set_page_config(
@@ -133,263 +148,6 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Archivo para almacenar los datos
-DATA_FILE = "financial_data.json"
-CONFIG_FILE = "config.json"
-
-class GeminiFinancialAI:
-    def __init__(self):
-        self.data = self.load_data()
-        self.config = self.load_config()
-        # Guardar datos corregidos si hubo cambios en los IDs
-        self.save_data()
-        self.setup_gemini()
-
-    def load_config(self) -> Dict:
-        """Carga la configuración desde el archivo local"""
-        if os.path.exists(CONFIG_FILE):
-            try:
-                with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except:
-                return {"gemini_api_key": ""}
-        return {"gemini_api_key": ""}
-
-    def save_config(self):
-        """Guarda la configuración en el archivo local"""
-        with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
-            json.dump(self.config, f, ensure_ascii=False, indent=2)
-
-    def setup_gemini(self):
-        """Configura la API de Gemini"""
-        if self.config.get("gemini_api_key"):
-            try:
-                genai.configure(api_key=self.config["gemini_api_key"])
-
-                # Lista de modelos a probar en orden de preferencia
-                models_to_try = [
-                    'gemini-2.0-flash-exp',
-                    'gemini-1.5-flash',
-                    'gemini-1.5-pro',
-                    'models/gemini-2.0-flash-exp',
-                    'models/gemini-1.5-flash',
-                    'models/gemini-1.5-pro'
-                ]
-
-                for model_name in models_to_try:
-                    try:
-                        self.model = genai.GenerativeModel(model_name)
-                        self.gemini_available = True
-                        self.model_name = model_name
-                        st.success(f"✅ Conectado con {model_name}")
-                        break
-                    except Exception as model_error:
-                        continue
-
-                if not hasattr(self, 'gemini_available') or not self.gemini_available:
-                    self.gemini_available = False
-                    st.error("❌ No se encontró ningún modelo disponible")
-
-            except Exception as e:
-                self.gemini_available = False
-                st.error(f"Error al configurar Gemini: {str(e)}")
-        else:
-            self.gemini_available = False
-
-    def set_api_key(self, api_key: str):
-        """Establece la API key de Gemini"""
-        self.config["gemini_api_key"] = api_key
-        self.save_config()
-        self.setup_gemini()
-
-    def load_data(self) -> Dict:
-        """Carga los datos desde el archivo local"""
-        if os.path.exists(DATA_FILE):
-            try:
-                with open(DATA_FILE, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    # Corregir IDs duplicados
-                    self._fix_duplicate_ids(data)
-                    return data
-            except:
-                return {"income": [], "expenses": [], "goals": [], "user_profile": {}}
-        return {"income": [], "expenses": [], "goals": [], "user_profile": {}}
-
-    def _fix_duplicate_ids(self, data: Dict):
-        """Corrige IDs duplicados en los datos"""
-        # Corregir IDs de ingresos
-        for i, income in enumerate(data.get("income", [])):
-            income["id"] = i + 1
-
-        # Corregir IDs de gastos
-        for i, expense in enumerate(data.get("expenses", [])):
-            expense["id"] = i + 1
-
-    def save_data(self):
-        """Guarda los datos en el archivo local"""
-        with open(DATA_FILE, 'w', encoding='utf-8') as f:
-            json.dump(self.data, f, ensure_ascii=False, indent=2)
-
-    def add_income(self, amount: float, source: str, date_str: str, category: str = "Salario"):
-        """Añade un ingreso"""
-        # Calcular ID único basado en el máximo existente
-        existing_ids = [item["id"] for item in self.data["income"]] if self.data["income"] else [0]
-        new_id = max(existing_ids) + 1 if existing_ids else 1
-
-        income_entry = {
-            "amount": amount,
-            "source": source,
-            "date": date_str,
-            "category": category,
-            "id": new_id
-        }
-        self.data["income"].append(income_entry)
-        self.save_data()
-
-    def add_expense(self, amount: float, description: str, date_str: str, category: str):
-        """Añade un gasto"""
-        # Calcular ID único basado en el máximo existente
-        existing_ids = [item["id"] for item in self.data["expenses"]] if self.data["expenses"] else [0]
-        new_id = max(existing_ids) + 1 if existing_ids else 1
-
-        expense_entry = {
-            "amount": amount,
-            "description": description,
-            "date": date_str,
-            "category": category,
-            "id": new_id
-        }
-        self.data["expenses"].append(expense_entry)
-        self.save_data()
-
-    def set_user_profile(self, profile: Dict):
-        """Establece el perfil del usuario"""
-        self.data["user_profile"] = profile
-        self.save_data()
-
-    def delete_income(self, income_id: int):
-        """Elimina un ingreso por su ID"""
-        self.data["income"] = [item for item in self.data["income"] if item["id"] != income_id]
-        self.save_data()
-
-    def delete_expense(self, expense_id: int):
-        """Elimina un gasto por su ID"""
-        self.data["expenses"] = [item for item in self.data["expenses"] if item["id"] != expense_id]
-        self.save_data()
-
-    def get_total_income(self) -> float:
-        """Calcula el total de ingresos"""
-        return sum(item["amount"] for item in self.data["income"])
-
-    def get_total_expenses(self) -> float:
-        """Calcula el total de gastos"""
-        return sum(item["amount"] for item in self.data["expenses"])
-
-    def get_balance(self) -> float:
-        """Calcula el balance actual"""
-        return self.get_total_income() - self.get_total_expenses()
-
-    def get_expenses_by_category(self) -> Dict[str, float]:
-        """Agrupa gastos por categoría"""
-        categories = {}
-        for expense in self.data["expenses"]:
-            category = expense["category"]
-            categories[category] = categories.get(category, 0) + expense["amount"]
-        return categories
-
-    def get_financial_summary(self) -> str:
-        """Genera un resumen financiero para Gemini"""
-        total_income = self.get_total_income()
-        total_expenses = self.get_total_expenses()
-        balance = self.get_balance()
-        expenses_by_category = self.get_expenses_by_category()
-
-        profile = self.data.get("user_profile", {})
-
-        summary = f"""
-        PERFIL FINANCIERO DEL USUARIO:
-
-        INFORMACIÓN PERSONAL:
-        - Edad: {profile.get('age', 'No especificada')}
-        - Ocupación: {profile.get('occupation', 'No especificada')}
-        - Situación familiar: {profile.get('family_status', 'No especificada')}
-        - Objetivos financieros: {profile.get('financial_goals', 'No especificados')}
-
-        RESUMEN FINANCIERO ACTUAL:
-        - Ingresos totales: S/{total_income:,.2f}
-        - Gastos totales: S/{total_expenses:,.2f}
-        - Balance actual: S/{balance:,.2f}
-        - Tasa de ahorro: {(balance/total_income*100) if total_income > 0 else 0:.1f}%
-
-        DISTRIBUCIÓN DE GASTOS POR CATEGORÍA:
-        """
-
-        for category, amount in expenses_by_category.items():
-            percentage = (amount / total_expenses * 100) if total_expenses > 0 else 0
-            summary += f"- {category}: S/{amount:,.2f} ({percentage:.1f}%)\n"
-
-        recent_expenses = sorted(self.data["expenses"], key=lambda x: x["date"], reverse=True)[:10]
-        if recent_expenses:
-            summary += "\nGASTOS RECIENTES (ÚLTIMOS 10):\n"
-            for expense in recent_expenses:
-                summary += f"- {expense['date']}: {expense['description']} - S/{expense['amount']:,.2f} ({expense['category']})\n"
-
-        recent_income = sorted(self.data["income"], key=lambda x: x["date"], reverse=True)[:5]
-        if recent_income:
-            summary += "\nINGRESOS RECIENTES (ÚLTIMOS 5):\n"
-            for income in recent_income:
-                summary += f"- {income['date']}: {income['source']} - S/{income['amount']:,.2f} ({income['category']})\n"
-
-        return summary
-
-    def get_gemini_analysis(self) -> str:
-        """Obtiene análisis de Gemini - FUNCIÓN SÍNCRONA"""
-        if not self.gemini_available or not hasattr(self, 'model'):
-            return "❌ Gemini no está disponible. Por favor configura tu API key."
-
-        if self.get_total_income() == 0 and len(self.data["expenses"]) == 0:
-            return "📝 No hay datos suficientes para realizar un análisis. Comienza registrando tus ingresos y gastos."
-
-        try:
-            financial_summary = self.get_financial_summary()
-            prompt = f"""Eres un experto asesor financiero personal. Analiza esta información financiera y proporciona:
-
-1. ANÁLISIS DETALLADO de la situación financiera actual
-2. RECOMENDACIONES ESPECÍFICAS para mejorar las finanzas
-3. ÁREAS DE OPTIMIZACIÓN identificando gastos innecesarios
-4. ESTRATEGIAS DE AHORRO personalizadas
-
-INFORMACIÓN FINANCIERA:
-{financial_summary}
-
-Responde en español con emojis y estructura clara."""
-
-            response = self.model.generate_content(prompt)
-            return response.text
-
-        except Exception as e:
-            return f"❌ Error: {str(e)}"
-
-    def get_specific_recommendation(self, question: str) -> str:
-        """Obtiene una recomendación específica de Gemini - FUNCIÓN SÍNCRONA"""
-        if not self.gemini_available or not hasattr(self, 'model'):
-            return "❌ Gemini no está disponible. Por favor configura tu API key."
-
-        try:
-            financial_summary = self.get_financial_summary()
-            prompt = f"""Eres un asesor financiero personal. Responde esta pregunta: "{question}"
-
-Basándote en esta información financiera:
-{financial_summary}
-
-Proporciona una respuesta práctica y personalizada en español con emojis."""
-
-            response = self.model.generate_content(prompt)
-            return response.text
-
-        except Exception as e:
-            return f"❌ Error: {str(e)}"
-
 def main():
     # Header moderno y atractivo
     st.markdown("""
@@ -409,6 +167,15 @@ def main():
         st.session_state.financial_ai = GeminiFinancialAI()
 
     ai = st.session_state.financial_ai
+    show_gemini_status(ai)
+    if ai.persistence.last_error:
+        st.warning(f"⚠️ No se pudieron guardar los últimos cambios: {ai.persistence.last_error}")
+    # Traer lo que otras pestañas o sesiones guardaron (solo lo nuevo, sin recargar todo)
+    synced = ai.sync()
+    if synced:
+        st.toast(f"🔄 Se incorporaron {synced} cambios hechos en otra pestaña o sesión")
+    # Generar los movimientos recurrentes vencidos (no hace nada si ya se generaron hoy)
+    ai.materialize_recurring()
 
     # Verificar configuración de API
     if not ai.gemini_available:
@@ -432,6 +199,7 @@ def main():
             "📝 Ingresar Datos": "Ingresar Datos",
             "🧠 Análisis IA": "Análisis con Gemini",
             "💬 Consultas": "Consulta Personalizada",
+            "🎯 Presupuestos": "Presupuestos y Metas",
             "👤 Mi Perfil": "Perfil de Usuario",
             "📚 Historial": "Historial",
             "⚙️ Configuración": "Configuración"
@@ -450,6 +218,8 @@ def main():
         show_gemini_analysis(ai)
     elif page == "Consulta Personalizada":
         show_custom_query(ai)
+    elif page == "Presupuestos y Metas":
+        show_budgets_goals(ai)
     elif page == "Perfil de Usuario":
         show_user_profile(ai)
     elif page == "Historial":
@@ -457,6 +227,16 @@ def main():
     elif page == "Configuración":
         show_settings(ai)
 
+def show_gemini_status(ai: GeminiFinancialAI):
+    """Muestra (una sola vez) el último mensaje de conexión con Gemini"""
+    if ai.gemini_status:
+        level, message = ai.gemini_status
+        ai.gemini_status = None
+        if level == "success":
+            st.success(message)
+        else:
+            st.error(message)
+
 def show_api_setup(ai: GeminiFinancialAI):
     """Muestra la configuración de la API de Gemini"""
     st.markdown("""
@@ -492,6 +272,7 @@ def show_api_setup(ai: GeminiFinancialAI):
             if api_key:
                 with st.spinner("🔄 Configurando conexión con Gemini..."):
                     ai.set_api_key(api_key)
+                    show_gemini_status(ai)
                     if ai.gemini_available:
                         st.balloons()
                         model_used = getattr(ai, 'model_name', 'Gemini')
@@ -510,6 +291,110 @@ def show_api_setup(ai: GeminiFinancialAI):
     </div>
     """, unsafe_allow_html=True)
 
+def _memo_figure(ai: GeminiFinancialAI, name: str, build, *key):
+    """Reutiliza la figura de Plotly mientras no cambien los datos (una versión por gráfico)"""
+    cache = st.session_state.setdefault("figure_cache", {})
+    cache_key = (ai.data_version,) + key
+    if cache.get(name, (None,))[0] != cache_key:
+        cache[name] = (cache_key, build())
+    return cache[name][1]
+
+# Plotly se importa dentro de cada gráfico: con el motor nativo no llega a cargarse
+def _category_pie(expenses_by_category):
+    import plotly.express as px
+
+    fig_pie = px.pie(
+        values=list(expenses_by_category.values()),
+        names=list(expenses_by_category.keys()),
+        title="💰 Distribución de Gastos por Categoría",
+        color_discrete_sequence=['#667eea', '#764ba2', '#fd79a8', '#00b894', '#fdcb6e', '#e17055', '#74b9ff']
+    )
+    fig_pie.update_layout(
+        title_font_size=16,
+        title_font_color='#2c3e50',
+        font=dict(size=12),
+        showlegend=True,
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)'
+    )
+    return fig_pie
+
+def _income_expense_bar(totals):
+    import plotly.graph_objects as go
+
+    fig_bar = go.Figure()
+    fig_bar.add_trace(go.Bar(
+        name='Ingresos',
+        x=['Tu Balance'],
+        y=[totals["income"]],
+        marker_color='#00b894',
+        marker_line_color='rgba(0,0,0,0)',
+        marker_line_width=0
+    ))
+    fig_bar.add_trace(go.Bar(
+        name='Gastos',
+        x=['Tu Balance'],
+        y=[totals["expenses"]],
+        marker_color='#fd79a8',
+        marker_line_color='rgba(0,0,0,0)',
+        marker_line_width=0
+    ))
+    fig_bar.update_layout(
+        title="📈 Ingresos vs Gastos",
+        title_font_size=16,
+        title_font_color='#2c3e50',
+        barmode='group',
+        yaxis_title="Cantidad (S/)",
+        font=dict(size=12),
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        showlegend=True
+    )
+    return fig_bar
+
+def _balance_line(chart_data):
+    import plotly.graph_objects as go
+
+    fig_line = go.Figure(go.Scatter(
+        x=chart_data["balance_dates"], y=chart_data["balance_values"],
+        mode='lines', name='Balance', line=dict(color='#667eea')
+    ))
+    fig_line.update_layout(
+        yaxis_title="Balance (S/)",
+        font=dict(size=12),
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        margin=dict(t=20)
+    )
+    return fig_line
+
+def _forecast_figure(forecast):
+    import plotly.graph_objects as go
+
+    fig_forecast = go.Figure()
+    fig_forecast.add_trace(go.Scatter(
+        x=forecast["months"] + forecast["months"][::-1],
+        y=forecast["balance_p90"] + forecast["balance_p10"][::-1],
+        fill='toself', fillcolor='rgba(102, 126, 234, 0.2)', line=dict(color='rgba(0,0,0,0)'),
+        name='Rango probable (80%)', hoverinfo='skip'
+    ))
+    fig_forecast.add_trace(go.Scatter(
+        x=forecast["history_months"], y=forecast["history_balance"],
+        mode='lines+markers', name='Balance histórico', line=dict(color='#00b894')
+    ))
+    fig_forecast.add_trace(go.Scatter(
+        x=forecast["months"], y=forecast["balance_p50"],
+        mode='lines+markers', name='Proyección', line=dict(color='#667eea', dash='dash')
+    ))
+    fig_forecast.update_layout(
+        yaxis_title="Balance (S/)",
+        font=dict(size=12),
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        showlegend=True
+    )
+    return fig_forecast
+
 def show_dashboard(ai: GeminiFinancialAI):
     """Muestra el dashboard principal"""
     st.markdown("""
@@ -571,6 +456,53 @@ def show_dashboard(ai: GeminiFinancialAI):
 
     st.markdown("<br>", unsafe_allow_html=True)
 
+    budget_status = ai.get_budget_status()
+    goals_progress = ai.get_goals_progress()
+    if budget_status or goals_progress:
+        st.markdown("""
+        <div style="text-align: center; margin: 2rem 0 1rem 0;">
+            <h3 style="color: #2c3e50;">🎯 Presupuestos y Metas</h3>
+        </div>
+        """, unsafe_allow_html=True)
+
+        col1, col2 = st.columns(2, gap="large")
+
+        with col1:
+            st.markdown("**💳 Presupuestos del mes**")
+            for budget in budget_status:
+                icon = "🔴" if budget["over_budget"] else "🟡" if budget["percentage"] >= 80 else "🟢"
+                st.progress(min(budget["percentage"], 100) / 100,
+                            text=f"{icon} {budget['category']}: S/{budget['spent']:,.2f} de S/{budget['limit']:,.2f}")
+            if not budget_status:
+                st.caption("Sin presupuestos definidos")
+
+        with col2:
+            st.markdown("**🏆 Metas de ahorro**")
+            for goal in goals_progress:
+                st.progress(goal["percentage"] / 100,
+                            text=f"{goal['name']}: S/{goal['saved']:,.2f} de S/{goal['target']:,.2f}")
+            if not goals_progress:
+                st.caption("Sin metas definidas")
+
+    anomalies = ai.get_anomalies(limit=5)
+    spikes = ai.get_category_spikes()
+    if anomalies or spikes:
+        st.markdown("""
+        <div style="text-align: center; margin: 2rem 0 1rem 0;">
+            <h3 style="color: #2c3e50;">🔍 Gastos Inusuales</h3>
+        </div>
+        """, unsafe_allow_html=True)
+
+        for spike in spikes:
+            st.warning(f"📈 Este mes gastaste S/{spike['amount']:,.2f} en {spike['category']}, "
+                       f"{spike['ratio']:.1f} veces tu promedio reciente (S/{spike['average']:,.2f})")
+        for expense in anomalies:
+            st.markdown(f"- **{expense['description']}** ({expense['category']}, {expense['date']}): "
+                        f"S/{expense['amount']:,.2f} — lo habitual es S/{expense['typical']:,.2f}")
+
+    chart_backend = ai.config.get("chart_backend", DEFAULT_CHART_BACKEND)
+    chart_data = ai.get_chart_data()
+
     if total_expenses > 0:
         st.markdown("""
         <div style="text-align: center; margin: 2rem 0 1rem 0;">
@@ -581,53 +513,67 @@ def show_dashboard(ai: GeminiFinancialAI):
         col1, col2 = st.columns(2, gap="large")
 
         with col1:
-            expenses_by_category = ai.get_expenses_by_category()
-            fig_pie = px.pie(
-                values=list(expenses_by_category.values()),
-                names=list(expenses_by_category.keys()),
-                title="💰 Distribución de Gastos por Categoría",
-                color_discrete_sequence=['#667eea', '#764ba2', '#fd79a8', '#00b894', '#fdcb6e', '#e17055', '#74b9ff']
-            )
-            fig_pie.update_layout(
-                title_font_size=16,
-                title_font_color='#2c3e50',
-                font=dict(size=12),
-                showlegend=True,
-                paper_bgcolor='rgba(0,0,0,0)',
-                plot_bgcolor='rgba(0,0,0,0)'
-            )
-            st.plotly_chart(fig_pie, use_container_width=True)
+            expenses_by_category = chart_data["categories"]
+            if chart_backend == "native":
+                st.markdown("**💰 Distribución de Gastos por Categoría**")
+                st.bar_chart({"Gasto (S/)": expenses_by_category}, color="#667eea")
+            else:
+                fig_pie = _memo_figure(ai, "pie", lambda: _category_pie(expenses_by_category))
+                st.plotly_chart(fig_pie, use_container_width=True)
 
         with col2:
-            fig_bar = go.Figure()
-            fig_bar.add_trace(go.Bar(
-                name='Ingresos',
-                x=['Tu Balance'],
-                y=[total_income],
-                marker_color='#00b894',
-                marker_line_color='rgba(0,0,0,0)',
-                marker_line_width=0
-            ))
-            fig_bar.add_trace(go.Bar(
-                name='Gastos',
-                x=['Tu Balance'],
-                y=[total_expenses],
-                marker_color='#fd79a8',
-                marker_line_color='rgba(0,0,0,0)',
-                marker_line_width=0
-            ))
-            fig_bar.update_layout(
-                title="📈 Ingresos vs Gastos",
-                title_font_size=16,
-                title_font_color='#2c3e50',
-                barmode='group',
-                yaxis_title="Cantidad (S/)",
-                font=dict(size=12),
-                paper_bgcolor='rgba(0,0,0,0)',
-                plot_bgcolor='rgba(0,0,0,0)',
-                showlegend=True
-            )
-            st.plotly_chart(fig_bar, use_container_width=True)
+            totals = chart_data["totals"]
+            if chart_backend == "native":
+                st.markdown("**📈 Ingresos vs Gastos**")
+                st.bar_chart({"Cantidad (S/)": {"Ingresos": totals["income"], "Gastos": totals["expenses"]}},
+                             color="#00b894")
+            else:
+                fig_bar = _memo_figure(ai, "bar", lambda: _income_expense_bar(totals))
+                st.plotly_chart(fig_bar, use_container_width=True)
+
+        if len(chart_data["balance_dates"]) > 1:
+            st.markdown("**📉 Evolución del Balance**")
+            if chart_backend == "native":
+                st.line_chart({"Fecha": chart_data["balance_dates"], "Balance (S/)": chart_data["balance_values"]},
+                              x="Fecha", y="Balance (S/)", color="#667eea")
+            else:
+                fig_line = _memo_figure(ai, "balance", lambda: _balance_line(chart_data))
+                st.plotly_chart(fig_line, use_container_width=True)
+            if chart_data["balance_points"] > len(chart_data["balance_dates"]):
+                st.caption(f"Serie reducida a {len(chart_data['balance_dates'])} de "
+                           f"{chart_data['balance_points']} días conservando su forma")
+
+    if total_income > 0 or total_expenses > 0:
+        st.markdown("""
+        <div style="text-align: center; margin: 2rem 0 1rem 0;">
+            <h3 style="color: #2c3e50;">🔮 Proyección de Balance</h3>
+        </div>
+        """, unsafe_allow_html=True)
+
+        horizon = st.slider("Meses a proyectar", min_value=1, max_value=12, value=6, key="forecast_months")
+        forecast = ai.get_forecast(months=horizon)
+        if forecast:
+            if forecast["prob_negative"][0] >= 0.2:
+                st.warning(f"⚠️ Hay un {forecast['prob_negative'][0] * 100:.0f}% de probabilidad de que te quedes "
+                           f"sin dinero antes de fin de mes (balance estimado S/{forecast['balance_p50'][0]:,.2f})")
+            else:
+                st.info(f"📅 Balance estimado a fin de mes: S/{forecast['balance_p50'][0]:,.2f} "
+                        f"(entre S/{forecast['balance_p10'][0]:,.2f} y S/{forecast['balance_p90'][0]:,.2f})")
+
+            if chart_backend == "native":
+                months = forecast["history_months"] + forecast["months"][1:]
+                history = forecast["history_balance"] + [None] * (len(forecast["months"]) - 1)
+                padding = [None] * (len(forecast["history_months"]) - 1)
+                st.line_chart({
+                    "Mes": months,
+                    "Balance histórico": history,
+                    "Proyección": padding + forecast["balance_p50"],
+                    "Escenario bajo (p10)": padding + forecast["balance_p10"],
+                    "Escenario alto (p90)": padding + forecast["balance_p90"]
+                }, x="Mes")
+            else:
+                fig_forecast = _memo_figure(ai, "forecast", lambda: _forecast_figure(forecast), horizon)
+                st.plotly_chart(fig_forecast, use_container_width=True)
 
     if total_income > 0 or len(ai.data["expenses"]) > 0:
         st.markdown("<br><br>", unsafe_allow_html=True)
@@ -664,6 +610,20 @@ def show_dashboard(ai: GeminiFinancialAI):
         </div>
         """, unsafe_allow_html=True)
 
+def _currency_selector(ai: GeminiFinancialAI, key: str) -> str:
+    """Selector de moneda; solo aparece si hay tipos de cambio registrados"""
+    currencies = ai.get_currencies()
+    if len(currencies) == 1:
+        return BASE_CURRENCY
+    return st.selectbox("Moneda", currencies, key=key,
+                        help="Los montos en otra moneda se convierten a soles con el tipo de cambio de su fecha")
+
+def _entry_amount_text(entry) -> str:
+    """Monto de un movimiento; si fue en otra moneda, con su equivalente en soles"""
+    if entry.get("currency"):
+        return f"{format_amount(entry['original_amount'], entry['currency'])} (S/{entry['amount']:,.2f})"
+    return f"S/{entry['amount']:,.2f}"
+
 def show_data_input(ai: GeminiFinancialAI):
     """Muestra la interfaz para ingresar datos"""
     st.markdown("""
@@ -673,7 +633,15 @@ def show_data_input(ai: GeminiFinancialAI):
     </div>
     """, unsafe_allow_html=True)
 
-    tab1, tab2 = st.tabs(["💰 Agregar Ingreso", "💸 Agregar Gasto"])
+    budget_alert = st.session_state.pop("budget_alert", None)
+    if budget_alert:
+        if budget_alert["over_budget"]:
+            st.warning(f"⚠️ Superaste tu presupuesto de {budget_alert['category']}: "
+                       f"S/{budget_alert['spent']:,.2f} de S/{budget_alert['limit']:,.2f} este mes")
+        else:
+            st.info(f"💡 Llevas el {budget_alert['percentage']:.0f}% de tu presupuesto de {budget_alert['category']} este mes")
+
+    tab1, tab2, tab3 = st.tabs(["💰 Agregar Ingreso", "💸 Agregar Gasto", "🔁 Recurrentes"])
 
     with tab1:
         st.markdown("""
@@ -687,7 +655,8 @@ def show_data_input(ai: GeminiFinancialAI):
 
         with col1:
             st.markdown("**💵 Datos del Ingreso**")
-            income_amount = st.number_input("Cantidad (S/)", min_value=0.01, step=0.01,
+            income_currency = _currency_selector(ai, "income_currency_input")
+            income_amount = st.number_input(f"Cantidad ({income_currency})", min_value=0.01, step=0.01,
                                           value=st.session_state.get("income_amount_value", 0.01),
                                           key="income_amount_input",
                                           help="Ingresa el monto que recibiste")
@@ -702,7 +671,7 @@ def show_data_input(ai: GeminiFinancialAI):
                                       key="income_date_input",
                                       help="¿Cuándo recibiste este ingreso?")
             income_category = st.selectbox("Categoría",
-                                         ["Salario", "Freelance", "Inversiones", "Venta", "Bono", "Pensión", "Alquiler", "Otro"],
+                                         INCOME_CATEGORIES,
                                          index=st.session_state.get("income_category_index", 0),
                                          key="income_category_input",
                                          help="Selecciona el tipo de ingreso")
@@ -713,8 +682,8 @@ def show_data_input(ai: GeminiFinancialAI):
         with col2:
             if st.button("💰 Registrar Ingreso", type="primary", use_container_width=True):
                 if income_amount > 0 and income_source:
-                    ai.add_income(income_amount, income_source, str(income_date), income_category)
-                    st.success(f"✅ ¡Ingreso de S/{income_amount:,.2f} registrado exitosamente!")
+                    ai.add_income(income_amount, income_source, str(income_date), income_category, income_currency)
+                    st.success(f"✅ ¡Ingreso de {format_amount(income_amount, income_currency)} registrado exitosamente!")
                     # Limpiar campos del formulario
                     st.session_state["income_amount_value"] = 0.01
                     st.session_state["income_source_value"] = ""
@@ -747,7 +716,8 @@ def show_data_input(ai: GeminiFinancialAI):
 
         with col1:
             st.markdown("**💳 Datos del Gasto**")
-            expense_amount = st.number_input("Cantidad (S/)", min_value=0.01, step=0.01,
+            expense_currency = _currency_selector(ai, "expense_currency_input")
+            expense_amount = st.number_input(f"Cantidad ({expense_currency})", min_value=0.01, step=0.01,
                                            value=st.session_state.get("expense_amount_value", 0.01),
                                            key="expense_amount_input",
                                            help="¿Cuánto gastaste?")
@@ -755,6 +725,13 @@ def show_data_input(ai: GeminiFinancialAI):
                                               value=st.session_state.get("expense_description_value", ""),
                                               key="expense_description_input",
                                               help="Describe brevemente en qué gastaste")
+            suggested_category = ai.suggest_category(expense_description) if expense_description else None
+            if suggested_category:
+                st.caption(f"🤖 Categoría sugerida: {suggested_category}")
+                # Preseleccionar la sugerencia solo cuando cambia la descripción
+                if st.session_state.get("expense_suggested_for") != expense_description:
+                    st.session_state["expense_suggested_for"] = expense_description
+                    st.session_state["expense_category_input"] = suggested_category
 
         with col2:
             st.markdown("**📅 Detalles Adicionales**")
@@ -762,9 +739,7 @@ def show_data_input(ai: GeminiFinancialAI):
                                        key="expense_date_input",
                                        help="¿Cuándo realizaste este gasto?")
             expense_category = st.selectbox("Categoría",
-                                          ["Alimentación", "Transporte", "Vivienda", "Servicios", "Salud",
-                                           "Entretenimiento", "Ropa", "Educación", "Tecnología", "Deudas", "Otro"],
-                                          index=st.session_state.get("expense_category_index", 0),
+                                          EXPENSE_CATEGORIES,
                                           key="expense_category_input",
                                           help="¿En qué categoría clasificarías este gasto?")
 
@@ -774,19 +749,83 @@ def show_data_input(ai: GeminiFinancialAI):
         with col2:
             if st.button("💸 Registrar Gasto", type="primary", use_container_width=True):
                 if expense_amount > 0 and expense_description:
-                    ai.add_expense(expense_amount, expense_description, str(expense_date), expense_category)
-                    st.success(f"✅ ¡Gasto de S/{expense_amount:,.2f} registrado exitosamente!")
+                    budget = ai.add_expense(expense_amount, expense_description, str(expense_date), expense_category,
+                                            expense_currency)
+                    st.success(f"✅ ¡Gasto de {format_amount(expense_amount, expense_currency)} registrado exitosamente!")
+                    # Guardar el aviso de presupuesto para mostrarlo después del rerun
+                    if budget and budget["percentage"] >= 80:
+                        st.session_state["budget_alert"] = budget
                     # Limpiar campos del formulario
                     st.session_state["expense_amount_value"] = 0.01
                     st.session_state["expense_description_value"] = ""
                     st.session_state["expense_date_value"] = date.today()
-                    st.session_state["expense_category_index"] = 0
+                    # La categoría se controla por su key (la sugerencia la cambia): se reinicia borrándola
+                    st.session_state.pop("expense_category_input", None)
+                    st.session_state.pop("expense_suggested_for", None)
                     if 'quick_analysis' in st.session_state:
                         del st.session_state['quick_analysis']
                     st.rerun()
                 else:
                     st.error("⚠️ Por favor completa todos los campos obligatorios.")
 
+    with tab3:
+        st.markdown("""
+        <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+                    color: white; padding: 1rem; border-radius: 15px 15px 0 0; margin-bottom: 2rem;">
+            <h3 style="margin: 0; text-align: center;">🔁 Movimientos Recurrentes</h3>
+        </div>
+        """, unsafe_allow_html=True)
+        st.caption("Alquiler, pasajes, becas... se registran solos cada vez que vencen.")
+
+        col1, col2 = st.columns(2, gap="large")
+
+        with col1:
+            recurring_type = st.radio("Tipo", ["Gasto", "Ingreso"], horizontal=True, key="recurring_type_input")
+            recurring_amount = st.number_input("Cantidad (S/)", min_value=0.01, step=0.01, value=100.0,
+                                               key="recurring_amount_input")
+            recurring_description = st.text_input("Descripción", placeholder="ej. Alquiler del cuarto, Beca",
+                                                  key="recurring_description_input")
+            recurring_category = st.selectbox("Categoría",
+                                              EXPENSE_CATEGORIES if recurring_type == "Gasto" else INCOME_CATEGORIES,
+                                              key="recurring_category_input")
+
+        with col2:
+            recurring_frequency = st.selectbox("Frecuencia", list(RECURRING_FREQUENCIES.keys()),
+                                               key="recurring_frequency_input")
+            recurring_interval = st.number_input("Cada cuántos días", min_value=1, step=1, value=15,
+                                                 key="recurring_interval_input",
+                                                 disabled=recurring_frequency != "Personalizada")
+            recurring_start = st.date_input("Primera fecha", value=date.today(), key="recurring_start_input")
+
+        col1, col2, col3 = st.columns([1, 2, 1])
+        with col2:
+            if st.button("🔁 Crear Regla Recurrente", type="primary", use_container_width=True):
+                if recurring_description:
+                    ai.add_recurring("expenses" if recurring_type == "Gasto" else "income",
+                                     recurring_amount, recurring_description, recurring_category,
+                                     RECURRING_FREQUENCIES[recurring_frequency], str(recurring_start),
+                                     int(recurring_interval))
+                    if 'quick_analysis' in st.session_state:
+                        del st.session_state['quick_analysis']
+                    st.rerun()
+                else:
+                    st.error("⚠️ Por favor completa todos los campos obligatorios.")
+
+        frequency_labels = {value: label for label, value in RECURRING_FREQUENCIES.items()}
+        for rule in ai.data["recurring"]:
+            sign = "+" if rule["kind"] == "income" else "-"
+            frequency = frequency_labels[rule["frequency"]]
+            if rule["frequency"] == "custom":
+                frequency += f" (cada {rule['interval_days']} días)"
+            col1, col2 = st.columns([4, 1])
+            with col1:
+                st.markdown(f"**{rule['description']}** {sign}S/{rule['amount']:,.2f} | 🏷️ {rule['category']} | "
+                            f"🔁 {frequency} desde {rule['start_date']}")
+            with col2:
+                if st.button("🗑️ Eliminar", key=f"del_recurring_{rule['id']}"):
+                    ai.delete_recurring(rule["id"])
+                    st.rerun()
+
 def show_gemini_analysis(ai: GeminiFinancialAI):
     """Muestra análisis completo con Gemini"""
     st.header("🧠 Análisis Completo con Gemini AI")
@@ -831,6 +870,30 @@ def show_custom_query(ai: GeminiFinancialAI):
             if st.button(f"❓ {question}", key=f"q_{i}"):
                 st.session_state['custom_question'] = question
 
+    # Conversación con memoria: Gemini recuerda las preguntas anteriores de esta sesión
+    if 'conversation' not in st.session_state:
+        st.session_state.conversation = ConversationSession(ai)
+    conversation = st.session_state.conversation
+
+    if conversation.turns:
+        st.markdown("---")
+        st.subheader("🗨️ Conversación")
+        if conversation.summary:
+            with st.expander("📜 Resumen de preguntas anteriores"):
+                st.markdown(conversation.summary)
+        for turn in conversation.turns[conversation.summarized:]:
+            with st.chat_message("user"):
+                st.markdown(turn["question"])
+            with st.chat_message("assistant"):
+                st.markdown(turn["answer"])
+        col1, col2 = st.columns([3, 1])
+        with col1:
+            st.caption(f"Memoria de la conversación: ~{conversation.history_tokens():,} tokens")
+        with col2:
+            if st.button("🧹 Nueva conversación"):
+                conversation.reset()
+                st.rerun()
+
     st.markdown("---")
     custom_question = st.text_area(
         "🤔 Tu pregunta personalizada:",
@@ -838,11 +901,18 @@ def show_custom_query(ai: GeminiFinancialAI):
         placeholder="Ej: ¿Cómo puedo reducir mis gastos en entretenimiento sin afectar mi calidad de vida?",
         height=100
     )
+    exact_mode = st.checkbox(
+        "🧮 Cifras exactas",
+        help="Gemini consulta tus totales, mayores gastos y tendencias con funciones locales en lugar de recibir un resumen"
+    )
 
     if st.button("🚀 Obtener Respuesta de Gemini", type="primary", disabled=not custom_question):
         if custom_question:
             with st.spinner(f"🤖 Gemini está analizando tu pregunta..."):
-                response = ai.get_specific_recommendation(custom_question)
+                if exact_mode:
+                    response = ai.get_tool_answer(custom_question)
+                else:
+                    response = conversation.ask(custom_question)
 
                 st.markdown("---")
                 st.subheader("🎯 Respuesta Personalizada")
@@ -853,6 +923,72 @@ def show_custom_query(ai: GeminiFinancialAI):
                 if 'custom_question' in st.session_state:
                     del st.session_state['custom_question']
 
+def show_budgets_goals(ai: GeminiFinancialAI):
+    """Muestra la gestión de presupuestos mensuales y metas de ahorro"""
+    st.header("🎯 Presupuestos y Metas")
+    st.markdown("Define límites de gasto por categoría y metas de ahorro para seguir tu progreso.")
+
+    tab1, tab2 = st.tabs(["💳 Presupuestos", "🏆 Metas de Ahorro"])
+
+    with tab1:
+        col1, col2 = st.columns(2)
+        with col1:
+            budget_category = st.selectbox("Categoría", EXPENSE_CATEGORIES, key="budget_category_input")
+        with col2:
+            budget_limit = st.number_input("Límite mensual (S/)", min_value=1.0, step=10.0,
+                                           value=float(ai.data["budgets"].get(budget_category, 100.0)),
+                                           key="budget_limit_input")
+
+        if st.button("💾 Guardar Presupuesto", type="primary"):
+            ai.set_budget(budget_category, budget_limit)
+            st.success(f"✅ Presupuesto de {budget_category} guardado")
+            st.rerun()
+
+        st.markdown("---")
+        for budget in ai.get_budget_status():
+            col1, col2 = st.columns([4, 1])
+            with col1:
+                st.progress(min(budget["percentage"], 100) / 100,
+                            text=f"{budget['category']}: S/{budget['spent']:,.2f} de S/{budget['limit']:,.2f} "
+                                 f"({budget['percentage']:.1f}%)")
+            with col2:
+                if st.button("🗑️ Eliminar", key=f"del_budget_{budget['category']}"):
+                    ai.delete_budget(budget["category"])
+                    st.rerun()
+
+    with tab2:
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            goal_name = st.text_input("Meta", placeholder="ej. Laptop nueva, Fondo de emergencia",
+                                      key="goal_name_input")
+        with col2:
+            goal_target = st.number_input("Monto objetivo (S/)", min_value=1.0, step=50.0, value=1000.0,
+                                          key="goal_target_input")
+        with col3:
+            goal_deadline = st.date_input("Fecha límite", value=date.today(), key="goal_deadline_input")
+
+        if st.button("🏆 Crear Meta", type="primary"):
+            if goal_name:
+                ai.add_goal(goal_name, goal_target, str(goal_deadline))
+                st.success(f"✅ Meta '{goal_name}' creada")
+                st.rerun()
+            else:
+                st.error("⚠️ Por favor ingresa un nombre para la meta.")
+
+        st.markdown("---")
+        for goal in ai.get_goals_progress():
+            col1, col2 = st.columns([4, 1])
+            with col1:
+                st.progress(goal["percentage"] / 100,
+                            text=f"{goal['name']}: S/{goal['saved']:,.2f} de S/{goal['target']:,.2f} "
+                                 f"({goal['percentage']:.1f}%)")
+                st.caption(f"📅 Fecha límite: {goal['deadline']} | 💰 Necesitas ahorrar "
+                           f"S/{goal['monthly_needed']:,.2f} al mes")
+            with col2:
+                if st.button("🗑️ Eliminar", key=f"del_goal_{goal['id']}"):
+                    ai.delete_goal(goal["id"])
+                    st.rerun()
+
 def show_user_profile(ai: GeminiFinancialAI):
     """Muestra la configuración del perfil de usuario"""
     st.header("👤 Perfil de Usuario")
@@ -914,7 +1050,9 @@ def show_history(ai: GeminiFinancialAI):
     </div>
     """, unsafe_allow_html=True)
 
-    tab1, tab2 = st.tabs(["💰 Mis Ingresos", "💸 Mis Gastos"])
+    duplicates = ai.get_duplicates()
+    duplicates_label = f"🔁 Posibles Duplicados ({len(duplicates)})" if duplicates else "🔁 Posibles Duplicados"
+    tab1, tab2, tab3 = st.tabs(["💰 Mis Ingresos", "💸 Mis Gastos", duplicates_label])
 
     with tab1:
         if ai.data["income"]:
@@ -935,7 +1073,7 @@ def show_history(ai: GeminiFinancialAI):
                         </div>
                         <div style="text-align: right;">
                             <h3 style="margin: 0; color: #00b894; font-size: 1.5rem;">
-                                +S/{income['amount']:,.2f}
+                                +{_entry_amount_text(income)}
                             </h3>
                         </div>
                     </div>
@@ -986,7 +1124,7 @@ def show_history(ai: GeminiFinancialAI):
                         </div>
                         <div style="text-align: right;">
                             <h3 style="margin: 0; color: #fd79a8; font-size: 1.5rem;">
-                                -S/{expense['amount']:,.2f}
+                                -{_entry_amount_text(expense)}
                             </h3>
                         </div>
                     </div>
@@ -1018,11 +1156,42 @@ def show_history(ai: GeminiFinancialAI):
             </div>
             """, unsafe_allow_html=True)
 
+    with tab3:
+        if duplicates:
+            st.caption("Movimientos con el mismo monto, fechas cercanas y descripción parecida. "
+                       "Al fusionar se conserva el registro más antiguo.")
+            for pair in duplicates[:DUPLICATES_PAGE_SIZE]:
+                kind_label = "Ingreso" if pair["kind"] == "income" else "Gasto"
+                reason = "idénticos" if pair["reason"] == "exact" else f"similitud {pair['similarity'] * 100:.0f}%"
+                st.markdown(f"**{kind_label}** · {reason}")
+                col1, col2 = st.columns(2)
+                for col, entry in ((col1, pair["keep"]), (col2, pair["duplicate"])):
+                    with col:
+                        text = entry.get("description") or entry.get("source")
+                        st.markdown(f"- {entry['date']} · {text} · {_entry_amount_text(entry)} · 🏷️ {entry['category']}")
+                col1, col2, col3 = st.columns([1, 1, 2])
+                pair_id = f"{pair['kind']}_{pair['keep']['id']}_{pair['duplicate']['id']}"
+                with col1:
+                    if st.button("🔗 Fusionar", key=f"merge_{pair_id}"):
+                        ai.merge_duplicate(pair["kind"], pair["keep"]["id"], pair["duplicate"]["id"])
+                        if 'quick_analysis' in st.session_state:
+                            del st.session_state['quick_analysis']
+                        st.rerun()
+                with col2:
+                    if st.button("✅ Son distintos", key=f"keep_{pair_id}"):
+                        ai.ignore_duplicate(pair["kind"], pair["keep"]["id"], pair["duplicate"]["id"])
+                        st.rerun()
+                st.markdown("---")
+            if len(duplicates) > DUPLICATES_PAGE_SIZE:
+                st.caption(f"Mostrando {DUPLICATES_PAGE_SIZE} de {len(duplicates)} pares; resuelve estos para ver más.")
+        else:
+            st.success("✅ No se encontraron movimientos duplicados.")
+
 def show_settings(ai: GeminiFinancialAI):
     """Muestra la configuración de la aplicación"""
     st.header("⚙️ Configuración")
 
-    tab1, tab2 = st.tabs(["🔑 API Settings", "🗑️ Gestión de Datos"])
+    tab1, tab2, tab3 = st.tabs(["🔑 API Settings", "🗑️ Gestión de Datos", "💱 Tipos de Cambio"])
 
     with tab1:
         st.subheader("Configuración de API de Gemini")
@@ -1037,6 +1206,7 @@ def show_settings(ai: GeminiFinancialAI):
         if st.button("🔄 Actualizar API Key"):
             if new_api_key:
                 ai.set_api_key(new_api_key)
+                show_gemini_status(ai)
                 if ai.gemini_available:
                     st.success("✅ API key actualizada correctamente!")
                 else:
@@ -1080,16 +1250,110 @@ def show_settings(ai: GeminiFinancialAI):
         with col2:
             if st.button("🗑️ Limpiar Todos los Datos", type="secondary"):
                 if st.checkbox("⚠️ Confirmo que deseo eliminar TODOS los datos"):
-                    ai.data = {"income": [], "expenses": [], "goals": [], "user_profile": {}}
-                    ai.save_data()
+                    ai.clear_data()
                     for key in list(st.session_state.keys()):
                         if 'analysis' in key:
                             del st.session_state[key]
                     st.success("✅ Todos los datos han sido eliminados.")
                     st.rerun()
 
+        st.markdown("---")
+        st.subheader("📄 Estado de Cuenta Mensual")
+        statement_months = sorted(ai.monthly_aggregates, reverse=True)
+        if statement_months:
+            statement_month = st.selectbox("Mes", statement_months, format_func=month_label,
+                                           key="statement_month_input")
+            # Se arma con los agregados del mes y el análisis guardado, sin recorrer los movimientos
+            statement_period = ai.get_statement_period(statement_month)
+            statement_html = render_statement_html(statement_period)
+            col1, col2 = st.columns(2)
+            with col1:
+                st.download_button("📄 Descargar HTML", data=statement_html,
+                                   file_name=f"estado_{statement_month}.html", mime="text/html")
+            with col2:
+                if pdf_available():
+                    # Renderizar el PDF tarda: se reutiliza mientras no cambie el contenido del estado
+                    # (presupuestos y análisis incluidos, que no siempre avanzan data_version)
+                    pdf_key = json.dumps(statement_period, sort_keys=True, ensure_ascii=False)
+                    if st.session_state.get("statement_pdf_key") != pdf_key:
+                        st.session_state["statement_pdf"] = render_statement_pdf(statement_html)
+                        st.session_state["statement_pdf_key"] = pdf_key
+                    st.download_button("📄 Descargar PDF", data=st.session_state["statement_pdf"],
+                                       file_name=f"estado_{statement_month}.pdf", mime="application/pdf")
+            if statement_month not in ai.data["analyses"]:
+                st.caption("💡 Genera el análisis del mes (`python -m financeia analyze`) para incluirlo en el estado.")
+        else:
+            st.info("📝 Registra movimientos para generar estados de cuenta.")
+
+        st.markdown("---")
+        st.subheader("📊 Gráficos")
+        chart_labels = list(CHART_BACKENDS.keys())
+        current_backend = ai.config.get("chart_backend", DEFAULT_CHART_BACKEND)
+        chart_label = st.selectbox(
+            "Motor de gráficos del dashboard",
+            chart_labels,
+            index=list(CHART_BACKENDS.values()).index(current_backend),
+            help="Los gráficos nativos son más livianos y cargan más rápido en conexiones lentas"
+        )
+        if CHART_BACKENDS[chart_label] != current_backend:
+            ai.config["chart_backend"] = CHART_BACKENDS[chart_label]
+            ai.save_config()
+            st.success("✅ Motor de gráficos actualizado.")
+
+        st.markdown("---")
+        st.subheader("💾 Guardado")
+        durability_labels = list(DURABILITY_MODES.keys())
+        current_mode = ai.persistence.durability
+        durability_label = st.selectbox(
+            "Durabilidad",
+            durability_labels,
+            index=list(DURABILITY_MODES.values()).index(current_mode),
+            help="Los modos que agrupan escrituras guardan en segundo plano poco después de cada cambio; "
+                 "el estricto escribe en disco antes de continuar"
+        )
+        if DURABILITY_MODES[durability_label] != current_mode:
+            ai.set_durability(DURABILITY_MODES[durability_label])
+            st.success("✅ Modo de guardado actualizado.")
+        st.caption(f"Escrituras a disco en esta sesión: {ai.persistence.writes}")
+
         st.markdown("---")
         st.info("💡 **Tip**: Exporta regularmente tus datos como respaldo de seguridad.")
 
+    with tab3:
+        st.subheader("Tipos de Cambio")
+        st.caption("Soles por unidad de cada moneda. Cada movimiento usa el último tipo de cambio registrado "
+                   "hasta su fecha; al agregar tipos nuevos se recalculan los montos en soles.")
+
+        rates_file = st.file_uploader("Importar CSV (columnas date, currency, rate)", type=["csv"])
+        if rates_file is not None and st.button("📥 Importar tipos de cambio"):
+            try:
+                rows = csv.DictReader(io.StringIO(rates_file.getvalue().decode("utf-8-sig")))
+                count = ai.import_exchange_rates(rows)
+                st.success(f"✅ {count} tipos de cambio importados.")
+            except ValueError as e:
+                st.error(f"⚠️ {e}")
+
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            rate_currency = st.text_input("Moneda", value="USD", max_chars=3, key="rate_currency_input")
+        with col2:
+            rate_date = st.date_input("Desde", value=date.today(), key="rate_date_input")
+        with col3:
+            rate_value = st.number_input("Soles por unidad", min_value=0.0001, value=3.75, step=0.01,
+                                         format="%.4f", key="rate_value_input")
+        if st.button("💾 Guardar tipo de cambio"):
+            try:
+                ai.set_exchange_rate(rate_currency.strip().upper(), str(rate_date), rate_value)
+                st.success(f"✅ Tipo de cambio de {rate_currency.upper()} guardado.")
+            except ValueError as e:
+                st.error(f"⚠️ {e}")
+
+        if ai.data["exchange_rates"]:
+            st.dataframe(
+                [{"Moneda": currency, "Último tipo": series[-1][1], "Desde": series[-1][0], "Registros": len(series)}
+                 for currency, series in sorted(ai.data["exchange_rates"].items()) if series],
+                use_container_width=True, hide_index=True
+            )
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
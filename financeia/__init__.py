@@ -0,0 +1,39 @@
+"""FinanceIA: motor financiero independiente de la interfaz.
+
+Importar este paquete es barato: no carga Streamlit, Plotly, numpy/pandas ni el SDK de Gemini.
+"""
+from .categorizer import ExpenseCategorizer
+from .charts import CHART_BACKENDS, DEFAULT_CHART_BACKEND
+from .conversation import ConversationSession
+from .currency import BASE_CURRENCY, CURRENCY_SYMBOLS, format_amount
+from .core import (
+    CONFIG_FILE,
+    DATA_FILE,
+    EXPENSE_CATEGORIES,
+    INCOME_CATEGORIES,
+    RECURRING_FREQUENCIES,
+    GeminiFinancialAI,
+)
+from .persistence import DURABILITY_MODES
+from .reports import month_label, pdf_available, render_statement_html, render_statement_pdf
+
+__all__ = [
+    "BASE_CURRENCY",
+    "CHART_BACKENDS",
+    "CONFIG_FILE",
+    "CURRENCY_SYMBOLS",
+    "DATA_FILE",
+    "DEFAULT_CHART_BACKEND",
+    "DURABILITY_MODES",
+    "EXPENSE_CATEGORIES",
+    "INCOME_CATEGORIES",
+    "RECURRING_FREQUENCIES",
+    "ConversationSession",
+    "ExpenseCategorizer",
+    "GeminiFinancialAI",
+    "format_amount",
+    "month_label",
+    "pdf_available",
+    "render_statement_html",
+    "render_statement_pdf",
+]
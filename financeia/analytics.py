@@ -0,0 +1,212 @@
+"""Detección de gastos inusuales y proyección de flujo de caja.
+
+Este módulo concentra el trabajo vectorizado con numpy/pandas; el motor lo importa
+solo cuando se piden anomalías o proyecciones.
+"""
+import calendar
+import warnings
+from datetime import date
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Parámetros de la detección de gastos inusuales
+ANOMALY_WINDOW = 20          # gastos previos de la categoría usados como referencia
+ANOMALY_MIN_HISTORY = 5      # mínimo de gastos previos para evaluar uno nuevo
+ANOMALY_THRESHOLD = 3.5      # puntuación z robusta (mediana/MAD) a partir de la cual se marca
+SPIKE_RATIO = 1.5            # aumento mensual de una categoría frente a su promedio reciente
+SPIKE_MIN_DIFFERENCE = 50.0  # diferencia mínima en S/ para considerar un aumento brusco
+
+# Parámetros de la proyección de flujo de caja (suavizado de Holt amortiguado)
+FORECAST_ALPHA = 0.4        # peso del último mes en el nivel
+FORECAST_BETA = 0.1         # peso del último cambio en la tendencia
+FORECAST_PHI = 0.9          # amortiguación de la tendencia en meses futuros
+FORECAST_SIMULATIONS = 1000
+FORECAST_MAX_MONTHS = 60    # horizonte máximo: más allá la proyección no es útil y la simulación crece sin límite
+
+EMPTY_PERIOD = {"income": 0.0, "expenses": 0.0, "categories": {}, "recurring_income": 0.0, "recurring_expenses": 0.0}
+
+
+def robust_scores(values: np.ndarray, reference: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Puntuación z robusta de cada valor frente a su fila de referencia (NaN = sin dato)"""
+    median = np.nanmedian(reference, axis=1)
+    mad = np.nanmedian(np.abs(reference - median[:, None]), axis=1)
+    # Evitar dividir entre cero cuando todos los gastos previos son iguales
+    mad = np.maximum(mad, 0.05 * np.abs(median) + 0.01)
+    return 0.6745 * (values - median) / mad, median
+
+
+def compute_anomalies(expenses: List[Dict], version: int) -> Dict:
+    """Evalúa todo el historial con mediana/MAD móviles por categoría, de forma vectorizada"""
+    cache = {"version": version, "flagged": [], "tails": {}, "last_date": {}}
+    if not expenses:
+        return cache
+    expenses = sorted(expenses, key=lambda x: (x["date"], x["id"]))
+    frame = pd.DataFrame({
+        "amount": [item["amount"] for item in expenses],
+        "category": [item["category"] for item in expenses]
+    })
+    amounts = frame["amount"].to_numpy(dtype=float)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        for category, positions in frame.groupby("category", sort=False).indices.items():
+            values = amounts[positions]
+            cache["tails"][category] = values[-ANOMALY_WINDOW:].tolist()
+            cache["last_date"][category] = expenses[positions[-1]]["date"]
+            if len(values) <= ANOMALY_MIN_HISTORY:
+                continue
+            # Fila i de la ventana = los ANOMALY_WINDOW gastos anteriores al gasto i
+            padded = np.concatenate([np.full(ANOMALY_WINDOW, np.nan), values[:-1]])
+            windows = np.lib.stride_tricks.sliding_window_view(padded, ANOMALY_WINDOW)[ANOMALY_MIN_HISTORY:]
+            scores, medians = robust_scores(values[ANOMALY_MIN_HISTORY:], windows)
+            for offset in np.flatnonzero(scores > ANOMALY_THRESHOLD):
+                expense = expenses[positions[offset + ANOMALY_MIN_HISTORY]]
+                cache["flagged"].append({**expense, "score": float(scores[offset]), "typical": float(medians[offset])})
+    return cache
+
+
+def score_new_expense(cache: Dict, entry: Dict) -> bool:
+    """Evalúa un gasto nuevo contra la ventana guardada de su categoría.
+
+    Devuelve False si el gasto tiene fecha anterior al último evaluado de su categoría,
+    en cuyo caso hay que recalcular todo el historial.
+    """
+    category = entry["category"]
+    if entry["date"] < cache["last_date"].get(category, ""):
+        return False
+    tail = cache["tails"].setdefault(category, [])
+    if len(tail) >= ANOMALY_MIN_HISTORY:
+        scores, medians = robust_scores(np.array([entry["amount"]], dtype=float), np.array([tail], dtype=float))
+        if scores[0] > ANOMALY_THRESHOLD:
+            cache["flagged"].append({**entry, "score": float(scores[0]), "typical": float(medians[0])})
+    tail.append(entry["amount"])
+    del tail[:-ANOMALY_WINDOW]
+    cache["last_date"][category] = entry["date"]
+    return True
+
+
+def category_spikes(monthly_aggregates: Dict[str, Dict], month: str) -> List[Dict]:
+    """Categorías cuyo gasto del mes supera con claridad el promedio de los 3 meses anteriores"""
+    months = sorted(m for m in monthly_aggregates if m <= month)
+    if not months or months[-1] != month:
+        return []
+    frame = pd.DataFrame.from_dict({m: monthly_aggregates[m]["categories"] for m in months}, orient="index")
+    all_months = pd.period_range(months[0], month, freq="M").strftime("%Y-%m")
+    frame = frame.reindex(all_months).fillna(0.0)
+    baseline = frame.shift(1).rolling(3, min_periods=1).mean().iloc[-1]
+    current = frame.iloc[-1]
+    mask = (baseline > 0) & (current > baseline * SPIKE_RATIO) & (current - baseline >= SPIKE_MIN_DIFFERENCE)
+    return sorted(
+        ({"category": category, "month": month, "amount": float(current[category]),
+          "average": float(baseline[category]), "ratio": float(current[category] / baseline[category])}
+         for category in frame.columns[mask.to_numpy()]),
+        key=lambda x: x["ratio"], reverse=True
+    )
+
+
+def holt_forecast(series: np.ndarray, horizon: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Suavizado de Holt amortiguado sobre cada columna de series (meses x columnas).
+
+    Devuelve la proyección (horizon x columnas) y la desviación de los errores a un paso.
+    """
+    level = series[0].copy()
+    trend = np.zeros(series.shape[1])
+    errors = []
+    for observed in series[1:]:
+        predicted = level + FORECAST_PHI * trend
+        errors.append(observed - predicted)
+        new_level = FORECAST_ALPHA * observed + (1 - FORECAST_ALPHA) * predicted
+        trend = FORECAST_BETA * (new_level - level) + (1 - FORECAST_BETA) * FORECAST_PHI * trend
+        level = new_level
+    damping = np.cumsum(FORECAST_PHI ** np.arange(1, horizon + 1))
+    forecast = np.maximum(level + damping[:, None] * trend, 0.0)
+    if len(errors) >= 2:
+        sigma = np.std(errors, axis=0)
+    else:
+        sigma = 0.25 * np.abs(level)
+    return forecast, sigma
+
+
+def forecast_cash_flow(monthly_aggregates: Dict[str, Dict], recurring_projection: Callable[[date], List[Dict]],
+                       months: int, simulations: int, seed: int, today: Optional[date] = None) -> Dict:
+    """Proyecta ingresos, gastos por categoría y balance para el resto del mes y los próximos meses.
+
+    Se basa solo en los agregados mensuales: los movimientos recurrentes (recurring_projection)
+    se proyectan exactamente y el resto con suavizado de Holt más estacionalidad (con 12+ meses
+    de historia). Las bandas del balance salen de una simulación de Monte Carlo.
+    """
+    if not 1 <= months <= FORECAST_MAX_MONTHS:
+        raise ValueError(f"El horizonte de la proyección debe estar entre 1 y {FORECAST_MAX_MONTHS} meses")
+    today = today or date.today()
+    current_month = today.strftime("%Y-%m")
+    history_months = sorted(m for m in monthly_aggregates if m <= current_month)
+    if not history_months:
+        return {}
+    all_months = list(pd.period_range(history_months[0], current_month, freq="M").strftime("%Y-%m"))
+    periods = [monthly_aggregates.get(m, EMPTY_PERIOD) for m in all_months]
+    totals = pd.DataFrame({
+        "income": [p["income"] - p["recurring_income"] for p in periods],
+        "expenses": [p["expenses"] - p["recurring_expenses"] for p in periods]
+    })
+    categories = pd.DataFrame([p["categories"] for p in periods]).fillna(0.0)
+    frame = pd.concat([totals, categories], axis=1)
+    frame.index = pd.PeriodIndex(all_months, freq="M")
+
+    # El mes actual está incompleto: se ajusta con los meses cerrados y, si no hay, con su ritmo diario
+    days_in_month = calendar.monthrange(today.year, today.month)[1]
+    elapsed_fraction = today.day / days_in_month
+    closed = frame.iloc[:-1]
+    if closed.empty:
+        closed = frame.iloc[-1:] / elapsed_fraction
+
+    horizon_index = pd.period_range(current_month, periods=months + 1, freq="M")
+    seasonal = np.zeros((months + 1, frame.shape[1]))
+    if len(closed) >= 12:
+        offsets = closed.groupby(closed.index.month).mean() - closed.mean()
+        offsets = offsets.reindex(range(1, 13)).fillna(0.0)
+        closed = closed - offsets.loc[closed.index.month].to_numpy()
+        seasonal = 0.5 * offsets.loc[horizon_index.month].to_numpy()
+    forecast, sigma = holt_forecast(closed.to_numpy(dtype=float), months + 1)
+    forecast = np.maximum(forecast + seasonal, 0.0)
+
+    # Los recurrentes futuros se suman tal cual, sin incertidumbre
+    last_day = horizon_index[-1].to_timestamp(how="end").date()
+    recurring = {"income": np.zeros(months + 1), "expenses": np.zeros(months + 1)}
+    for item in recurring_projection(last_day):
+        step = (int(item["date"][:4]) - today.year) * 12 + int(item["date"][5:7]) - today.month
+        recurring[item["kind"]][step] += item["amount"]
+
+    # Del mes actual solo falta proyectar la parte que aún no transcurre
+    remaining = np.ones(months + 1)
+    remaining[0] = 1 - elapsed_fraction
+    income_mean = forecast[:, 0] * remaining + recurring["income"]
+    expenses_mean = forecast[:, 1] * remaining + recurring["expenses"]
+
+    rng = np.random.default_rng(seed)
+    noise_scale = np.sqrt(remaining)
+    income_sims = np.maximum(
+        income_mean + rng.standard_normal((simulations, months + 1)) * sigma[0] * noise_scale, 0.0)
+    expenses_sims = np.maximum(
+        expenses_mean + rng.standard_normal((simulations, months + 1)) * sigma[1] * noise_scale, 0.0)
+    balance_now = float(sum(p["income"] - p["expenses"] for p in periods))
+    balance_sims = balance_now + np.cumsum(income_sims - expenses_sims, axis=1)
+    p10, p50, p90 = np.percentile(balance_sims, [10, 50, 90], axis=0)
+
+    history_balance = np.cumsum([p["income"] - p["expenses"] for p in periods])
+    return {
+        "months": list(horizon_index.strftime("%Y-%m")),
+        "income": income_mean.tolist(),
+        "expenses": expenses_mean.tolist(),
+        "categories": {
+            category: (forecast[:, 2 + i] * remaining).tolist()
+            for i, category in enumerate(categories.columns)
+        },
+        "balance_p10": p10.tolist(),
+        "balance_p50": p50.tolist(),
+        "balance_p90": p90.tolist(),
+        "prob_negative": (balance_sims < 0).mean(axis=0).tolist(),
+        "current_balance": balance_now,
+        "history_months": all_months,
+        "history_balance": history_balance.tolist()
+    }
@@ -0,0 +1,261 @@
+"""API HTTP/JSON local de FinanceIA.
+
+Expone el mismo motor que la interfaz de Streamlit para clientes móviles y scripts:
+
+    python -m financeia.api --port 8000
+
+Rutas principales:
+    GET    /health
+    GET    /income | /expenses          ?start=AAAA-MM-DD&end=AAAA-MM-DD&category=...&limit=N
+    POST   /income | /expenses          un movimiento o una lista (una sola escritura a disco)
+    DELETE /income/<id> | /expenses/<id>
+    GET    /summary | /aggregates/monthly | /aggregates/categories
+    GET    /budgets | /goals | /anomalies | /forecast?months=N | /categorize?description=...
+    POST   /analysis | /query           {"question": "...", "tools": true} (tools: cifras exactas por funciones)
+
+Las respuestas llevan ETag con la versión del archivo de datos (sobrevive a reinicios de la
+API); un POST o DELETE con If-Match se rechaza con 412 si otro cliente o sesión cambió los
+datos desde esa versión.
+"""
+import argparse
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from .core import DATA_FILE, GeminiFinancialAI
+
+KINDS = {"income", "expenses"}
+
+
+class FinanceAPIHandler(BaseHTTPRequestHandler):
+    """Atiende las peticiones sobre una instancia compartida de GeminiFinancialAI"""
+
+    # HTTP/1.1 mantiene la conexión abierta entre peticiones (keep-alive)
+    protocol_version = "HTTP/1.1"
+    # Encabezados y cuerpo salen en escrituras separadas: sin esto Nagle añade ~40 ms por respuesta
+    disable_nagle_algorithm = True
+    ai: GeminiFinancialAI = None
+    lock = threading.Lock()
+    # Respuestas GET ya serializadas, válidas mientras no cambie la versión de los datos
+    response_cache: Dict[str, bytes] = {}
+    cache_version = -1
+    quiet = True
+
+    def log_message(self, format, *args):
+        if not self.quiet:
+            super().log_message(format, *args)
+
+    def _send_json(self, status: int, body: Optional[bytes] = None, payload=None, version: Optional[str] = None):
+        if body is None:
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        if version is not None:
+            self.send_header("ETag", f'"{version}"')
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status: int, message: str):
+        self._send_json(status, payload={"error": message})
+
+    def _file_version(self) -> Optional[str]:
+        """ETag del archivo con los cambios de esta API ya escritos (el contador en memoria se reinicia)"""
+        self.ai.flush_data()
+        return self.ai.etag
+
+    def _version_conflict(self) -> bool:
+        """Con If-Match, responde 412 si los datos ya no están en la versión que leyó el cliente"""
+        expected = self.headers.get("If-Match")
+        if expected and expected.strip().strip('"') != self._file_version():
+            self._send_error(412, "Los datos cambiaron desde la versión indicada en If-Match; vuelve a leerlos")
+            return True
+        return False
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        return json.loads(self.rfile.read(length).decode("utf-8"))
+
+    @staticmethod
+    def _int_param(params: Dict[str, str], name: str, default: Optional[int], minimum: int = 1,
+                   maximum: Optional[int] = None) -> Optional[int]:
+        """Parámetro entero de la URL dentro de [minimum, maximum]; ValueError (400) si no lo es"""
+        if not params.get(name):
+            return default
+        try:
+            value = int(params[name])
+        except ValueError:
+            raise ValueError(f"El parámetro '{name}' debe ser un número entero")
+        if value < minimum or (maximum is not None and value > maximum):
+            limits = f"estar entre {minimum} y {maximum}" if maximum is not None else f"ser mayor o igual a {minimum}"
+            raise ValueError(f"El parámetro '{name}' debe {limits}")
+        return value
+
+    def _route(self) -> Tuple[list, Dict[str, str]]:
+        url = urlparse(self.path)
+        parts = [part for part in url.path.split("/") if part]
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        return parts, params
+
+    def do_GET(self):
+        parts, params = self._route()
+        with self.lock:
+            # Cambios guardados por la interfaz o la CLI sobre el mismo archivo
+            self.ai.sync()
+            self.ai.materialize_recurring()
+            if self.cache_version != self.ai.data_version:
+                FinanceAPIHandler.response_cache = {}
+                FinanceAPIHandler.cache_version = self.ai.data_version
+            body = self.response_cache.get(self.path)
+            if body is None:
+                try:
+                    payload = self._get_payload(parts, params)
+                except ValueError as e:
+                    self._send_error(400, str(e))
+                    return
+                if payload is None:
+                    self._send_error(404, "Ruta no encontrada")
+                    return
+                body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.response_cache[self.path] = body
+            version = self._file_version()
+        self._send_json(200, body, version=version)
+
+    def _get_payload(self, parts: list, params: Dict[str, str]):
+        ai = self.ai
+        if parts == ["health"]:
+            return {"status": "ok", "data_version": ai.data_version, "gemini_available": ai.gemini_available}
+        if len(parts) == 1 and parts[0] in KINDS:
+            limit = self._int_param(params, "limit", None)
+            return ai.get_transactions(parts[0], params.get("start"), params.get("end"),
+                                       params.get("category"), limit)
+        if parts == ["summary"]:
+            total_income = ai.get_total_income()
+            balance = ai.get_balance()
+            return {
+                "total_income": total_income,
+                "total_expenses": ai.get_total_expenses(),
+                "balance": balance,
+                "savings_rate": (balance / total_income * 100) if total_income > 0 else 0
+            }
+        if parts == ["aggregates", "monthly"]:
+            return ai.monthly_aggregates
+        if parts == ["aggregates", "categories"]:
+            return ai.get_expenses_by_category()
+        if parts == ["budgets"]:
+            return ai.get_budget_status(params.get("month"))
+        if parts == ["goals"]:
+            return ai.get_goals_progress()
+        if parts == ["anomalies"]:
+            return {"expenses": ai.get_anomalies(self._int_param(params, "limit", 10)),
+                    "spikes": ai.get_category_spikes(params.get("month"))}
+        if parts == ["forecast"]:
+            from .analytics import FORECAST_MAX_MONTHS
+            return ai.get_forecast(months=self._int_param(params, "months", 6, maximum=FORECAST_MAX_MONTHS))
+        if parts == ["categorize"]:
+            description = params.get("description", "")
+            return {"category": ai.suggest_category(description),
+                    "suggestions": ai.categorizer.suggest(description)}
+        return None
+
+    def do_POST(self):
+        parts, _ = self._route()
+        try:
+            body = self._read_json()
+        except (ValueError, UnicodeDecodeError):
+            self._send_error(400, "El cuerpo debe ser JSON válido")
+            return
+
+        if len(parts) == 1 and parts[0] in KINDS:
+            entries = body if isinstance(body, list) else [body]
+            with self.lock:
+                self.ai.sync()
+                if self._version_conflict():
+                    return
+                try:
+                    created = self.ai.add_transactions(parts[0], entries)
+                except ValueError as e:
+                    self._send_error(400, str(e))
+                    return
+                data_version = self.ai.data_version
+                version = self._file_version()
+            self._send_json(201, payload={"created": created, "data_version": data_version}, version=version)
+        elif parts == ["analysis"]:
+            with self.lock:
+                self.ai.sync()
+            # Gemini tarda segundos: se le consulta sin el candado de la API (el motor arma el
+            # prompt bajo el suyo), así las demás peticiones no esperan detrás
+            analysis = self.ai.get_gemini_analysis()
+            self._send_json(200, payload={"analysis": analysis})
+        elif parts == ["query"]:
+            if not isinstance(body, dict) or not body.get("question"):
+                self._send_error(400, "Falta el campo 'question'")
+                return
+            with self.lock:
+                self.ai.sync()
+            if body.get("tools"):
+                answer = self.ai.get_tool_answer(body["question"])
+            else:
+                answer = self.ai.get_specific_recommendation(body["question"])
+            self._send_json(200, payload={"answer": answer})
+        else:
+            self._send_error(404, "Ruta no encontrada")
+
+    def do_DELETE(self):
+        parts, _ = self._route()
+        if len(parts) != 2 or parts[0] not in KINDS or not parts[1].isdigit():
+            self._send_error(404, "Ruta no encontrada")
+            return
+        kind, item_id = parts[0], int(parts[1])
+        with self.lock:
+            self.ai.sync()
+            if self._version_conflict():
+                return
+            if not any(item["id"] == item_id for item in self.ai.data[kind]):
+                self._send_error(404, f"No existe el movimiento {item_id}")
+                return
+            if kind == "income":
+                self.ai.delete_income(item_id)
+            else:
+                self.ai.delete_expense(item_id)
+            data_version = self.ai.data_version
+            version = self._file_version()
+        self._send_json(200, payload={"deleted": item_id, "data_version": data_version}, version=version)
+
+
+def create_server(host: str = "127.0.0.1", port: int = 8000, ai: Optional[GeminiFinancialAI] = None,
+                  quiet: bool = True) -> ThreadingHTTPServer:
+    """Crea el servidor HTTP sobre una instancia del motor (nueva si no se indica)"""
+    FinanceAPIHandler.ai = ai or GeminiFinancialAI()
+    FinanceAPIHandler.quiet = quiet
+    server = ThreadingHTTPServer((host, port), FinanceAPIHandler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API HTTP/JSON local de FinanceIA")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--data-file", default=DATA_FILE, help="Archivo JSON de movimientos")
+    parser.add_argument("--verbose", action="store_true", help="Registrar cada petición")
+    args = parser.parse_args()
+
+    server = create_server(args.host, args.port, GeminiFinancialAI(data_file=args.data_file),
+                           quiet=not args.verbose)
+    print(f"FinanceIA API escuchando en http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        FinanceAPIHandler.ai.flush_data()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Categorización local de gastos a partir de su descripción."""
+import math
+import re
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+
+
+class ExpenseCategorizer:
+    """Clasificador Naive Bayes incremental que sugiere la categoría de un gasto a partir de su descripción"""
+
+    def __init__(self):
+        self.token_counts: Dict[str, Dict[str, int]] = {}
+        self.category_tokens: Dict[str, int] = {}
+        self.category_docs: Dict[str, int] = {}
+        self.vocabulary: Dict[str, int] = {}
+        self.total_docs = 0
+
+    @staticmethod
+    def tokenize(text: str) -> List[str]:
+        """Normaliza el texto (minúsculas, sin tildes) y lo separa en palabras y prefijos"""
+        normalized = unicodedata.normalize("NFKD", text.lower())
+        normalized = "".join(char for char in normalized if not unicodedata.combining(char))
+        tokens = []
+        for word in re.findall(r"[a-z0-9]+", normalized):
+            if len(word) < 2:
+                continue
+            tokens.append(word)
+            # El prefijo agrupa variantes como "almuerzo"/"almuerzos"
+            if len(word) > 5:
+                tokens.append(word[:5] + "*")
+        return tokens
+
+    def learn(self, description: str, category: str, weight: int = 1):
+        """Actualiza los conteos con un ejemplo (weight=-1 lo olvida)"""
+        tokens = self.tokenize(description)
+        counts = self.token_counts.setdefault(category, {})
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + weight
+            self.vocabulary[token] = self.vocabulary.get(token, 0) + weight
+            if counts[token] <= 0:
+                del counts[token]
+            if self.vocabulary[token] <= 0:
+                del self.vocabulary[token]
+        self.category_tokens[category] = self.category_tokens.get(category, 0) + weight * len(tokens)
+        self.category_docs[category] = self.category_docs.get(category, 0) + weight
+        self.total_docs += weight
+        if self.category_docs[category] <= 0:
+            for table in (self.token_counts, self.category_tokens, self.category_docs):
+                table.pop(category, None)
+
+    def unlearn(self, description: str, category: str):
+        """Olvida un ejemplo aprendido previamente"""
+        self.learn(description, category, -1)
+
+    def suggest(self, description: str, top_n: int = 3) -> List[Tuple[str, float]]:
+        """Devuelve las categorías más probables con su probabilidad"""
+        tokens = [token for token in self.tokenize(description) if token in self.vocabulary]
+        if not tokens:
+            return []
+        vocabulary_size = len(self.vocabulary)
+        scores = {}
+        for category, docs in self.category_docs.items():
+            counts = self.token_counts.get(category, {})
+            denominator = self.category_tokens.get(category, 0) + vocabulary_size
+            score = math.log(docs / self.total_docs)
+            for token in tokens:
+                score += math.log((counts.get(token, 0) + 1) / denominator)
+            scores[category] = score
+        best = max(scores.values())
+        weights = {category: math.exp(score - best) for category, score in scores.items()}
+        total = sum(weights.values())
+        ranked = sorted(weights.items(), key=lambda x: x[1], reverse=True)[:top_n]
+        return [(category, weight / total) for category, weight in ranked]
+
+    def predict(self, description: str, min_probability: float = 0.0) -> Optional[str]:
+        """Categoría más probable, o None si no hay información suficiente"""
+        suggestions = self.suggest(description, top_n=1)
+        if suggestions and suggestions[0][1] >= min_probability:
+            return suggestions[0][0]
+        return None
+
+    def predict_batch(self, descriptions: List[str], min_probability: float = 0.0) -> List[Optional[str]]:
+        """Categoriza un lote de descripciones reutilizando las predicciones repetidas"""
+        cache = {}
+        predictions = []
+        for description in descriptions:
+            if description not in cache:
+                cache[description] = self.predict(description, min_probability)
+            predictions.append(cache[description])
+        return predictions
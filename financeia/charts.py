@@ -0,0 +1,90 @@
+"""Datos de los gráficos del dashboard, agregados y reducidos en el servidor.
+
+Los gráficos reciben como mucho unos cientos de puntos aunque el historial tenga años,
+de modo que cada recarga de la página envía kilobytes y no megabytes al navegador.
+"""
+from datetime import date
+from typing import Dict, List, Tuple
+
+# Motores de gráficos (etiqueta para la interfaz -> valor guardado en config.json)
+CHART_BACKENDS = {"📈 Plotly (interactivo)": "plotly", "⚡ Nativos de Streamlit (ligeros)": "native"}
+DEFAULT_CHART_BACKEND = "plotly"
+CHART_MAX_POINTS = 300   # puntos máximos de una serie diaria
+PIE_MAX_SLICES = 8       # categorías que se muestran; el resto se agrupa en "Otras"
+
+
+def lttb_indices(xs: List[float], ys: List[float], threshold: int) -> List[int]:
+    """Largest-Triangle-Three-Buckets: posiciones de los puntos que conservan la forma de la serie"""
+    n = len(ys)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+    bucket_size = (n - 2) / (threshold - 2)
+    selected = [0]
+    previous = 0
+    for bucket in range(threshold - 2):
+        start = int(bucket * bucket_size) + 1
+        end = int((bucket + 1) * bucket_size) + 1
+        # Promedio del siguiente bucket como tercer vértice del triángulo
+        next_start, next_end = end, min(int((bucket + 2) * bucket_size) + 1, n)
+        count = next_end - next_start
+        avg_x = sum(xs[next_start:next_end]) / count
+        avg_y = sum(ys[next_start:next_end]) / count
+        prev_x, prev_y = xs[previous], ys[previous]
+        best_area, best = -1.0, start
+        for i in range(start, end):
+            area = abs((prev_x - avg_x) * (ys[i] - prev_y) - (prev_x - xs[i]) * (avg_y - prev_y))
+            if area > best_area:
+                best_area, best = area, i
+        selected.append(best)
+        previous = best
+    selected.append(n - 1)
+    return selected
+
+
+def daily_balance(income: List[Dict], expenses: List[Dict]) -> Tuple[List[str], List[float]]:
+    """Balance acumulado al cierre de cada día con movimientos"""
+    net: Dict[str, float] = {}
+    for item in income:
+        net[item["date"]] = net.get(item["date"], 0.0) + item["amount"]
+    for item in expenses:
+        net[item["date"]] = net.get(item["date"], 0.0) - item["amount"]
+    dates = sorted(net)
+    balances = []
+    running = 0.0
+    for day in dates:
+        running += net[day]
+        balances.append(round(running, 2))
+    return dates, balances
+
+
+def top_categories(totals: Dict[str, float], max_slices: int = PIE_MAX_SLICES) -> Dict[str, float]:
+    """Las categorías con más gasto, agrupando el resto en "Otras" """
+    ranked = sorted(((category, amount) for category, amount in totals.items() if amount > 0),
+                    key=lambda x: x[1], reverse=True)
+    result = dict(ranked[:max_slices])
+    rest = sum(amount for _, amount in ranked[max_slices:])
+    if rest > 0:
+        result["Otras"] = rest
+    return result
+
+
+def build_chart_data(data: Dict, monthly_aggregates: Dict[str, Dict], max_points: int = CHART_MAX_POINTS) -> Dict:
+    """Series listas para dibujar: categorías, totales y balance diario reducido con LTTB"""
+    by_category: Dict[str, float] = {}
+    totals = {"income": 0.0, "expenses": 0.0}
+    for period in monthly_aggregates.values():
+        totals["income"] += period["income"]
+        totals["expenses"] += period["expenses"]
+        for category, amount in period["categories"].items():
+            by_category[category] = by_category.get(category, 0.0) + amount
+
+    dates, balances = daily_balance(data["income"], data["expenses"])
+    ordinals = [date.fromisoformat(day).toordinal() for day in dates]
+    keep = lttb_indices(ordinals, balances, max_points)
+    return {
+        "categories": top_categories(by_category),
+        "totals": totals,
+        "balance_dates": [dates[i] for i in keep],
+        "balance_values": [balances[i] for i in keep],
+        "balance_points": len(dates)
+    }
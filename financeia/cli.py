@@ -0,0 +1,305 @@
+"""Interfaz de línea de comandos de FinanceIA.
+
+    python -m financeia add expense 12.50 "Almuerzo" --date 2024-05-10
+    python -m financeia import movimientos.csv --kind expenses
+    python -m financeia export gastos.jsonl --kind expenses
+    python -m financeia report --by month
+    python -m financeia compact
+    python -m financeia rates tipos_de_cambio.csv
+    python -m financeia duplicates --merge-exact
+    python -m financeia analyze --all-months
+    python -m financeia statements --all-months --pdf
+
+Los archivos de importación/exportación se procesan fila por fila y por lotes, de modo
+que la memoria usada no depende del tamaño del archivo (más allá del propio libro).
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+from datetime import date
+from itertools import islice
+from typing import Dict, Iterator, List, Optional
+
+from .core import CONFIG_FILE, DATA_FILE, GeminiFinancialAI
+from .currency import format_amount
+from .reports import generate_statements, pdf_available
+
+KIND_ALIASES = {"income": "income", "ingreso": "income", "ingresos": "income",
+                "expense": "expenses", "expenses": "expenses", "gasto": "expenses", "gastos": "expenses"}
+TEXT_FIELDS = {"income": "source", "expenses": "description"}
+
+
+def _read_rows(path: str, file_format: str) -> Iterator[Dict]:
+    """Lee las filas de un archivo CSV o JSONL sin cargarlo completo"""
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        if file_format == "csv":
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def _normalize_row(row: Dict, default_kind: Optional[str]) -> Dict:
+    """Adapta una fila importada al formato del libro (acepta description/source indistintamente)"""
+    kind = KIND_ALIASES.get(str(row.get("kind") or row.get("type") or default_kind or "").lower())
+    if not kind:
+        raise ValueError(f"No se pudo determinar si la fila es ingreso o gasto: {row}")
+    text = row.get(TEXT_FIELDS[kind]) or row.get("description") or row.get("source") or ""
+    return {"kind": kind, "amount": row.get("amount"), "date": row.get("date"),
+            TEXT_FIELDS[kind]: text, "category": row.get("category") or None, "currency": row.get("currency") or None}
+
+
+def _print_table(headers: List[str], rows: List[List[str]]):
+    """Imprime una tabla alineada en texto plano"""
+    widths = [max(len(str(value)) for value in column) for column in zip(headers, *rows)]
+    print("  ".join(str(header).ljust(width) for header, width in zip(headers, widths)))
+    print("  ".join("-" * width for width in widths))
+    for row in rows:
+        print("  ".join(str(value).rjust(width) if i else str(value).ljust(width)
+                        for i, (value, width) in enumerate(zip(row, widths))))
+
+
+def _detect_format(path: str, file_format: Optional[str]) -> str:
+    return file_format or ("jsonl" if path.endswith((".jsonl", ".json")) else "csv")
+
+
+def cmd_add(ai: GeminiFinancialAI, args) -> int:
+    kind = KIND_ALIASES[args.kind]
+    entry = {"amount": args.amount, TEXT_FIELDS[kind]: args.text, "date": args.date, "category": args.category,
+             "currency": args.currency}
+    created = ai.add_transactions(kind, [entry])[0]
+    original = f" = {format_amount(created['original_amount'], created['currency'])}" if created.get("currency") else ""
+    print(f"Registrado #{created['id']}: {created['date']} {created[TEXT_FIELDS[kind]]} "
+          f"S/{created['amount']:,.2f}{original} ({created['category']})")
+    return 0
+
+
+def cmd_import(ai: GeminiFinancialAI, args) -> int:
+    rows = _read_rows(args.file, _detect_format(args.file, args.format))
+    imported = {"income": 0, "expenses": 0}
+    while True:
+        batch = [_normalize_row(row, args.kind) for row in islice(rows, args.batch_size)]
+        if not batch:
+            break
+        for kind in ("income", "expenses"):
+            # Los gastos sin categoría se categorizan en bloque dentro de add_transactions
+            entries = [row for row in batch if row["kind"] == kind]
+            imported[kind] += len(ai.add_transactions(kind, entries, save=False))
+    ai.save_data()
+    print(f"Importados {imported['income']} ingresos y {imported['expenses']} gastos")
+    return 0
+
+
+def cmd_export(ai: GeminiFinancialAI, args) -> int:
+    kinds = [KIND_ALIASES[args.kind]] if args.kind else ["income", "expenses"]
+    file_format = _detect_format(args.file, args.format)
+    fields = ["kind", "id", "date", "amount", "category", "description", "currency", "original_amount"]
+    count = 0
+    with open(args.file, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fields, extrasaction="ignore") if file_format == "csv" else None
+        if writer:
+            writer.writeheader()
+        for kind in kinds:
+            for item in ai.get_transactions(kind, args.start, args.end):
+                row = {**item, "kind": kind, "description": item.get(TEXT_FIELDS[kind], "")}
+                if writer:
+                    writer.writerow(row)
+                else:
+                    f.write(json.dumps(row, ensure_ascii=False) + "\n")
+                count += 1
+    print(f"Exportados {count} movimientos a {args.file}")
+    return 0
+
+
+def cmd_report(ai: GeminiFinancialAI, args) -> int:
+    if args.by == "month":
+        rows = []
+        for month in sorted(ai.monthly_aggregates):
+            if (args.start and month < args.start[:7]) or (args.end and month > args.end[:7]):
+                continue
+            period = ai.monthly_aggregates[month]
+            rows.append([month, f"{period['income']:,.2f}", f"{period['expenses']:,.2f}",
+                         f"{period['income'] - period['expenses']:,.2f}"])
+        _print_table(["Mes", "Ingresos (S/)", "Gastos (S/)", "Balance (S/)"], rows)
+    else:
+        totals: Dict[str, float] = {}
+        for month, period in ai.monthly_aggregates.items():
+            if (args.start and month < args.start[:7]) or (args.end and month > args.end[:7]):
+                continue
+            for category, amount in period["categories"].items():
+                totals[category] = totals.get(category, 0.0) + amount
+        grand_total = sum(totals.values())
+        rows = [[category, f"{amount:,.2f}", f"{amount / grand_total * 100 if grand_total else 0:.1f}%"]
+                for category, amount in sorted(totals.items(), key=lambda x: x[1], reverse=True)]
+        _print_table(["Categoría", "Gastos (S/)", "%"], rows)
+    return 0
+
+
+def cmd_compact(ai: GeminiFinancialAI, args) -> int:
+    # Al cargar ya se completaron las claves nuevas y se corrigieron IDs duplicados
+    with ai.lock:
+        for kind in ("income", "expenses"):
+            ai.data[kind].sort(key=lambda x: (x["date"], x["id"]))
+    ai.config["compact_storage"] = not args.indent
+    ai.save_config()
+    ai.save_data()
+    print(f"{ai.data_file} compactado: {len(ai.data['income'])} ingresos, {len(ai.data['expenses'])} gastos")
+    return 0
+
+
+def cmd_rates(ai: GeminiFinancialAI, args) -> int:
+    if args.file:
+        count = ai.import_exchange_rates(_read_rows(args.file, _detect_format(args.file, args.format)))
+        print(f"Importados {count} tipos de cambio")
+    rows = [[currency, series[-1][0], f"{series[-1][1]:,.4f}", str(len(series))]
+            for currency, series in sorted(ai.data["exchange_rates"].items()) if series]
+    _print_table(["Moneda", "Desde", "S/ por unidad", "Registros"], rows)
+    return 0
+
+
+def cmd_duplicates(ai: GeminiFinancialAI, args) -> int:
+    pairs = ai.get_duplicates(KIND_ALIASES[args.kind] if args.kind else None)
+    if args.merge_exact:
+        exact = [pair for pair in pairs if pair["reason"] == "exact"]
+        for pair in exact:
+            ai.merge_duplicate(pair["kind"], pair["keep"]["id"], pair["duplicate"]["id"])
+        print(f"Fusionados {len(exact)} duplicados exactos")
+        pairs = ai.get_duplicates(KIND_ALIASES[args.kind] if args.kind else None)
+    rows = []
+    for pair in pairs:
+        keep, duplicate = pair["keep"], pair["duplicate"]
+        rows.append([pair["kind"], f"#{keep['id']} {keep['date']} {keep.get(TEXT_FIELDS[pair['kind']], '')}",
+                     f"#{duplicate['id']} {duplicate['date']} {duplicate.get(TEXT_FIELDS[pair['kind']], '')}",
+                     f"{keep['amount']:,.2f}", f"{pair['similarity']:.2f}"])
+    if rows:
+        _print_table(["Tipo", "Conservar", "Duplicado", "Monto (S/)", "Similitud"], rows)
+    else:
+        print("No se encontraron duplicados")
+    return 0
+
+
+def cmd_analyze(ai: GeminiFinancialAI, args) -> int:
+    ai.setup_gemini()
+    if not ai.gemini_available:
+        print(ai.gemini_status[1] if ai.gemini_status else "❌ Gemini no está disponible. Configura tu API key.",
+              file=sys.stderr)
+        return 1
+    months = sorted(ai.monthly_aggregates) if args.all_months else (args.months or [date.today().strftime("%Y-%m")])
+    for month in months:
+        print(f"=== {month} ===")
+        print(ai.get_monthly_analysis(month, force=args.force))
+        # Guardar tras cada mes para no perder análisis si el proceso se interrumpe
+        ai.save_data()
+    return 0
+
+
+def cmd_statements(ai: GeminiFinancialAI, args) -> int:
+    # Con --users cada archivo es un estudiante; los estados se nombran con el nombre del archivo
+    engines = [(ai, "")]
+    if args.users:
+        engines = [(ai, os.path.splitext(os.path.basename(ai.data_file))[0])]
+        for path in args.users:
+            if not os.path.exists(path):
+                raise ValueError(f"No existe el archivo de datos {path}")
+            # Solo se leen: los recurrentes vencidos se generan en memoria sin escribir el archivo ajeno
+            engine = GeminiFinancialAI(data_file=path, config_file=args.config_file, connect_gemini=False,
+                                       read_only=True)
+            engines.append((engine, os.path.splitext(os.path.basename(path))[0]))
+    periods = []
+    for engine, owner in engines:
+        months = sorted(engine.monthly_aggregates) if args.all_months else (args.months or [date.today().strftime("%Y-%m")])
+        periods.extend(engine.get_statement_period(month, owner) for month in months)
+    if args.pdf and not pdf_available():
+        print("⚠️ weasyprint no está instalado: solo se generan los HTML", file=sys.stderr)
+    paths = generate_statements(periods, args.out, pdf=args.pdf, workers=args.workers)
+    print(f"{len(periods)} estados de cuenta generados en {args.out} ({len(paths)} archivos)")
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="financeia", description="Operaciones por lotes sobre el libro de FinanceIA")
+    parser.add_argument("--data-file", default=DATA_FILE, help="Archivo JSON de movimientos")
+    parser.add_argument("--config-file", default=CONFIG_FILE, help="Archivo JSON de configuración")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    add = subparsers.add_parser("add", help="Registrar un ingreso o gasto")
+    add.add_argument("kind", choices=sorted(KIND_ALIASES))
+    add.add_argument("amount", type=float)
+    add.add_argument("text", help="Descripción del gasto o fuente del ingreso")
+    add.add_argument("--date", default=date.today().isoformat())
+    add.add_argument("--category", help="Si se omite en un gasto, se sugiere automáticamente")
+    add.add_argument("--currency", help="Moneda del monto (por defecto PEN); se convierte a soles")
+    add.set_defaults(func=cmd_add)
+
+    import_ = subparsers.add_parser("import", help="Importar movimientos desde CSV o JSONL")
+    import_.add_argument("file")
+    import_.add_argument("--kind", choices=sorted(KIND_ALIASES),
+                         help="Tipo de todas las filas (si no, se usa la columna kind/type)")
+    import_.add_argument("--format", choices=["csv", "jsonl"])
+    import_.add_argument("--batch-size", type=int, default=5000)
+    import_.set_defaults(func=cmd_import)
+
+    export = subparsers.add_parser("export", help="Exportar movimientos a CSV o JSONL")
+    export.add_argument("file")
+    export.add_argument("--kind", choices=sorted(KIND_ALIASES))
+    export.add_argument("--format", choices=["csv", "jsonl"])
+    export.add_argument("--start", help="Fecha inicial AAAA-MM-DD")
+    export.add_argument("--end", help="Fecha final AAAA-MM-DD")
+    export.set_defaults(func=cmd_export)
+
+    report = subparsers.add_parser("report", help="Totales por mes o por categoría")
+    report.add_argument("--by", choices=["month", "category"], default="month")
+    report.add_argument("--start", help="Fecha o mes inicial")
+    report.add_argument("--end", help="Fecha o mes final")
+    report.set_defaults(func=cmd_report)
+
+    compact = subparsers.add_parser("compact", help="Migrar y compactar el archivo de datos")
+    compact.add_argument("--indent", action="store_true", help="Mantener el JSON con sangría")
+    compact.set_defaults(func=cmd_compact)
+
+    rates = subparsers.add_parser("rates", help="Importar y listar tipos de cambio")
+    rates.add_argument("file", nargs="?", help="CSV o JSONL con columnas date, currency, rate")
+    rates.add_argument("--format", choices=["csv", "jsonl"])
+    rates.set_defaults(func=cmd_rates)
+
+    duplicates = subparsers.add_parser("duplicates", help="Buscar movimientos duplicados")
+    duplicates.add_argument("--kind", choices=sorted(KIND_ALIASES))
+    duplicates.add_argument("--merge-exact", action="store_true",
+                            help="Fusionar los idénticos (misma fecha, monto y descripción)")
+    duplicates.set_defaults(func=cmd_duplicates)
+
+    analyze = subparsers.add_parser("analyze", help="Análisis de Gemini por mes, en lote")
+    analyze.add_argument("months", nargs="*", help="Meses AAAA-MM (por defecto el actual)")
+    analyze.add_argument("--all-months", action="store_true")
+    analyze.add_argument("--force", action="store_true", help="Regenerar análisis ya guardados")
+    analyze.set_defaults(func=cmd_analyze)
+
+    statements = subparsers.add_parser("statements", help="Estados de cuenta mensuales en HTML/PDF, en lote")
+    statements.add_argument("months", nargs="*", help="Meses AAAA-MM (por defecto el actual)")
+    statements.add_argument("--all-months", action="store_true")
+    statements.add_argument("--out", default="estados", help="Carpeta de salida")
+    statements.add_argument("--pdf", action="store_true", help="Generar también PDF (requiere weasyprint)")
+    statements.add_argument("--users", nargs="+", metavar="DATA_FILE", help="Archivos de datos de otros estudiantes")
+    statements.add_argument("--workers", type=int, help="Procesos en paralelo (por defecto, uno por núcleo)")
+    statements.set_defaults(func=cmd_statements)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    ai = GeminiFinancialAI(data_file=args.data_file, config_file=args.config_file, connect_gemini=False)
+    try:
+        status = args.func(ai, args)
+        # Las escrituras se agrupan en segundo plano: asegurar que todo quede en disco antes de salir
+        ai.flush_data()
+        return status
+    except (ValueError, OSError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
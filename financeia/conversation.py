@@ -0,0 +1,132 @@
+"""Conversación de Consultas con memoria acotada.
+
+El contexto financiero se envía una sola vez al iniciar la conversación; después cada
+pregunta lleva solo los movimientos que cambiaron desde la anterior. Cuando el historial
+supera el límite de tokens, los turnos antiguos se reemplazan por un resumen.
+"""
+from typing import Dict, List, Optional
+
+MAX_HISTORY_TOKENS = 2000   # tokens aproximados de preguntas y respuestas antes de resumir
+KEEP_RECENT_TURNS = 3       # turnos que se conservan completos al resumir
+CHARS_PER_TOKEN = 4         # estimación simple para texto en español
+DELTA_LIMIT = 15            # movimientos nuevos que se detallan en una actualización
+
+
+class ConversationSession:
+    """Sesión de chat con Gemini que recuerda las preguntas anteriores del usuario"""
+
+    def __init__(self, ai, max_history_tokens: int = MAX_HISTORY_TOKENS, keep_recent_turns: int = KEEP_RECENT_TURNS):
+        self.ai = ai
+        self.max_history_tokens = max_history_tokens
+        self.keep_recent_turns = keep_recent_turns
+        self.turns: List[Dict] = []
+        self.summary = ""
+        # Los turnos anteriores a esta posición ya están incluidos en el resumen
+        self.summarized = 0
+        self.chat = None
+        self.checkpoint: Optional[Dict] = None
+
+    def reset(self):
+        """Empieza una conversación nueva"""
+        self.__init__(self.ai, self.max_history_tokens, self.keep_recent_turns)
+
+    def _snapshot(self) -> Dict:
+        """Estado del libro con el que Gemini está al día"""
+        snapshot = {"version": self.ai.data_version}
+        # Por UID: los IDs numéricos se reutilizan al borrar el último y volver a añadir
+        for kind in ("income", "expenses"):
+            snapshot[kind] = {item["uid"] for item in self.ai.data[kind]}
+        return snapshot
+
+    def _start_chat(self):
+        """Crea el chat con el contexto financiero, el resumen previo y los turnos recientes"""
+        opening = f"""Eres un asesor financiero personal. Responderás varias preguntas del usuario en esta conversación.
+Te enviaré actualizaciones cuando sus datos cambien.
+
+INFORMACIÓN FINANCIERA:
+{self.ai.get_financial_summary()}"""
+        if self.summary:
+            opening += f"\nRESUMEN DE LA CONVERSACIÓN ANTERIOR:\n{self.summary}\n"
+        history = [{"role": "user", "parts": [opening]},
+                   {"role": "model", "parts": ["Entendido. ¿Qué quieres saber de tus finanzas?"]}]
+        for turn in self.turns[self.summarized:]:
+            history.append({"role": "user", "parts": [turn["question"]]})
+            history.append({"role": "model", "parts": [turn["answer"]]})
+        self.chat = self.ai.model.start_chat(history=history)
+        self.checkpoint = self._snapshot()
+
+    def _delta(self) -> Optional[str]:
+        """Cambios del libro desde la última pregunta; None si hay que reenviar todo el contexto"""
+        if self.checkpoint["version"] == self.ai.data_version:
+            return ""
+        lines = []
+        for kind, label in (("income", "ingresos"), ("expenses", "gastos")):
+            old_uids = self.checkpoint[kind]
+            entries = self.ai.data[kind]
+            current_uids = {item["uid"] for item in entries}
+            if old_uids and not old_uids & current_uids:
+                # Los datos se borraron o reemplazaron por completo: el resumen anterior ya no sirve
+                return None
+            new_entries = [item for item in entries if item["uid"] not in old_uids]
+            deleted = len(old_uids - current_uids)
+            if new_entries:
+                lines.append(f"- Nuevos {label} ({len(new_entries)}):")
+                for item in sorted(new_entries, key=lambda x: x["date"])[-DELTA_LIMIT:]:
+                    text = item.get("description") or item.get("source")
+                    lines.append(f"  - {item['date']}: {text} S/{item['amount']:,.2f} ({item['category']})")
+            if deleted > 0:
+                lines.append(f"- {label.capitalize()} eliminados: {deleted}")
+        lines.append(f"- Totales actualizados: ingresos S/{self.ai.get_total_income():,.2f}, "
+                     f"gastos S/{self.ai.get_total_expenses():,.2f}, balance S/{self.ai.get_balance():,.2f}")
+        return "ACTUALIZACIÓN DE DATOS DESDE LA ÚLTIMA PREGUNTA:\n" + "\n".join(lines)
+
+    def history_tokens(self) -> int:
+        """Tokens aproximados de las preguntas y respuestas que se reenvían en cada mensaje"""
+        if self.chat is None:
+            return 0
+        # Los dos primeros mensajes son el contexto inicial, que no cuenta para el límite
+        characters = sum(len(part.text) for content in self.chat.history[2:] for part in content.parts)
+        return characters // CHARS_PER_TOKEN
+
+    def _compress(self):
+        """Resume los turnos antiguos y reinicia el chat solo con el resumen y los turnos recientes"""
+        older = self.turns[self.summarized:len(self.turns) - self.keep_recent_turns]
+        if not older:
+            return
+        transcript = "\n".join(f"Usuario: {turn['question']}\nAsesor: {turn['answer']}" for turn in older)
+        prompt = f"""Resume en menos de 150 palabras esta conversación entre un usuario y su asesor financiero.
+Conserva las cifras, decisiones y preferencias que el usuario mencionó.
+
+{f"Resumen previo: {self.summary}" if self.summary else ""}
+{transcript}"""
+        try:
+            self.summary = self.ai.model.generate_content(prompt).text
+        except Exception:
+            # Sin resumen de Gemini se conservan al menos las preguntas
+            self.summary += "\n" + "\n".join(f"- El usuario preguntó: {turn['question']}" for turn in older)
+        self.summarized += len(older)
+        self._start_chat()
+
+    def ask(self, question: str) -> str:
+        """Envía una pregunta a la conversación y devuelve la respuesta de Gemini"""
+        if not self.ai.gemini_available or not hasattr(self.ai, 'model'):
+            return "❌ Gemini no está disponible. Por favor configura tu API key."
+
+        try:
+            delta = self._delta() if self.chat is not None else None
+            if delta is None:
+                self._start_chat()
+                delta = ""
+            # Las filas relevantes van solo en este mensaje; al resumir quedan fuera del historial
+            relevant_context = self.ai.get_relevant_context(question, limit=8)
+            message = "\n".join(part for part in (delta, relevant_context, f"PREGUNTA: {question}") if part)
+            response = self.chat.send_message(message)
+            answer = response.text
+        except Exception as e:
+            return f"❌ Error: {str(e)}"
+
+        self.checkpoint = self._snapshot()
+        self.turns.append({"question": question, "answer": answer})
+        if self.history_tokens() > self.max_history_tokens:
+            self._compress()
+        return answer
@@ -0,0 +1,1218 @@
+"""Motor de FinanceIA: libro de movimientos, agregados, presupuestos, recurrentes y prompts para Gemini.
+
+No depende de Streamlit; numpy/pandas (analytics) y el SDK de Gemini se importan solo cuando se usan.
+"""
+import calendar
+import functools
+import hashlib
+import json
+import math
+import os
+import threading
+from datetime import datetime, date, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .categorizer import ExpenseCategorizer
+from .charts import build_chart_data
+from .currency import BASE_CURRENCY, ExchangeRates
+from .duplicates import find_duplicates, pair_key
+from .persistence import DEFAULT_DURABILITY, DURABILITY_MODES, PersistenceManager, StaleFileError, atomic_write
+from .retrieval import TransactionIndex
+from .sync import SYNC_SECTIONS, file_etag, file_lock, get_store, merge_section, new_uid
+from .tools import TOOL_CALL_BUDGET, TOOL_DECLARATIONS, LedgerTools
+
+# Archivo para almacenar los datos
+DATA_FILE = "financial_data.json"
+CONFIG_FILE = "config.json"
+
+# Frecuencias de los movimientos recurrentes
+RECURRING_FREQUENCIES = {"Mensual": "monthly", "Semanal": "weekly", "Personalizada": "custom"}
+
+# Categorías disponibles para los movimientos
+INCOME_CATEGORIES = ["Salario", "Freelance", "Inversiones", "Venta", "Bono", "Pensión", "Alquiler", "Otro"]
+EXPENSE_CATEGORIES = ["Alimentación", "Transporte", "Vivienda", "Servicios", "Salud",
+                      "Entretenimiento", "Ropa", "Educación", "Tecnología", "Deudas", "Otro"]
+
+
+def _mutation(method):
+    """Ejecuta un método que modifica el libro bajo el candado que comparte con el guardado en segundo plano.
+
+    En modo estricto la escritura se hace al soltar el candado: el archivo siempre se bloquea
+    antes que el motor (como en sync y en el guardado en segundo plano), así dos hilos que
+    comparten el motor no se bloquean mutuamente.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        depth = getattr(self._mutating, "depth", 0)
+        self._mutating.depth = depth + 1
+        try:
+            with self.lock:
+                result = method(self, *args, **kwargs)
+        finally:
+            self._mutating.depth = depth
+        if depth == 0:
+            self.persistence.flush_if_strict()
+        return result
+    return wrapper
+
+
+class GeminiFinancialAI:
+    def __init__(self, data_file: str = DATA_FILE, config_file: str = CONFIG_FILE, connect_gemini: bool = True,
+                 read_only: bool = False):
+        self.data_file = data_file
+        self.config_file = config_file
+        # Solo lectura (reportes sobre archivos ajenos): los cambios en memoria nunca se escriben
+        self.read_only = read_only
+        # Último mensaje de conexión con Gemini (nivel, texto) para que lo muestre la interfaz
+        self.gemini_status: Optional[Tuple[str, str]] = None
+        self.lock = threading.RLock()
+        # Profundidad de modificaciones anidadas del hilo actual (ver _mutation)
+        self._mutating = threading.local()
+        # Versión del archivo compartida con las demás sesiones del proceso (ver sync.py)
+        self.store = get_store(self.data_file)
+        with file_lock(self.data_file):
+            self.data = self.load_data()
+            self.etag = file_etag(self.data_file)
+            self.store_version = self.store.version
+        # Operaciones sobre movimientos aún no guardadas y secciones tal como se vieron en disco
+        self._pending_ops: List[Tuple] = []
+        self._replaying = False
+        self._synced_sections = self._section_texts()
+        self._written = None
+        self.config = self.load_config()
+        self.persistence = PersistenceManager(self.data_file, self._serialize_data,
+                                              self.config.get("durability", DEFAULT_DURABILITY),
+                                              after_write=self._publish_write)
+        self.data_version = 0
+        self._anomaly_cache = None
+        self._forecast_cache = {}
+        self._chart_cache = {}
+        self._duplicates_cache = None
+        self.ledger_tools = LedgerTools(self)
+        self.exchange_rates = ExchangeRates(self.data["exchange_rates"])
+        self._rebuild_indexes()
+        self._materialized_until = None
+        self.materialize_recurring()
+        # Guardar datos corregidos si hubo cambios en los IDs
+        self.save_data()
+        self.flush_data()
+        self.gemini_available = False
+        if connect_gemini:
+            self.setup_gemini()
+
+    def load_config(self) -> Dict:
+        """Carga la configuración desde el archivo local"""
+        if os.path.exists(self.config_file):
+            try:
+                with open(self.config_file, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except:
+                return {"gemini_api_key": ""}
+        return {"gemini_api_key": ""}
+
+    def save_config(self):
+        """Guarda la configuración en el archivo local"""
+        atomic_write(self.config_file, json.dumps(self.config, ensure_ascii=False, indent=2),
+                     fsync=self.persistence.durability != "fast")
+
+    def set_durability(self, mode: str):
+        """Cambia el modo de guardado (ver DURABILITY_MODES) y escribe lo pendiente"""
+        if mode not in DURABILITY_MODES.values():
+            raise ValueError(f"Modo de durabilidad desconocido: {mode}")
+        self.flush_data()
+        self.persistence.durability = mode
+        self.config["durability"] = mode
+        self.save_config()
+
+    def setup_gemini(self):
+        """Configura la API de Gemini"""
+        if self.config.get("gemini_api_key"):
+            try:
+                # Importación diferida: el SDK solo se carga cuando hay una API key configurada
+                import google.generativeai as genai
+
+                genai.configure(api_key=self.config["gemini_api_key"])
+
+                # Lista de modelos a probar en orden de preferencia
+                models_to_try = [
+                    'gemini-2.0-flash-exp',
+                    'gemini-1.5-flash',
+                    'gemini-1.5-pro',
+                    'models/gemini-2.0-flash-exp',
+                    'models/gemini-1.5-flash',
+                    'models/gemini-1.5-pro'
+                ]
+
+                for model_name in models_to_try:
+                    try:
+                        self.model = genai.GenerativeModel(model_name)
+                        self.gemini_available = True
+                        self.model_name = model_name
+                        self.gemini_status = ("success", f"✅ Conectado con {model_name}")
+                        break
+                    except Exception as model_error:
+                        continue
+
+                if not hasattr(self, 'gemini_available') or not self.gemini_available:
+                    self.gemini_available = False
+                    self.gemini_status = ("error", "❌ No se encontró ningún modelo disponible")
+
+            except Exception as e:
+                self.gemini_available = False
+                self.gemini_status = ("error", f"Error al configurar Gemini: {str(e)}")
+        else:
+            self.gemini_available = False
+
+    def set_api_key(self, api_key: str):
+        """Establece la API key de Gemini"""
+        self.config["gemini_api_key"] = api_key
+        self.save_config()
+        self.setup_gemini()
+
+    def _empty_data(self) -> Dict:
+        """Estructura vacía del libro de movimientos"""
+        return {"income": [], "expenses": [], "goals": [], "budgets": {}, "recurring": [], "analyses": {},
+                "exchange_rates": {}, "ignored_duplicates": [], "user_profile": {}}
+
+    def load_data(self) -> Dict:
+        """Carga los datos desde el archivo local"""
+        if os.path.exists(self.data_file):
+            try:
+                data = self._read_data_file()
+                # Corregir IDs duplicados
+                self._fix_duplicate_ids(data)
+                return data
+            except:
+                return self._empty_data()
+        return self._empty_data()
+
+    def _read_data_file(self) -> Dict:
+        """Lee el archivo completando las claves y los UID que falten (lanza si no se puede leer)"""
+        with open(self.data_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        # Completar claves de versiones anteriores del archivo
+        for key, value in self._empty_data().items():
+            data.setdefault(key, value)
+        for kind in ("income", "expenses"):
+            for i, item in enumerate(data[kind]):
+                if "uid" not in item:
+                    # Deterministas: dos sesiones que cargan el mismo archivo antiguo asignan los mismos
+                    seed = f"{kind}|{i}|{item.get('date')}|{item.get('amount')}"
+                    item["uid"] = hashlib.sha1(seed.encode("utf-8")).hexdigest()[:12]
+        # Las reglas recurrentes antiguas se identificaban por su ID numérico, que se reutilizaba
+        rule_uids = {}
+        for rule in data["recurring"]:
+            if "uid" not in rule:
+                seed = f"recurring|{rule.get('id')}|{rule.get('start_date')}|{rule.get('description')}"
+                rule["uid"] = hashlib.sha1(seed.encode("utf-8")).hexdigest()[:12]
+            rule_uids[rule.get("id")] = rule["uid"]
+        for kind in ("income", "expenses"):
+            for item in data[kind]:
+                if isinstance(item.get("recurring_id"), int) and item["recurring_id"] in rule_uids:
+                    item["recurring_id"] = rule_uids[item["recurring_id"]]
+        return data
+
+    def _fix_duplicate_ids(self, data: Dict):
+        """Corrige IDs duplicados en los datos"""
+        # Corregir IDs de ingresos
+        for i, income in enumerate(data.get("income", [])):
+            income["id"] = i + 1
+
+        # Corregir IDs de gastos
+        for i, expense in enumerate(data.get("expenses", [])):
+            expense["id"] = i + 1
+
+    def _serialize_data(self, background: bool = False) -> str:
+        """JSON del libro, tomado bajo el candado para no leer una modificación a medias"""
+        # Con compact_storage el archivo se escribe sin sangría (ver `python -m financeia compact`)
+        indent = None if self.config.get("compact_storage") else 2
+        with self.lock:
+            # Se llama con el archivo bloqueado: primero se incorporan los cambios de otras sesiones.
+            # El hilo del temporizador no fusiona: cambiaría self.data mientras la interfaz o la
+            # API lo leen sin candado; si otra sesión escribió, el guardado espera a sync()
+            if not background:
+                self._sync_locked()
+            elif file_etag(self.data_file) not in (None, self.etag):
+                raise StaleFileError(self.data_file)
+            changed = {name: text for name, text in self._section_texts().items()
+                       if text != self._synced_sections.get(name)}
+            self._written = (self.etag, len(self._pending_ops), changed)
+            return json.dumps(self.data, ensure_ascii=False, indent=indent)
+
+    def _publish_write(self):
+        """Tras escribir el archivo, publica las operaciones guardadas para las demás sesiones"""
+        with self.lock:
+            base_etag, count, changed = self._written
+            ops = self._pending_ops[:count]
+            del self._pending_ops[:count]
+            self.etag = file_etag(self.data_file)
+            self.store_version = self.store.publish(base_etag, self.etag, ops, changed)
+            self._synced_sections.update(changed)
+
+    def save_data(self):
+        """Marca los datos como pendientes de guardar; se escriben en segundo plano agrupando cambios"""
+        if self.read_only:
+            return
+        # Dentro de una modificación la escritura estricta espera a que se suelte el candado
+        self.persistence.mark_dirty(defer=getattr(self._mutating, "depth", 0) > 0)
+
+    def flush_data(self):
+        """Escribe ya los cambios pendientes (al cerrar la CLI o la API)"""
+        self.persistence.flush()
+
+    def sync(self) -> int:
+        """Incorpora lo que otras sesiones o procesos guardaron desde la última vez que se vio el archivo.
+
+        Devuelve cuántos movimientos y secciones cambiaron (0 si el archivo no cambió).
+        """
+        with file_lock(self.data_file):
+            with self.lock:
+                count = self._sync_locked()
+        if self.persistence.stale:
+            # Un guardado en segundo plano esperaba a que se incorporaran los cambios ajenos
+            self.persistence.flush()
+        return count
+
+    def _section_texts(self) -> Dict[str, str]:
+        return {name: json.dumps(self.data[name], sort_keys=True) for name in SYNC_SECTIONS}
+
+    def _sync_locked(self) -> int:
+        etag = file_etag(self.data_file)
+        # Si el archivo desapareció se conserva la copia en memoria; la próxima escritura lo recrea
+        if etag is None or etag == self.etag:
+            return 0
+        store_etag, version, changes = self.store.changes_since(self.store_version)
+        if changes is None or store_etag != etag:
+            # Lo escribió otro proceso o esta sesión quedó demasiado atrás: se relee el archivo
+            count = self._reload_from_disk()
+        else:
+            count = sum(self._apply_remote(ops, sections) for _, ops, sections in changes)
+        self.etag = etag
+        self.store_version = version
+        return count
+
+    def _apply_remote(self, ops: List[Tuple], sections: Dict[str, str]) -> int:
+        """Aplica una escritura de otra sesión del proceso: solo sus operaciones y secciones cambiadas"""
+        self._replaying = True
+        try:
+            count = self._merge_ops(ops, saved=True)
+        finally:
+            self._replaying = False
+        for name, text in sections.items():
+            base = self._synced_sections[name]
+            if json.dumps(self.data[name], sort_keys=True) == base:
+                value = json.loads(text)
+            else:
+                value = merge_section(name, json.loads(base), self.data[name], json.loads(text))
+            self._set_section(name, value)
+            self._synced_sections[name] = text
+        if sections:
+            self._sections_changed("exchange_rates" in sections)
+        return count + len(sections)
+
+    def _set_section(self, name: str, value):
+        if name == "exchange_rates":
+            # ExchangeRates guarda una referencia a la tabla: se actualiza en su lugar
+            self.data[name].clear()
+            self.data[name].update(value)
+        else:
+            self.data[name] = value
+
+    def _sections_changed(self, rates_changed: bool):
+        self._materialized_until = None
+        if rates_changed:
+            self.exchange_rates.version += 1
+            self._reconvert_foreign()
+        self.data_version += 1
+
+    def _merge_ops(self, ops: List[Tuple], saved: bool) -> int:
+        """Aplica operaciones sobre movimientos: de otra sesión (saved=True) o las propias sobre el archivo releído.
+
+        Borrar algo que ya no existe no hace nada. Si dos sesiones generaron la misma ocurrencia
+        de una regla recurrente queda la que ya estaba guardada.
+        """
+        kinds = ("income", "expenses")
+        by_uid = {kind: {item["uid"]: item for item in self.data[kind]} for kind in kinds}
+        by_occurrence = {kind: {(item["recurring_id"], item["date"]): item
+                                for item in self.data[kind] if item.get("recurring_id")} for kind in kinds}
+        next_id = {kind: max((item["id"] for item in self.data[kind]), default=0) + 1 for kind in kinds}
+        unsaved = {op[2]["uid"] for op in self._pending_ops if op[0] == "add"}
+        removed = {kind: set() for kind in kinds}
+        dropped = set()
+        applied = 0
+        for action, kind, payload in ops:
+            if action == "delete":
+                item = by_uid[kind].pop(payload, None)
+                if item is None:
+                    continue
+                by_occurrence[kind].pop((item.get("recurring_id"), item["date"]), None)
+                self._apply_change(kind, item, -1)
+                removed[kind].add(id(item))
+            else:
+                if payload["uid"] in by_uid[kind]:
+                    continue
+                occurrence = (payload.get("recurring_id"), payload["date"])
+                twin = by_occurrence[kind].get(occurrence) if payload.get("recurring_id") else None
+                if twin is not None:
+                    if not saved or twin["uid"] not in unsaved:
+                        if not saved:
+                            dropped.add(payload["uid"])
+                        continue
+                    # La copia local aún no guardada cede su lugar a la que ya está en el archivo
+                    del by_uid[kind][twin["uid"]]
+                    self._apply_change(kind, twin, -1)
+                    removed[kind].add(id(twin))
+                    dropped.add(twin["uid"])
+                entry = dict(payload)
+                entry["id"] = next_id[kind]
+                next_id[kind] += 1
+                self.data[kind].append(entry)
+                by_uid[kind][entry["uid"]] = entry
+                if entry.get("recurring_id"):
+                    by_occurrence[kind][occurrence] = entry
+                self._apply_change(kind, entry, 1)
+            applied += 1
+        for kind in kinds:
+            if removed[kind]:
+                self.data[kind] = [item for item in self.data[kind] if id(item) not in removed[kind]]
+        if dropped:
+            self._pending_ops = [op for op in self._pending_ops if op[0] != "add" or op[2]["uid"] not in dropped]
+        return applied
+
+    def _reload_from_disk(self) -> int:
+        """Relee el archivo y vuelve a aplicar encima los cambios locales aún no guardados"""
+        try:
+            disk = self._read_data_file()
+        except (OSError, ValueError):
+            # Ilegible: no se pierde la copia en memoria, que lo reemplazará al guardar
+            return 0
+        local = self.data
+        before = {(kind, item["uid"]) for kind in ("income", "expenses") for item in local[kind]}
+        # Conservar los IDs locales: la interfaz puede estar mostrando botones con ellos
+        old_ids = {(kind, item["uid"]): item["id"] for kind in ("income", "expenses") for item in local[kind]}
+        for kind in ("income", "expenses"):
+            next_id = max((item["id"] for item in local[kind]), default=0) + 1
+            for item in disk[kind]:
+                item["id"] = old_ids.get((kind, item["uid"])) or next_id
+                next_id = max(next_id, item["id"] + 1)
+        disk_sections = {name: json.dumps(disk[name], sort_keys=True) for name in SYNC_SECTIONS}
+        local_sections = self._section_texts()
+        for name in SYNC_SECTIONS:
+            if local_sections[name] != self._synced_sections[name]:
+                disk[name] = merge_section(name, json.loads(self._synced_sections[name]), local[name], disk[name])
+        self.data = disk
+        self._synced_sections = disk_sections
+        self.exchange_rates = ExchangeRates(self.data["exchange_rates"])
+        self._anomaly_cache = None
+        self._rebuild_indexes()
+        self._replaying = True
+        try:
+            self._merge_ops(list(self._pending_ops), saved=False)
+        finally:
+            self._replaying = False
+        new_sections = self._section_texts()
+        self._sections_changed(new_sections["exchange_rates"] != local_sections["exchange_rates"])
+        after = {(kind, item["uid"]) for kind in ("income", "expenses") for item in self.data[kind]}
+        return len(before ^ after) + sum(new_sections[name] != local_sections[name] for name in SYNC_SECTIONS)
+
+    @_mutation
+    def clear_data(self):
+        """Elimina todos los datos registrados"""
+        for kind in ("income", "expenses"):
+            self._pending_ops.extend(("delete", kind, item["uid"]) for item in self.data[kind])
+        self.data = self._empty_data()
+        self.exchange_rates = ExchangeRates(self.data["exchange_rates"])
+        self._rebuild_indexes()
+        self._materialized_until = None
+        self.save_data()
+
+    def _rebuild_indexes(self):
+        """Reconstruye los agregados mensuales, el clasificador y el índice de búsqueda recorriendo todo el historial"""
+        self.monthly_aggregates = {}
+        self.categorizer = ExpenseCategorizer()
+        self.transaction_index = TransactionIndex()
+        for income in self.data["income"]:
+            self._update_aggregates("income", income, 1)
+            self.transaction_index.add("income", income)
+        for expense in self.data["expenses"]:
+            self.transaction_index.add("expenses", expense)
+            self._update_aggregates("expenses", expense, 1)
+            if not expense.get("auto_category"):
+                self.categorizer.learn(expense["description"], expense["category"])
+        self.data_version += 1
+
+    def _update_aggregates(self, kind: str, entry: Dict, sign: int):
+        """Suma (sign=1) o resta (sign=-1) una transacción en los agregados de su mes"""
+        period = self.monthly_aggregates.setdefault(
+            entry["date"][:7],
+            {"income": 0.0, "expenses": 0.0, "categories": {}, "recurring_income": 0.0, "recurring_expenses": 0.0}
+        )
+        period[kind] += sign * entry["amount"]
+        if entry.get("recurring_id"):
+            period[f"recurring_{kind}"] += sign * entry["amount"]
+        if kind == "expenses":
+            categories = period["categories"]
+            categories[entry["category"]] = categories.get(entry["category"], 0.0) + sign * entry["amount"]
+
+    def _apply_change(self, kind: str, entry: Dict, sign: int):
+        """Registra un cambio en los agregados y avanza la versión de los datos"""
+        if sign > 0 and "uid" not in entry:
+            entry["uid"] = new_uid()
+        if not self._replaying:
+            # Las demás sesiones recibirán la operación al guardar (una copia: la entrada puede cambiar)
+            self._pending_ops.append(("add", kind, dict(entry)) if sign > 0 else ("delete", kind, entry["uid"]))
+        self._update_aggregates(kind, entry, sign)
+        # Solo se aprende de categorías elegidas por el usuario, no de las sugeridas en importaciones;
+        # al borrar o recategorizar un gasto se olvida el ejemplo anterior
+        if kind == "expenses" and not entry.get("auto_category"):
+            if sign > 0:
+                self.categorizer.learn(entry["description"], entry["category"])
+            else:
+                self.categorizer.unlearn(entry["description"], entry["category"])
+        if sign > 0:
+            self.transaction_index.add(kind, entry)
+        else:
+            self.transaction_index.remove(kind, entry)
+        self.data_version += 1
+        self._update_anomalies(kind, entry, sign)
+
+    def _update_anomalies(self, kind: str, entry: Dict, sign: int):
+        """Actualiza la detección con un solo gasto nuevo en vez de recalcular todo el historial"""
+        cache = self._anomaly_cache
+        if not cache or cache["version"] != self.data_version - 1:
+            return
+        if kind == "expenses":
+            from .analytics import score_new_expense
+            # Los borrados cambian ventanas ya evaluadas: se recalcula en la próxima consulta
+            if sign < 0 or not score_new_expense(cache, entry):
+                return
+        cache["version"] = self.data_version
+
+    def get_anomalies(self, limit: int = 10) -> List[Dict]:
+        """Gastos inusuales de todo el historial, ordenados por puntuación"""
+        if not self._anomaly_cache or self._anomaly_cache["version"] != self.data_version:
+            from .analytics import compute_anomalies
+            self._anomaly_cache = compute_anomalies(self.data["expenses"], self.data_version)
+        return sorted(self._anomaly_cache["flagged"], key=lambda x: x["score"], reverse=True)[:limit]
+
+    def get_category_spikes(self, month: Optional[str] = None) -> List[Dict]:
+        """Categorías cuyo gasto del mes supera con claridad el promedio de los 3 meses anteriores"""
+        from .analytics import category_spikes
+        return category_spikes(self.monthly_aggregates, month or date.today().strftime("%Y-%m"))
+
+    def get_forecast(self, months: int = 6, simulations: Optional[int] = None) -> Dict:
+        """Proyección de ingresos, gastos y balance, cacheada por versión de los datos (ValueError fuera de 1..FORECAST_MAX_MONTHS)"""
+        from .analytics import FORECAST_SIMULATIONS, forecast_cash_flow
+        simulations = simulations or FORECAST_SIMULATIONS
+        cache_key = (self.data_version, months, simulations)
+        if cache_key not in self._forecast_cache:
+            self._forecast_cache = {cache_key: forecast_cash_flow(
+                self.monthly_aggregates, self.get_recurring_projection, months, simulations, self.data_version
+            )}
+        return self._forecast_cache[cache_key]
+
+    def get_chart_data(self) -> Dict:
+        """Series del dashboard ya agregadas y reducidas, cacheadas por versión de los datos"""
+        if self.data_version not in self._chart_cache:
+            self._chart_cache = {self.data_version: build_chart_data(self.data, self.monthly_aggregates)}
+        return self._chart_cache[self.data_version]
+
+    def get_statement_period(self, month: str, owner: str = "") -> Dict:
+        """Datos del estado de cuenta de un mes: agregados, presupuestos y análisis guardado"""
+        try:
+            datetime.strptime(month, "%Y-%m")
+        except ValueError:
+            raise ValueError(f"Mes inválido (se espera AAAA-MM): {month}")
+        from .reports import build_period
+        with self.lock:
+            return build_period(self.data, self.monthly_aggregates, month, owner)
+
+    def suggest_category(self, description: str) -> Optional[str]:
+        """Sugiere la categoría de un gasto según el historial del usuario"""
+        return self.categorizer.predict(description)
+
+    def categorize_batch(self, descriptions: List[str]) -> List[str]:
+        """Categoriza un lote de descripciones (p. ej. filas importadas); 'Otro' si no hay sugerencia"""
+        return [category or "Otro" for category in self.categorizer.predict_batch(descriptions)]
+
+    @_mutation
+    def add_income(self, amount: float, source: str, date_str: str, category: str = "Salario",
+                   currency: str = BASE_CURRENCY):
+        """Añade un ingreso (en otra moneda se guarda también convertido a soles)"""
+        # Calcular ID único basado en el máximo existente
+        existing_ids = [item["id"] for item in self.data["income"]] if self.data["income"] else [0]
+        new_id = max(existing_ids) + 1 if existing_ids else 1
+
+        income_entry = {
+            "amount": amount,
+            "source": source,
+            "date": date_str,
+            "category": category,
+            "id": new_id
+        }
+        self._to_base_currency(income_entry, currency)
+        self.data["income"].append(income_entry)
+        self._apply_change("income", income_entry, 1)
+        self.save_data()
+
+    @_mutation
+    def add_expense(self, amount: float, description: str, date_str: str, category: str,
+                    currency: str = BASE_CURRENCY) -> Optional[Dict]:
+        """Añade un gasto y devuelve el estado del presupuesto de su categoría, si existe"""
+        # Calcular ID único basado en el máximo existente
+        existing_ids = [item["id"] for item in self.data["expenses"]] if self.data["expenses"] else [0]
+        new_id = max(existing_ids) + 1 if existing_ids else 1
+
+        expense_entry = {
+            "amount": amount,
+            "description": description,
+            "date": date_str,
+            "category": category,
+            "id": new_id
+        }
+        self._to_base_currency(expense_entry, currency)
+        self.data["expenses"].append(expense_entry)
+        self._apply_change("expenses", expense_entry, 1)
+        self.save_data()
+        return self._check_budget(category, date_str[:7])
+
+    @_mutation
+    def set_user_profile(self, profile: Dict):
+        """Establece el perfil del usuario"""
+        self.data["user_profile"] = profile
+        self.save_data()
+
+    @_mutation
+    def delete_income(self, income_id: int):
+        """Elimina un ingreso por su ID"""
+        for item in self.data["income"]:
+            if item["id"] == income_id:
+                self._apply_change("income", item, -1)
+        self.data["income"] = [item for item in self.data["income"] if item["id"] != income_id]
+        self.save_data()
+
+    @_mutation
+    def delete_expense(self, expense_id: int):
+        """Elimina un gasto por su ID"""
+        for item in self.data["expenses"]:
+            if item["id"] == expense_id:
+                self._apply_change("expenses", item, -1)
+        self.data["expenses"] = [item for item in self.data["expenses"] if item["id"] != expense_id]
+        self.save_data()
+
+    def _append_entries(self, kind: str, entries: List[Dict]):
+        """Añade un lote de movimientos asignando IDs consecutivos, sin guardar"""
+        next_id = max((item["id"] for item in self.data[kind]), default=0) + 1
+        for entry in entries:
+            entry["id"] = next_id
+            next_id += 1
+            self.data[kind].append(entry)
+            self._apply_change(kind, entry, 1)
+
+    @_mutation
+    def add_transactions(self, kind: str, entries: List[Dict], save: bool = True) -> List[Dict]:
+        """Añade un lote de ingresos o gastos con una sola escritura a disco.
+
+        Los gastos sin categoría se categorizan en bloque con el historial del usuario y se
+        marcan con auto_category para no aprender de ellos. Con save=False el llamador decide
+        cuándo guardar (p. ej. al terminar una importación por partes).
+        """
+        text_field = "source" if kind == "income" else "description"
+        new_entries = []
+        for entry in entries:
+            try:
+                amount = float(entry["amount"])
+                datetime.strptime(entry["date"], "%Y-%m-%d")
+                text = str(entry[text_field])
+            except (KeyError, TypeError, ValueError):
+                raise ValueError(f"Movimiento inválido: se requieren amount, date (AAAA-MM-DD) y {text_field}")
+            # nan <= 0 es False: los montos no finitos se rechazan aparte
+            if not math.isfinite(amount) or amount <= 0:
+                raise ValueError("El monto debe ser un número finito mayor que cero")
+            new_entries.append({
+                "amount": amount,
+                text_field: text,
+                "date": entry["date"],
+                "category": entry.get("category")
+            })
+            currency = str(entry.get("currency") or BASE_CURRENCY).strip().upper()
+            if currency != BASE_CURRENCY:
+                new_entries[-1].update({"original_amount": amount, "currency": currency})
+        # Los montos en otra moneda se convierten en bloque con el tipo de cambio de su fecha
+        foreign = [entry for entry in new_entries if "currency" in entry]
+        if foreign:
+            converted = self.exchange_rates.convert_batch([entry["original_amount"] for entry in foreign],
+                                                          [entry["currency"] for entry in foreign],
+                                                          [entry["date"] for entry in foreign])
+            for entry, amount in zip(foreign, converted):
+                entry["amount"] = amount
+        uncategorized = [entry for entry in new_entries if not entry["category"]]
+        if kind == "expenses" and uncategorized:
+            categories = self.categorize_batch([entry["description"] for entry in uncategorized])
+            for entry, category in zip(uncategorized, categories):
+                entry["category"] = category
+                entry["auto_category"] = True
+        for entry in uncategorized:
+            entry["category"] = entry["category"] or "Otro"
+        self._append_entries(kind, new_entries)
+        if new_entries and save:
+            self.save_data()
+        return new_entries
+
+    def _to_base_currency(self, entry: Dict, currency: Optional[str]):
+        """Guarda el monto y la moneda originales y deja "amount" convertido a soles"""
+        currency = (currency or BASE_CURRENCY).upper()
+        if currency != BASE_CURRENCY:
+            amount = entry["amount"]
+            entry["amount"] = self.exchange_rates.convert(amount, currency, entry["date"])
+            entry["original_amount"] = amount
+            entry["currency"] = currency
+
+    def get_currencies(self) -> List[str]:
+        """Monedas disponibles para registrar movimientos (soles y las que tienen tipo de cambio)"""
+        return self.exchange_rates.currencies()
+
+    @_mutation
+    def import_exchange_rates(self, rows: Iterable[Dict]) -> int:
+        """Registra tipos de cambio (filas con date, currency y rate) y reconvierte los movimientos afectados"""
+        parsed = []
+        for row in rows:
+            try:
+                rate = float(row["rate"])
+                datetime.strptime(row["date"], "%Y-%m-%d")
+                currency = str(row["currency"])
+            except (KeyError, TypeError, ValueError):
+                raise ValueError(f"Tipo de cambio inválido: se requieren date (AAAA-MM-DD), currency y rate: {row}")
+            parsed.append((currency, row["date"], rate))
+        count = self.exchange_rates.add_many(parsed)
+        if count:
+            self._reconvert_foreign()
+            self.save_data()
+        return count
+
+    def set_exchange_rate(self, currency: str, date_str: str, rate: float):
+        """Registra un tipo de cambio (soles por unidad de la moneda) desde esa fecha"""
+        self.import_exchange_rates([{"currency": currency, "date": date_str, "rate": rate}])
+
+    def _reconvert_foreign(self):
+        """Vuelve a convertir todos los movimientos en moneda extranjera con la tabla actual"""
+        foreign = [item for kind in ("income", "expenses") for item in self.data[kind] if item.get("currency")]
+        if not foreign:
+            return
+        converted = self.exchange_rates.convert_batch([item["original_amount"] for item in foreign],
+                                                      [item["currency"] for item in foreign],
+                                                      [item["date"] for item in foreign])
+        for item, amount in zip(foreign, converted):
+            item["amount"] = amount
+        # Cambiaron montos ya agregados: se recalculan los agregados y cachés desde cero
+        self._anomaly_cache = None
+        self._rebuild_indexes()
+
+    def get_duplicates(self, kind: Optional[str] = None) -> List[Dict]:
+        """Pares de movimientos posiblemente duplicados, sin los que el usuario decidió mantener"""
+        cache_key = (self.data_version, len(self.data["ignored_duplicates"]))
+        if not self._duplicates_cache or self._duplicates_cache[0] != cache_key:
+            ignored = {tuple(item) for item in self.data["ignored_duplicates"]}
+            pairs = find_duplicates("income", self.data["income"], ignored) + \
+                find_duplicates("expenses", self.data["expenses"], ignored)
+            self._duplicates_cache = (cache_key, sorted(pairs, key=lambda x: x["similarity"], reverse=True))
+        pairs = self._duplicates_cache[1]
+        return [pair for pair in pairs if pair["kind"] == kind] if kind else pairs
+
+    def _find_entry(self, kind: str, entry_id: int) -> Dict:
+        for item in self.data[kind]:
+            if item["id"] == entry_id:
+                return item
+        raise ValueError(f"No existe el movimiento {entry_id}")
+
+    @_mutation
+    def merge_duplicate(self, kind: str, keep_id: int, duplicate_id: int):
+        """Elimina el duplicado; si el conservado tenía categoría automática, toma la del duplicado"""
+        kept = self._find_entry(kind, keep_id)
+        duplicate = self._find_entry(kind, duplicate_id)
+        if kept.get("auto_category") and not duplicate.get("auto_category"):
+            self._apply_change(kind, kept, -1)
+            kept["category"] = duplicate["category"]
+            kept.pop("auto_category")
+            self._apply_change(kind, kept, 1)
+        self._apply_change(kind, duplicate, -1)
+        self.data[kind] = [item for item in self.data[kind] if item["id"] != duplicate_id]
+        self.save_data()
+
+    @_mutation
+    def ignore_duplicate(self, kind: str, first_id: int, second_id: int):
+        """Marca un par como movimientos distintos para no volver a sugerirlo"""
+        key = pair_key(kind, self._find_entry(kind, first_id), self._find_entry(kind, second_id))
+        if key not in self.data["ignored_duplicates"]:
+            self.data["ignored_duplicates"].append(key)
+            self.save_data()
+
+    def get_transactions(self, kind: str, start: Optional[str] = None, end: Optional[str] = None,
+                         category: Optional[str] = None, limit: Optional[int] = None) -> List[Dict]:
+        """Movimientos filtrados por rango de fechas (inclusive) y categoría, del más reciente al más antiguo"""
+        items = [
+            item for item in self.data[kind]
+            if (not start or item["date"] >= start) and (not end or item["date"] <= end)
+            and (not category or item["category"] == category)
+        ]
+        items.sort(key=lambda x: x["date"], reverse=True)
+        return items[:limit] if limit else items
+
+    @_mutation
+    def add_recurring(self, kind: str, amount: float, description: str, category: str,
+                      frequency: str, start_date: str, interval_days: int = 30):
+        """Añade una regla de movimiento recurrente (kind: 'income' o 'expenses')"""
+        existing_ids = [item["id"] for item in self.data["recurring"]] if self.data["recurring"] else [0]
+        rule = {
+            "kind": kind,
+            "amount": amount,
+            "description": description,
+            "category": category,
+            "frequency": frequency,
+            "interval_days": interval_days,
+            "start_date": start_date,
+            "generated_until": None,
+            "id": max(existing_ids) + 1,
+            # Los movimientos generados apuntan al UID: el ID numérico se reutiliza tras borrar
+            "uid": new_uid()
+        }
+        self.data["recurring"].append(rule)
+        # Las reglas entran en la proyección aunque aún no generen movimientos: invalidar cachés
+        self.data_version += 1
+        # Forzar la materialización de las ocurrencias ya vencidas de la nueva regla
+        self._materialized_until = None
+        if not self.materialize_recurring():
+            self.save_data()
+
+    @_mutation
+    def delete_recurring(self, rule_id: int):
+        """Elimina una regla recurrente; los movimientos ya generados se conservan"""
+        self.data["recurring"] = [rule for rule in self.data["recurring"] if rule["id"] != rule_id]
+        self.data_version += 1
+        self.save_data()
+
+    def _rule_occurrences(self, rule: Dict, start: date, until: date) -> List[date]:
+        """Fechas de una regla recurrente comprendidas entre start y until (inclusive)"""
+        first = datetime.strptime(rule["start_date"], "%Y-%m-%d").date()
+        occurrences = []
+        if rule["frequency"] == "monthly":
+            # Saltar directamente al primer mes relevante
+            n = max((start.year - first.year) * 12 + start.month - first.month - 1, 0)
+            while True:
+                month_index = first.month - 1 + n
+                year, month = first.year + month_index // 12, month_index % 12 + 1
+                current = date(year, month, min(first.day, calendar.monthrange(year, month)[1]))
+                if current > until:
+                    break
+                if current >= start:
+                    occurrences.append(current)
+                n += 1
+        else:
+            step = 7 if rule["frequency"] == "weekly" else max(int(rule.get("interval_days") or 1), 1)
+            n = max((start - first).days // step, 0)
+            current = first + timedelta(days=step * n)
+            while current <= until:
+                if current >= start:
+                    occurrences.append(current)
+                current += timedelta(days=step)
+        return occurrences
+
+    def _recurring_entry(self, rule: Dict, date_str: str) -> Dict:
+        """Construye el movimiento generado por una regla en una fecha"""
+        text_field = "source" if rule["kind"] == "income" else "description"
+        return {
+            "amount": rule["amount"],
+            text_field: rule["description"],
+            "date": date_str,
+            "category": rule["category"],
+            "recurring_id": rule["uid"]
+        }
+
+    @_mutation
+    def materialize_recurring(self, until: Optional[date] = None) -> int:
+        """Genera en un solo lote los movimientos recurrentes pendientes hasta hoy.
+
+        Es idempotente: cada regla recuerda hasta qué fecha ya generó movimientos y
+        además se omite cualquier ocurrencia que ya exista en el historial.
+        """
+        until = min(until or date.today(), date.today())
+        if self._materialized_until and until <= self._materialized_until:
+            return 0
+        if not self.data["recurring"]:
+            self._materialized_until = until
+            return 0
+
+        existing = {(item.get("recurring_id"), item["date"])
+                    for kind in ("income", "expenses") for item in self.data[kind] if item.get("recurring_id")}
+        new_entries = {"income": [], "expenses": []}
+        rules_changed = False
+        for rule in self.data["recurring"]:
+            generated_until = rule.get("generated_until")
+            start = datetime.strptime(rule["start_date"], "%Y-%m-%d").date()
+            if generated_until:
+                start = max(start, datetime.strptime(generated_until, "%Y-%m-%d").date() + timedelta(days=1))
+            for occurrence in self._rule_occurrences(rule, start, until):
+                if (rule["uid"], occurrence.isoformat()) not in existing:
+                    new_entries[rule["kind"]].append(self._recurring_entry(rule, occurrence.isoformat()))
+            if start <= until:
+                rule["generated_until"] = until.isoformat()
+                rules_changed = True
+
+        for kind, entries in new_entries.items():
+            self._append_entries(kind, entries)
+        self._materialized_until = until
+        if rules_changed:
+            self.save_data()
+        return len(new_entries["income"]) + len(new_entries["expenses"])
+
+    def get_recurring_projection(self, until: date) -> List[Dict]:
+        """Ocurrencias futuras (después de hoy) de las reglas, sin guardarlas en el historial"""
+        start = date.today() + timedelta(days=1)
+        return [
+            {**self._recurring_entry(rule, occurrence.isoformat()), "kind": rule["kind"]}
+            for rule in self.data["recurring"]
+            for occurrence in self._rule_occurrences(rule, start, until)
+        ]
+
+    @_mutation
+    def set_budget(self, category: str, monthly_limit: float):
+        """Establece el presupuesto mensual de una categoría de gastos"""
+        self.data["budgets"][category] = monthly_limit
+        # Los estados de cuenta y las respuestas cacheadas de la API incluyen los presupuestos
+        self.data_version += 1
+        self.save_data()
+
+    @_mutation
+    def delete_budget(self, category: str):
+        """Elimina el presupuesto de una categoría"""
+        self.data["budgets"].pop(category, None)
+        self.data_version += 1
+        self.save_data()
+
+    @_mutation
+    def add_goal(self, name: str, target: float, deadline: str):
+        """Añade una meta de ahorro; el progreso se cuenta desde el mes de creación"""
+        existing_ids = [item["id"] for item in self.data["goals"]] if self.data["goals"] else [0]
+        goal_entry = {
+            "name": name,
+            "target": target,
+            "deadline": deadline,
+            "created": date.today().isoformat(),
+            "id": max(existing_ids) + 1
+        }
+        self.data["goals"].append(goal_entry)
+        self.save_data()
+
+    @_mutation
+    def delete_goal(self, goal_id: int):
+        """Elimina una meta de ahorro por su ID"""
+        self.data["goals"] = [item for item in self.data["goals"] if item["id"] != goal_id]
+        self.save_data()
+
+    def _check_budget(self, category: str, month: str) -> Optional[Dict]:
+        """Calcula el estado del presupuesto de una categoría usando solo el agregado del mes"""
+        limit = self.data["budgets"].get(category)
+        if not limit:
+            return None
+        spent = self.monthly_aggregates.get(month, {}).get("categories", {}).get(category, 0.0)
+        return {
+            "category": category,
+            "month": month,
+            "limit": limit,
+            "spent": spent,
+            "remaining": limit - spent,
+            "percentage": spent / limit * 100,
+            "over_budget": spent > limit
+        }
+
+    def get_budget_status(self, month: Optional[str] = None) -> List[Dict]:
+        """Estado de todos los presupuestos en un mes (por defecto, el actual)"""
+        month = month or date.today().strftime("%Y-%m")
+        status = [self._check_budget(category, month) for category in self.data["budgets"]]
+        return sorted([item for item in status if item], key=lambda x: x["percentage"], reverse=True)
+
+    def get_goals_progress(self) -> List[Dict]:
+        """Progreso de las metas de ahorro a partir del balance de los agregados mensuales"""
+        today = date.today()
+        progress = []
+        for goal in self.data["goals"]:
+            start_month = goal["created"][:7]
+            saved = sum(period["income"] - period["expenses"]
+                        for month, period in self.monthly_aggregates.items() if month >= start_month)
+            saved = max(saved, 0.0)
+            deadline = datetime.strptime(goal["deadline"], "%Y-%m-%d").date()
+            months_left = max((deadline.year - today.year) * 12 + deadline.month - today.month, 0)
+            remaining = max(goal["target"] - saved, 0.0)
+            progress.append({
+                **goal,
+                "saved": saved,
+                "remaining": remaining,
+                "percentage": min(saved / goal["target"] * 100, 100) if goal["target"] > 0 else 100,
+                "months_left": months_left,
+                "monthly_needed": remaining / months_left if months_left > 0 else remaining
+            })
+        return progress
+
+    def get_total_income(self) -> float:
+        """Calcula el total de ingresos"""
+        return sum(item["amount"] for item in self.data["income"])
+
+    def get_total_expenses(self) -> float:
+        """Calcula el total de gastos"""
+        return sum(item["amount"] for item in self.data["expenses"])
+
+    def get_balance(self) -> float:
+        """Calcula el balance actual"""
+        return self.get_total_income() - self.get_total_expenses()
+
+    def get_expenses_by_category(self) -> Dict[str, float]:
+        """Agrupa gastos por categoría"""
+        categories = {}
+        for expense in self.data["expenses"]:
+            category = expense["category"]
+            categories[category] = categories.get(category, 0) + expense["amount"]
+        return categories
+
+    def get_financial_summary(self, include_recent: bool = True) -> str:
+        """Genera un resumen financiero para Gemini (sin los movimientos recientes si include_recent=False)"""
+        total_income = self.get_total_income()
+        total_expenses = self.get_total_expenses()
+        balance = self.get_balance()
+        expenses_by_category = self.get_expenses_by_category()
+
+        profile = self.data.get("user_profile", {})
+
+        summary = f"""
+        PERFIL FINANCIERO DEL USUARIO:
+
+        INFORMACIÓN PERSONAL:
+        - Edad: {profile.get('age', 'No especificada')}
+        - Ocupación: {profile.get('occupation', 'No especificada')}
+        - Situación familiar: {profile.get('family_status', 'No especificada')}
+        - Objetivos financieros: {profile.get('financial_goals', 'No especificados')}
+
+        RESUMEN FINANCIERO ACTUAL:
+        - Ingresos totales: S/{total_income:,.2f}
+        - Gastos totales: S/{total_expenses:,.2f}
+        - Balance actual: S/{balance:,.2f}
+        - Tasa de ahorro: {(balance/total_income*100) if total_income > 0 else 0:.1f}%
+
+        DISTRIBUCIÓN DE GASTOS POR CATEGORÍA:
+        """
+
+        for category, amount in expenses_by_category.items():
+            percentage = (amount / total_expenses * 100) if total_expenses > 0 else 0
+            summary += f"- {category}: S/{amount:,.2f} ({percentage:.1f}%)\n"
+
+        budget_status = self.get_budget_status()
+        if budget_status:
+            summary += f"\nPRESUPUESTOS DEL MES ({date.today().strftime('%Y-%m')}):\n"
+            for budget in budget_status:
+                flag = " - EXCEDIDO" if budget["over_budget"] else ""
+                summary += f"- {budget['category']}: S/{budget['spent']:,.2f} de S/{budget['limit']:,.2f} ({budget['percentage']:.1f}%){flag}\n"
+
+        anomalies = self.get_anomalies()
+        if anomalies:
+            summary += "\nGASTOS INUSUALES DETECTADOS EN TODO EL HISTORIAL:\n"
+            for expense in anomalies:
+                summary += f"- {expense['date']}: {expense['description']} - S/{expense['amount']:,.2f} ({expense['category']}, habitual S/{expense['typical']:,.2f})\n"
+
+        spikes = self.get_category_spikes()
+        if spikes:
+            summary += "\nAUMENTOS BRUSCOS DE GASTO ESTE MES:\n"
+            for spike in spikes:
+                summary += f"- {spike['category']}: S/{spike['amount']:,.2f} frente a un promedio de S/{spike['average']:,.2f} ({spike['ratio']:.1f}x)\n"
+
+        goals_progress = self.get_goals_progress()
+        if goals_progress:
+            summary += "\nMETAS DE AHORRO:\n"
+            for goal in goals_progress:
+                summary += f"- {goal['name']}: S/{goal['saved']:,.2f} de S/{goal['target']:,.2f} ({goal['percentage']:.1f}%), fecha límite {goal['deadline']}, requiere S/{goal['monthly_needed']:,.2f}/mes\n"
+
+        if not include_recent:
+            return summary
+
+        recent_expenses = sorted(self.data["expenses"], key=lambda x: x["date"], reverse=True)[:10]
+        if recent_expenses:
+            summary += "\nGASTOS RECIENTES (ÚLTIMOS 10):\n"
+            for expense in recent_expenses:
+                summary += f"- {expense['date']}: {expense['description']} - S/{expense['amount']:,.2f} ({expense['category']})\n"
+
+        recent_income = sorted(self.data["income"], key=lambda x: x["date"], reverse=True)[:5]
+        if recent_income:
+            summary += "\nINGRESOS RECIENTES (ÚLTIMOS 5):\n"
+            for income in recent_income:
+                summary += f"- {income['date']}: {income['source']} - S/{income['amount']:,.2f} ({income['category']})\n"
+
+        return summary
+
+    def get_month_summary(self, month: str) -> str:
+        """Resumen de un mes (AAAA-MM) a partir de su agregado y sus movimientos"""
+        period = self.monthly_aggregates.get(month)
+        if not period:
+            return ""
+        balance = period["income"] - period["expenses"]
+        summary = f"""
+        RESUMEN DEL MES {month}:
+        - Ingresos: S/{period['income']:,.2f}
+        - Gastos: S/{period['expenses']:,.2f}
+        - Balance: S/{balance:,.2f}
+        - Tasa de ahorro: {(balance / period['income'] * 100) if period['income'] > 0 else 0:.1f}%
+
+        GASTOS POR CATEGORÍA:
+        """
+        for category, amount in sorted(period["categories"].items(), key=lambda x: x[1], reverse=True):
+            percentage = (amount / period["expenses"] * 100) if period["expenses"] > 0 else 0
+            summary += f"- {category}: S/{amount:,.2f} ({percentage:.1f}%)\n"
+
+        budget_status = self.get_budget_status(month)
+        if budget_status:
+            summary += "\nPRESUPUESTOS:\n"
+            for budget in budget_status:
+                flag = " - EXCEDIDO" if budget["over_budget"] else ""
+                summary += f"- {budget['category']}: S/{budget['spent']:,.2f} de S/{budget['limit']:,.2f}{flag}\n"
+
+        month_end = f"{month}-31"
+        top_expenses = sorted(self.get_transactions("expenses", f"{month}-01", month_end),
+                              key=lambda x: x["amount"], reverse=True)[:10]
+        if top_expenses:
+            summary += "\nGASTOS MÁS GRANDES DEL MES:\n"
+            for expense in top_expenses:
+                summary += f"- {expense['date']}: {expense['description']} - S/{expense['amount']:,.2f} ({expense['category']})\n"
+        return summary
+
+    def get_monthly_analysis(self, month: str, force: bool = False) -> str:
+        """Análisis de Gemini de un mes; queda en data["analyses"] para reutilizarlo (el llamador guarda)"""
+        cached = self.data["analyses"].get(month)
+        if cached and not force:
+            return cached["text"]
+        if not self.gemini_available or not hasattr(self, 'model'):
+            return "❌ Gemini no está disponible. Por favor configura tu API key."
+        # Solo la lectura del libro necesita el candado, no la espera a Gemini
+        with self.lock:
+            month_summary = self.get_month_summary(month)
+        if not month_summary:
+            return f"📝 No hay movimientos registrados en {month}."
+
+        try:
+            prompt = f"""Eres un experto asesor financiero personal. Analiza el mes {month} de este estudiante y proporciona:
+
+1. RESUMEN del mes en pocas líneas
+2. LOGROS y PUNTOS DE ATENCIÓN
+3. RECOMENDACIONES CONCRETAS para el próximo mes
+
+INFORMACIÓN DEL MES:
+{month_summary}
+
+Responde en español con emojis y estructura clara."""
+
+            response = self.model.generate_content(prompt)
+        except Exception as e:
+            return f"❌ Error: {str(e)}"
+        with self.lock:
+            self.data["analyses"][month] = {"text": response.text, "generated_at": datetime.now().isoformat()}
+        return response.text
+
+    def get_gemini_analysis(self) -> str:
+        """Obtiene análisis de Gemini - FUNCIÓN SÍNCRONA"""
+        if not self.gemini_available or not hasattr(self, 'model'):
+            return "❌ Gemini no está disponible. Por favor configura tu API key."
+
+        try:
+            # El resumen se arma bajo el candado; la llamada a Gemini (segundos) se hace sin él
+            with self.lock:
+                if self.get_total_income() == 0 and len(self.data["expenses"]) == 0:
+                    return "📝 No hay datos suficientes para realizar un análisis. Comienza registrando tus ingresos y gastos."
+                financial_summary = self.get_financial_summary()
+            prompt = f"""Eres un experto asesor financiero personal. Analiza esta información financiera y proporciona:
+
+1. ANÁLISIS DETALLADO de la situación financiera actual
+2. RECOMENDACIONES ESPECÍFICAS para mejorar las finanzas
+3. ÁREAS DE OPTIMIZACIÓN identificando gastos innecesarios
+4. ESTRATEGIAS DE AHORRO personalizadas
+
+INFORMACIÓN FINANCIERA:
+{financial_summary}
+
+Responde en español con emojis y estructura clara."""
+
+            response = self.model.generate_content(prompt)
+            return response.text
+
+        except Exception as e:
+            return f"❌ Error: {str(e)}"
+
+    def get_relevant_context(self, question: str, limit: int = 15) -> str:
+        """Movimientos y totales de todo el historial relacionados con la pregunta"""
+        return self.transaction_index.build_context(question, limit, monthly_aggregates=self.monthly_aggregates)
+
+    def get_specific_recommendation(self, question: str) -> str:
+        """Obtiene una recomendación específica de Gemini - FUNCIÓN SÍNCRONA"""
+        if not self.gemini_available or not hasattr(self, 'model'):
+            return "❌ Gemini no está disponible. Por favor configura tu API key."
+
+        try:
+            # Los movimientos relevantes de todo el historial reemplazan a la lista de recientes
+            with self.lock:
+                relevant_context = self.get_relevant_context(question)
+                financial_summary = self.get_financial_summary(include_recent=not relevant_context)
+            prompt = f"""Eres un asesor financiero personal. Responde esta pregunta: "{question}"
+
+Basándote en esta información financiera:
+{financial_summary}
+{relevant_context}
+
+Proporciona una respuesta práctica y personalizada en español con emojis."""
+
+            response = self.model.generate_content(prompt)
+            return response.text
+
+        except Exception as e:
+            return f"❌ Error: {str(e)}"
+
+    def get_tool_answer(self, question: str, max_calls: int = TOOL_CALL_BUDGET) -> str:
+        """Responde una pregunta dejando que Gemini consulte el libro con funciones locales (cifras exactas)"""
+        if not self.gemini_available or not hasattr(self, 'model'):
+            return "❌ Gemini no está disponible. Por favor configura tu API key."
+
+        try:
+            import google.generativeai as genai
+
+            model = genai.GenerativeModel(self.model_name, tools=[{"function_declarations": TOOL_DECLARATIONS}])
+            chat = model.start_chat()
+            with self.lock:
+                profile = dict(self.data.get("user_profile", {}))
+            # El prompt no lleva el historial: las cifras se piden con las funciones
+            prompt = f"""Eres un asesor financiero personal. Responde esta pregunta: "{question}"
+
+Hoy es {date.today().isoformat()}. Los montos están en soles (S/).
+Perfil del usuario: {json.dumps(profile, ensure_ascii=False) if profile else 'No especificado'}
+Categorías de gasto: {', '.join(EXPENSE_CATEGORIES)}
+Categorías de ingreso: {', '.join(INCOME_CATEGORIES)}
+
+Usa las funciones disponibles para obtener las cifras exactas que necesites (puedes hacer hasta {max_calls} consultas) y no inventes montos.
+Proporciona una respuesta práctica y personalizada en español con emojis."""
+
+            response = chat.send_message(prompt)
+            calls_made = 0
+            while True:
+                calls = [part.function_call for part in response.parts if part.function_call.name]
+                if not calls:
+                    return response.text
+                if calls_made >= max_calls:
+                    return "⚠️ Gemini necesitó más consultas de las permitidas para esta pregunta. Intenta hacerla más específica."
+                replies = []
+                for call in calls:
+                    if calls_made < max_calls:
+                        # Cada consulta toma el candado solo mientras lee el libro, no durante la espera a Gemini
+                        with self.lock:
+                            result = self.ledger_tools.execute(call.name, dict(call.args))
+                    else:
+                        result = {"error": "Se alcanzó el límite de consultas; responde con los datos ya obtenidos"}
+                    calls_made += 1
+                    replies.append(genai.protos.Part(function_response=genai.protos.FunctionResponse(
+                        name=call.name, response={"result": result})))
+                response = chat.send_message(replies)
+
+        except Exception as e:
+            return f"❌ Error: {str(e)}"
@@ -0,0 +1,90 @@
+"""Monedas y tipos de cambio.
+
+Cada movimiento en moneda extranjera guarda su monto y moneda originales; "amount" queda
+convertido a la moneda base (soles) con el tipo de cambio de su fecha, de modo que los
+agregados, presupuestos y proyecciones siguen sumando "amount". Cuando la tabla de tipos
+de cambio cambia, todos esos movimientos se reconvierten de una vez con una búsqueda
+vectorizada por fecha.
+"""
+from bisect import bisect_right
+from typing import Dict, Iterable, List, Tuple
+
+BASE_CURRENCY = "PEN"
+CURRENCY_SYMBOLS = {"PEN": "S/", "USD": "US$", "EUR": "€"}
+
+
+def format_amount(amount: float, currency: str = BASE_CURRENCY) -> str:
+    """Monto con el símbolo de su moneda (S/1,234.50, US$20.00, 15.00 GBP)"""
+    symbol = CURRENCY_SYMBOLS.get(currency)
+    return f"{symbol}{amount:,.2f}" if symbol else f"{amount:,.2f} {currency}"
+
+
+class ExchangeRates:
+    """Tabla de tipos de cambio por fecha: 1 unidad de la moneda = rate soles.
+
+    Se guarda en data["exchange_rates"] como {"USD": [["2024-01-02", 3.72], ...]} ordenado por
+    fecha; para cada día se usa el último tipo de cambio publicado hasta esa fecha.
+    """
+
+    def __init__(self, table: Dict[str, List[List]]):
+        self.table = table
+        self.version = 0
+
+    def currencies(self) -> List[str]:
+        """Moneda base más las que tienen tipo de cambio registrado"""
+        return [BASE_CURRENCY] + sorted(currency for currency in self.table if self.table[currency])
+
+    def add_many(self, rows: Iterable[Tuple[str, str, float]]) -> int:
+        """Registra (moneda, fecha, tipo) reemplazando los de la misma fecha; devuelve cuántos se leyeron"""
+        updates: Dict[str, Dict[str, float]] = {}
+        count = 0
+        for currency, date_str, rate in rows:
+            currency = currency.strip().upper()
+            if currency == BASE_CURRENCY:
+                continue
+            if rate <= 0:
+                raise ValueError(f"Tipo de cambio inválido para {currency} el {date_str}: {rate}")
+            updates.setdefault(currency, {})[date_str] = rate
+            count += 1
+        for currency, rates in updates.items():
+            merged = dict(self.table.get(currency, []))
+            merged.update(rates)
+            self.table[currency] = [[day, merged[day]] for day in sorted(merged)]
+        if updates:
+            self.version += 1
+        return count
+
+    def rate(self, currency: str, date_str: str) -> float:
+        """Tipo de cambio vigente en la fecha (el primero registrado si la fecha es anterior)"""
+        if currency == BASE_CURRENCY:
+            return 1.0
+        series = self.table.get(currency)
+        if not series:
+            raise ValueError(f"No hay tipo de cambio registrado para {currency}")
+        position = bisect_right(series, [date_str, float("inf")]) - 1
+        return series[max(position, 0)][1]
+
+    def convert(self, amount: float, currency: str, date_str: str) -> float:
+        """Convierte un monto a la moneda base"""
+        return round(amount * self.rate(currency, date_str), 2)
+
+    def convert_batch(self, amounts: List[float], currencies: List[str], dates: List[str]) -> List[float]:
+        """Convierte muchos montos a la vez: un searchsorted por moneda en lugar de una búsqueda por fila"""
+        import numpy as np
+
+        amounts_array = np.asarray(amounts, dtype=float)
+        currencies_array = np.asarray(currencies)
+        dates_array = np.asarray(dates)
+        rates = np.ones(len(amounts_array))
+        for currency in set(currencies):
+            if currency == BASE_CURRENCY:
+                continue
+            series = self.table.get(currency)
+            if not series:
+                raise ValueError(f"No hay tipo de cambio registrado para {currency}")
+            mask = currencies_array == currency
+            rate_dates = np.array([day for day, _ in series])
+            rate_values = np.array([value for _, value in series], dtype=float)
+            positions = np.searchsorted(rate_dates, dates_array[mask], side="right") - 1
+            rates[mask] = rate_values[np.maximum(positions, 0)]
+        return np.round(amounts_array * rates, 2).tolist()
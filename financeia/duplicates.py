@@ -0,0 +1,96 @@
+"""Detección de movimientos duplicados (p. ej. el mismo gasto importado desde dos fuentes).
+
+Primero se agrupan por (fecha, monto, descripción normalizada) con un diccionario; después,
+dentro de cada monto, se comparan solo los movimientos separados por pocos días. Así el
+costo crece casi linealmente con el tamaño del libro.
+"""
+import re
+import unicodedata
+from datetime import date
+from difflib import SequenceMatcher
+from typing import Dict, List, Set, Tuple
+
+DUPLICATE_WINDOW_DAYS = 3     # días de diferencia permitidos entre dos registros del mismo gasto
+DUPLICATE_MIN_SIMILARITY = 0.6
+MAX_COMPARISONS = 50          # vecinos revisados por movimiento, para acotar grupos muy grandes
+
+
+def normalize_text(text: str) -> str:
+    """Minúsculas, sin tildes ni signos, con espacios simples"""
+    normalized = unicodedata.normalize("NFKD", (text or "").lower())
+    normalized = "".join(char for char in normalized if not unicodedata.combining(char))
+    return " ".join(re.findall(r"[a-z0-9]+", normalized))
+
+
+def _entry_text(entry: Dict) -> str:
+    return entry.get("description") or entry.get("source") or ""
+
+
+def _entry_amount(entry: Dict) -> Tuple[str, float]:
+    # Los movimientos en otra moneda se comparan por su monto original
+    return entry.get("currency", ""), round(entry.get("original_amount", entry["amount"]), 2)
+
+
+def fingerprint(entry: Dict) -> str:
+    """Huella estable de un movimiento (los IDs se renumeran al cargar el archivo)"""
+    currency, amount = _entry_amount(entry)
+    return f"{entry['date']}|{currency}{amount:.2f}|{normalize_text(_entry_text(entry))}"
+
+
+def pair_key(kind: str, first: Dict, second: Dict) -> List[str]:
+    """Clave de un par descartado, independiente del orden"""
+    return [kind] + sorted([fingerprint(first), fingerprint(second)])
+
+
+def find_duplicates(kind: str, entries: List[Dict], ignored: Set[Tuple[str, ...]],
+                    window_days: int = DUPLICATE_WINDOW_DAYS) -> List[Dict]:
+    """Pares de movimientos que probablemente son el mismo, del más al menos seguro"""
+    candidates = []
+    seen: Set[Tuple[int, int]] = set()
+
+    def add_pair(first: Dict, second: Dict, similarity: float, reason: str):
+        ids = tuple(sorted((first["id"], second["id"])))
+        if ids in seen or tuple(pair_key(kind, first, second)) in ignored:
+            return
+        # Dos cobros de la misma regla recurrente en fechas distintas no son duplicados
+        if first.get("recurring_id") and first.get("recurring_id") == second.get("recurring_id"):
+            return
+        seen.add(ids)
+        older, newer = sorted((first, second), key=lambda x: x["id"])
+        candidates.append({"kind": kind, "keep": older, "duplicate": newer, "similarity": similarity, "reason": reason})
+
+    # La descripción se normaliza una sola vez por movimiento
+    prepared = [(entry, _entry_amount(entry), normalize_text(_entry_text(entry))) for entry in entries]
+
+    # 1) Coincidencias exactas por índice hash
+    exact: Dict[Tuple, List[Dict]] = {}
+    for entry, amount_key, text in prepared:
+        exact.setdefault((entry["date"], amount_key, text), []).append(entry)
+    for group in exact.values():
+        for other in group[1:]:
+            add_pair(group[0], other, 1.0, "exact")
+
+    # 2) Mismo monto, fechas cercanas y descripciones parecidas
+    by_amount: Dict[Tuple[str, float], List[Tuple[int, str, Dict]]] = {}
+    for entry, amount_key, text in prepared:
+        by_amount.setdefault(amount_key, []).append((date.fromisoformat(entry["date"]).toordinal(), text, entry))
+    for group in by_amount.values():
+        if len(group) < 2:
+            continue
+        group.sort(key=lambda x: x[0])
+        for i, (day, text, entry) in enumerate(group):
+            for other_day, other_text, other in group[i + 1:i + 1 + MAX_COMPARISONS]:
+                if other_day - day > window_days:
+                    break
+                if text == other_text:
+                    # El mismo día ya es coincidencia exacta; en días distintos suele ser una compra habitual
+                    continue
+                if min(len(text), len(other_text)) >= 4 and (text in other_text or other_text in text):
+                    similarity = 0.9
+                else:
+                    similarity = SequenceMatcher(None, text, other_text).ratio()
+                if similarity >= DUPLICATE_MIN_SIMILARITY:
+                    add_pair(entry, other, round(similarity * (1 - (other_day - day) / (window_days + 1) / 2), 3),
+                             "similar")
+
+    return sorted(candidates, key=lambda x: x["similarity"], reverse=True)
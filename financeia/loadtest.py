@@ -0,0 +1,289 @@
+"""Prueba de carga de la interfaz con sesiones simultáneas y un Gemini local simulado.
+
+    python -m financeia.loadtest --sessions 20 --iterations 5 --latency 0.8
+    python -m financeia.loadtest --sessions 50 --data financial_data.json --json
+
+Cada sesión es un navegador sin interfaz (streamlit.testing AppTest) que recorre el flujo
+de un estudiante: registrar un gasto, ver el dashboard, pedir el análisis completo y hacer
+una consulta. Gemini se reemplaza por un modelo falso con la latencia indicada, así que no
+se usa la red ni la cuota de la API. Al final se informa el rendimiento (recargas por
+segundo), la latencia p50/p99 de cada recarga y la memoria usada por sesión
+(aparte de la primera carga de cada proceso, que importa pandas y plotly).
+
+AppTest reemplaza el runtime global de Streamlit en cada recarga, por lo que cada sesión
+corre en su propio proceso; todas comparten el mismo archivo de datos, como las pestañas
+de un servidor real.
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import types
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+APP_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+FLOW_STEPS = ("add_expense", "dashboard", "analysis", "query")
+DEFAULT_LATENCY = 0.8     # segundos que tarda en responder el Gemini simulado
+RUN_TIMEOUT = 120         # segundos máximos de una recarga antes de darla por fallida
+
+SAMPLE_EXPENSES = [("Almuerzo en la universidad", 12.5), ("Pasaje de bus", 3.0), ("Copias y anillado", 6.0),
+                   ("Café", 4.5), ("Recarga de celular", 10.0), ("Entrada al cine", 18.0)]
+SAMPLE_QUESTIONS = ["¿En qué categoría gasto más dinero?", "¿Cómo puedo ahorrar más dinero?",
+                    "¿Qué estrategia me recomiendas para este mes?"]
+
+
+class FakeResponse:
+    """Respuesta de texto sin llamadas a funciones, con la forma que usa el motor"""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.parts = [types.SimpleNamespace(text=text, function_call=types.SimpleNamespace(name="", args={}))]
+
+
+def _content(role: str, texts: List[str]):
+    return types.SimpleNamespace(role=role, parts=[types.SimpleNamespace(text=text) for text in texts])
+
+
+class FakeChat:
+    """Chat con historial de contenidos (role, parts[].text) como el del SDK"""
+
+    def __init__(self, model: "FakeGenerativeModel", history: Optional[List[Dict]] = None):
+        self.model = model
+        self.history = [_content(item["role"], item["parts"]) for item in history or []]
+
+    def send_message(self, message) -> FakeResponse:
+        response = self.model.generate_content(message)
+        self.history.append(_content("user", [message if isinstance(message, str) else ""]))
+        self.history.append(_content("model", [response.text]))
+        return response
+
+
+class FakeGenerativeModel:
+    """Reemplazo local de genai.GenerativeModel: responde tras una latencia configurable"""
+
+    latency = DEFAULT_LATENCY
+    jitter = 0.2
+    calls = 0
+
+    def __init__(self, model_name: str = "fake", **kwargs):
+        self.model_name = model_name
+
+    def generate_content(self, prompt) -> FakeResponse:
+        FakeGenerativeModel.calls += 1
+        time.sleep(max(self.latency * random.uniform(1 - self.jitter, 1 + self.jitter), 0))
+        size = len(prompt) if isinstance(prompt, str) else 0
+        return FakeResponse(f"📊 Respuesta simulada ({size} caracteres de contexto). 💡 Ahorra un 10% de tus ingresos.")
+
+    def start_chat(self, history: Optional[List] = None) -> FakeChat:
+        return FakeChat(self, history)
+
+
+def install_fake_gemini(latency: float = DEFAULT_LATENCY, jitter: float = 0.2):
+    """Hace que `import google.generativeai` devuelva el modelo simulado en este proceso"""
+    FakeGenerativeModel.latency = latency
+    FakeGenerativeModel.jitter = jitter
+    fake = types.ModuleType("google.generativeai")
+    fake.configure = lambda **kwargs: None
+    fake.GenerativeModel = FakeGenerativeModel
+    parent = sys.modules.get("google")
+    if parent is None:
+        parent = types.ModuleType("google")
+        parent.__path__ = []
+        sys.modules["google"] = parent
+    sys.modules["google.generativeai"] = fake
+    # `import google.generativeai as genai` toma el atributo del paquete padre
+    parent.generativeai = fake
+
+
+def _rss_mb() -> float:
+    """Memoria residente actual del proceso en MB"""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 1024 ** 2
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+    except (OSError, ValueError, AttributeError):
+        import resource
+        # Sin psutil ni /proc solo se conoce el máximo (KB en Linux, bytes en macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024
+
+
+def _worker_init(workdir: str, latency: float, jitter: float):
+    os.chdir(workdir)
+    install_fake_gemini(latency, jitter)
+    # Importar Streamlit antes de medir para no contarlo como memoria de la sesión
+    import streamlit.testing.v1  # noqa: F401
+    # Los avisos de Streamlit (con traza) en cada recarga taparían el resumen
+    logging.disable(logging.WARNING)
+
+
+def _button(at, label: str):
+    return next(button for button in at.button if button.label == label)
+
+
+def run_session(index: int, iterations: int, steps: List[str], app_file: str = APP_FILE) -> Dict:
+    """Recorre el flujo de un estudiante y devuelve las muestras de latencia de cada recarga"""
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(index)
+    # Un proceso del pool puede atender varias sesiones: el contador es por sesión
+    FakeGenerativeModel.calls = 0
+    samples = []
+    errors = []
+    baseline = _rss_mb()
+    warmed = baseline
+
+    at = AppTest.from_file(app_file, default_timeout=RUN_TIMEOUT)
+
+    def timed(step: str, action):
+        start = time.time()
+        action().run()
+        samples.append((step, start, time.time() - start))
+        if at.exception:
+            raise RuntimeError(at.exception[0].message)
+
+    def add_expense():
+        description, amount = rng.choice(SAMPLE_EXPENSES)
+        timed("open_form", lambda: at.sidebar.selectbox[0].select("📝 Ingresar Datos"))
+        at.number_input(key="expense_amount_input").set_value(amount)
+        # En el navegador escribir la descripción recarga la página (sugerencia de categoría)
+        timed("type_expense", lambda: at.text_input(key="expense_description_input").input(description))
+        timed("add_expense", lambda: _button(at, "💸 Registrar Gasto").click())
+
+    def analysis():
+        timed("open_analysis", lambda: at.sidebar.selectbox[0].select("🧠 Análisis IA"))
+        timed("analysis", lambda: _button(at, "🚀 Generar Análisis Completo").click())
+
+    def query():
+        timed("open_query", lambda: at.sidebar.selectbox[0].select("💬 Consultas"))
+        timed("type_question", lambda: at.text_area[0].input(rng.choice(SAMPLE_QUESTIONS)))
+        timed("query", lambda: _button(at, "🚀 Obtener Respuesta de Gemini").click())
+
+    flows = {"add_expense": add_expense, "analysis": analysis, "query": query,
+             "dashboard": lambda: timed("dashboard", lambda: at.sidebar.selectbox[0].select("🏠 Dashboard"))}
+    try:
+        timed("load", lambda: at)
+        # La primera carga importa pandas/plotly una vez por proceso: se informa aparte
+        warmed = _rss_mb()
+    except Exception as e:
+        errors.append(f"load: {e}")
+        steps, iterations = [], 0
+    for _ in range(iterations):
+        for step in steps:
+            try:
+                flows[step]()
+            except Exception as e:
+                # Un paso fallido se informa y la sesión sigue con el siguiente
+                errors.append(f"{step}: {e}")
+    memory = _rss_mb() - warmed
+    if "financial_ai" in at.session_state:
+        # Los procesos del pool terminan sin los ganchos atexit: el último guardado diferido se haría perder
+        at.session_state["financial_ai"].flush_data()
+    return {"session": index, "samples": samples, "errors": errors, "warmup_mb": warmed - baseline,
+            "memory_mb": memory, "gemini_calls": FakeGenerativeModel.calls}
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Percentil q (0-100) por el rango más cercano"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(max(int(round(q / 100 * len(ordered) + 0.5)) - 1, 0), len(ordered) - 1)]
+
+
+def summarize(results: List[Dict]) -> Dict:
+    """Rendimiento, latencias por paso y memoria por sesión de todas las sesiones"""
+    samples = [sample for result in results for sample in result["samples"]]
+    started = min((start for _, start, _ in samples), default=0.0)
+    finished = max((start + elapsed for _, start, elapsed in samples), default=0.0)
+    wall = max(finished - started, 1e-9)
+    by_step: Dict[str, List[float]] = {}
+    for step, _, elapsed in samples:
+        by_step.setdefault(step, []).append(elapsed)
+    latencies = [elapsed for _, _, elapsed in samples]
+    memory = [result["memory_mb"] for result in results]
+    warmup = [result["warmup_mb"] for result in results]
+    return {
+        "sessions": len(results),
+        "reruns": len(samples),
+        "wall_seconds": round(wall, 2),
+        "throughput_rps": round(len(samples) / wall, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "steps": {step: {"count": len(values), "p50_ms": round(percentile(values, 50) * 1000, 1),
+                         "p99_ms": round(percentile(values, 99) * 1000, 1)}
+                  for step, values in by_step.items()},
+        "memory_mb_per_session": round(sum(memory) / len(memory), 1) if memory else 0.0,
+        "memory_mb_max": round(max(memory), 1) if memory else 0.0,
+        "warmup_mb_max": round(max(warmup), 1) if warmup else 0.0,
+        "gemini_calls": sum(result["gemini_calls"] for result in results),
+        "errors": [f"sesión {result['session']}: {error}" for result in results for error in result["errors"]],
+    }
+
+
+def run_load_test(sessions: int, iterations: int = 3, latency: float = DEFAULT_LATENCY, jitter: float = 0.2,
+                  steps: Optional[List[str]] = None, data_file: Optional[str] = None,
+                  app_file: str = APP_FILE) -> Dict:
+    """Lanza las sesiones a la vez sobre un directorio temporal y devuelve el resumen"""
+    workdir = tempfile.mkdtemp(prefix="financeia-load-")
+    try:
+        with open(os.path.join(workdir, "config.json"), "w", encoding="utf-8") as f:
+            json.dump({"gemini_api_key": "prueba-de-carga"}, f)
+        if data_file:
+            shutil.copy(data_file, os.path.join(workdir, "financial_data.json"))
+        with ProcessPoolExecutor(max_workers=sessions, initializer=_worker_init,
+                                 initargs=(workdir, latency, jitter)) as pool:
+            futures = [pool.submit(run_session, index, iterations, list(steps or FLOW_STEPS), app_file)
+                       for index in range(sessions)]
+            results = [future.result() for future in futures]
+        summary = summarize(results)
+        with open(os.path.join(workdir, "financial_data.json"), encoding="utf-8") as f:
+            summary["saved_expenses"] = len(json.load(f)["expenses"])
+        return summary
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Prueba de carga de FinanceIA con Gemini simulado")
+    parser.add_argument("--sessions", type=int, default=10, help="Sesiones simultáneas")
+    parser.add_argument("--iterations", type=int, default=3, help="Veces que cada sesión repite el flujo")
+    parser.add_argument("--latency", type=float, default=DEFAULT_LATENCY, help="Segundos por respuesta de Gemini")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Variación relativa de la latencia")
+    parser.add_argument("--steps", nargs="+", choices=FLOW_STEPS, default=list(FLOW_STEPS),
+                        help="Pasos del flujo, en orden")
+    parser.add_argument("--data", help="Archivo de datos inicial (se copia; el original no se modifica)")
+    parser.add_argument("--json", action="store_true", help="Imprimir el resumen como JSON")
+    args = parser.parse_args(argv)
+    if args.sessions < 1 or args.iterations < 1:
+        parser.error("--sessions e --iterations deben ser al menos 1")
+
+    summary = run_load_test(args.sessions, args.iterations, args.latency, args.jitter, args.steps, args.data)
+    if args.json:
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+    else:
+        print(f"Sesiones: {summary['sessions']}  recargas: {summary['reruns']}  tiempo: {summary['wall_seconds']} s")
+        print(f"Rendimiento: {summary['throughput_rps']} recargas/s  "
+              f"p50: {summary['p50_ms']} ms  p99: {summary['p99_ms']} ms")
+        print(f"Memoria por sesión: {summary['memory_mb_per_session']} MB (máx. {summary['memory_mb_max']} MB)  "
+              f"primera carga del proceso: {summary['warmup_mb_max']} MB")
+        print(f"Llamadas a Gemini simulado: {summary['gemini_calls']}  gastos guardados: {summary['saved_expenses']}")
+        for step, stats in summary["steps"].items():
+            print(f"  {step:<14} n={stats['count']:<5} p50={stats['p50_ms']} ms  p99={stats['p99_ms']} ms")
+        for error in summary["errors"]:
+            print(f"⚠️ {error}", file=sys.stderr)
+    return 1 if summary["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,161 @@
+"""Guardado diferido y atómico del archivo de datos.
+
+Las modificaciones solo marcan el libro como pendiente de guardar; varias modificaciones
+seguidas se agrupan en una sola escritura en segundo plano. Cada escritura va a un archivo
+temporal que luego reemplaza al original, de modo que un corte nunca deja el JSON a medias.
+La escritura se hace con el archivo bloqueado para que otras sesiones no escriban a la vez.
+"""
+import atexit
+import functools
+import os
+import sys
+import tempfile
+import threading
+import weakref
+from typing import Callable, Optional
+
+from .sync import file_lock
+
+# Modos de durabilidad (etiqueta para la interfaz -> valor guardado en config.json)
+DURABILITY_MODES = {
+    "⚡ Rápido (agrupa escrituras, sin fsync)": "fast",
+    "⚖️ Equilibrado (agrupa escrituras, con fsync)": "balanced",
+    "🔒 Estricto (escribe y sincroniza en cada cambio)": "strict",
+}
+DEFAULT_DURABILITY = "balanced"
+DEBOUNCE_SECONDS = 0.5
+
+_managers = weakref.WeakSet()
+
+
+class StaleFileError(Exception):
+    """El archivo cambió desde la última lectura y el guardado en segundo plano no puede fusionar"""
+
+
+@functools.lru_cache(maxsize=None)
+def _new_file_mode() -> int:
+    """Permisos que open(..., "w") daría a un archivo nuevo (0o666 menos la umask)"""
+    # La umask solo se puede leer cambiándola: se hace una vez y se restaura enseguida
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+def atomic_write(path: str, text: str, fsync: bool = True):
+    """Escribe text en un temporal del mismo directorio y lo renombra sobre path"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        # mkstemp crea el archivo solo para el dueño (0600): conservar los permisos del original
+        # o, si es nuevo, usar los que tendría con open()
+        mode = os.stat(path).st_mode & 0o777 if os.path.exists(path) else _new_file_mode()
+        os.chmod(temp_path, mode)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    if fsync and hasattr(os, "O_DIRECTORY"):
+        # Sincronizar también el directorio para que el renombrado sobreviva a un corte de energía
+        dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+class PersistenceManager:
+    """Agrupa las modificaciones del libro en escrituras atómicas diferidas"""
+
+    def __init__(self, path: str, serialize: Callable[[], str], durability: str = DEFAULT_DURABILITY,
+                 delay: float = DEBOUNCE_SECONDS, after_write: Optional[Callable[[], None]] = None):
+        self.path = path
+        # serialize(background) debe tomar el candado del motor para no leer los datos a medio
+        # modificar; en segundo plano lanza StaleFileError en vez de fusionar cambios ajenos
+        self.serialize = serialize
+        # after_write se llama con el archivo aún bloqueado, tras un reemplazo exitoso
+        self.after_write = after_write
+        self.durability = durability if durability in DURABILITY_MODES.values() else DEFAULT_DURABILITY
+        self.delay = delay
+        self.dirty = False
+        # Un guardado en segundo plano quedó esperando a que el motor se sincronice
+        self.stale = False
+        self.writes = 0
+        self.last_error: Optional[Exception] = None
+        self._timer: Optional[threading.Timer] = None
+        self._state_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        _managers.add(self)
+
+    def mark_dirty(self, defer: bool = False):
+        """Registra que hay cambios; se escriben tras DEBOUNCE_SECONDS (o ya, en modo estricto).
+
+        Con defer=True el modo estricto no escribe aquí: el llamador llamará a flush_if_strict.
+        """
+        with self._state_lock:
+            self.dirty = True
+            if self.durability != "strict" and self._timer is None:
+                self._timer = threading.Timer(self.delay, self._flush_in_background)
+                self._timer.daemon = True
+                self._timer.start()
+        if not defer:
+            self.flush_if_strict()
+
+    def flush_if_strict(self) -> bool:
+        """En modo estricto escribe ya los cambios pendientes; en los demás los deja al temporizador"""
+        return self.durability == "strict" and self.flush()
+
+    def _flush_in_background(self):
+        try:
+            self.flush(background=True)
+        except StaleFileError:
+            # Los cambios quedan pendientes hasta la próxima sincronización del motor (sync)
+            pass
+        except Exception:
+            # last_error queda disponible para la interfaz; el próximo cambio vuelve a intentarlo
+            pass
+
+    def flush(self, background: bool = False) -> bool:
+        """Escribe los cambios pendientes ahora mismo; devuelve False si no había nada que guardar"""
+        with self._write_lock:
+            with self._state_lock:
+                if self._timer is not None and self._timer is not threading.current_thread():
+                    self._timer.cancel()
+                self._timer = None
+                if not self.dirty:
+                    return False
+                self.dirty = False
+            try:
+                with file_lock(self.path):
+                    atomic_write(self.path, self.serialize(background), fsync=self.durability != "fast")
+                    if self.after_write:
+                        self.after_write()
+            except StaleFileError:
+                with self._state_lock:
+                    self.dirty = True
+                self.stale = True
+                raise
+            except Exception as e:
+                with self._state_lock:
+                    self.dirty = True
+                self.last_error = e
+                raise
+            self.stale = False
+            self.last_error = None
+            self.writes += 1
+            return True
+
+
+@atexit.register
+def _flush_all():
+    """Guarda los cambios pendientes de todos los motores al cerrar el proceso"""
+    for manager in list(_managers):
+        try:
+            manager.flush()
+        except Exception as e:
+            print(f"No se pudieron guardar los cambios en {manager.path}: {e}", file=sys.stderr)
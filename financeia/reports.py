@@ -0,0 +1,229 @@
+"""Estados de cuenta mensuales en HTML (y PDF si weasyprint está instalado).
+
+Cada estado se arma con los agregados mensuales que el motor ya mantiene (totales,
+categorías, recurrentes) y el análisis de Gemini guardado en data["analyses"], sin volver a
+recorrer los movimientos. Los gráficos son SVG en línea, así el HTML es un único archivo
+que se puede enviar por correo o imprimir. Los lotes grandes (muchos meses o usuarios) se
+renderizan en paralelo en un pool de procesos.
+"""
+import functools
+import html
+import os
+import re
+from datetime import datetime
+from itertools import repeat
+from typing import Dict, List, Optional
+
+from .charts import top_categories
+from .currency import format_amount
+
+HISTORY_MONTHS = 6        # meses del gráfico de ingresos y gastos
+CHART_COLORS = ["#667eea", "#fd79a8", "#00b894", "#fdcb6e", "#e17055", "#0984e3", "#6c5ce7", "#b2bec3", "#636e72"]
+
+MONTH_NAMES = ["enero", "febrero", "marzo", "abril", "mayo", "junio", "julio", "agosto", "septiembre",
+               "octubre", "noviembre", "diciembre"]
+
+
+@functools.lru_cache(maxsize=None)
+def pdf_available() -> bool:
+    """True si weasyprint está instalado (es opcional: sin él solo se genera HTML)"""
+    try:
+        import weasyprint  # noqa: F401
+    except (ImportError, OSError):
+        # OSError: weasyprint instalado pero sin las bibliotecas del sistema (Pango)
+        return False
+    return True
+
+
+def build_period(data: Dict, monthly_aggregates: Dict[str, Dict], month: str, owner: str = "") -> Dict:
+    """Datos de un estado de cuenta tomados de los agregados del mes (sin recorrer movimientos)"""
+    empty = {"income": 0.0, "expenses": 0.0, "categories": {}, "recurring_income": 0.0, "recurring_expenses": 0.0}
+    period = monthly_aggregates.get(month, empty)
+    history_months = sorted(m for m in monthly_aggregates if m <= month)[-HISTORY_MONTHS:]
+    budgets = []
+    for category, limit in data.get("budgets", {}).items():
+        spent = period["categories"].get(category, 0.0)
+        budgets.append({"category": category, "limit": limit, "spent": spent,
+                        "percentage": spent / limit * 100 if limit else 0.0})
+    analysis = data.get("analyses", {}).get(month)
+    balance = period["income"] - period["expenses"]
+    return {
+        "month": month,
+        "owner": owner,
+        "income": period["income"],
+        "expenses": period["expenses"],
+        "balance": balance,
+        "savings_rate": balance / period["income"] * 100 if period["income"] > 0 else 0.0,
+        "recurring_income": period["recurring_income"],
+        "recurring_expenses": period["recurring_expenses"],
+        "categories": top_categories(period["categories"]),
+        "budgets": sorted(budgets, key=lambda x: x["percentage"], reverse=True),
+        "history": [(m, monthly_aggregates[m]["income"], monthly_aggregates[m]["expenses"]) for m in history_months],
+        "analysis": analysis["text"] if analysis else None,
+    }
+
+
+def month_label(month: str) -> str:
+    """'2024-05' -> 'mayo 2024'"""
+    year, number = month.split("-")
+    return f"{MONTH_NAMES[int(number) - 1]} {year}"
+
+
+def _category_svg(categories: Dict[str, float]) -> str:
+    """Barras horizontales con el gasto de cada categoría"""
+    if not categories:
+        return "<p>Sin gastos registrados este mes.</p>"
+    width, bar_height, label_width = 560, 24, 150
+    top = max(categories.values())
+    rows = []
+    for i, (category, amount) in enumerate(categories.items()):
+        y = i * (bar_height + 8)
+        length = max(amount / top * (width - label_width - 110), 2)
+        rows.append(
+            f'<text x="{label_width - 8}" y="{y + 16}" text-anchor="end">{html.escape(category)}</text>'
+            f'<rect x="{label_width}" y="{y}" width="{length:.1f}" height="{bar_height}" rx="4" '
+            f'fill="{CHART_COLORS[i % len(CHART_COLORS)]}"/>'
+            f'<text x="{label_width + length + 6:.1f}" y="{y + 16}">{html.escape(format_amount(amount))}</text>'
+        )
+    height = len(categories) * (bar_height + 8)
+    return (f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+            f'viewBox="0 0 {width} {height}" font-size="12">{"".join(rows)}</svg>')
+
+
+def _history_svg(history: List) -> str:
+    """Barras agrupadas de ingresos y gastos de los últimos meses"""
+    if not history:
+        return ""
+    width, height, bottom = 560, 200, 24
+    top = max(max(income, expenses) for _, income, expenses in history) or 1.0
+    group = width / len(history)
+    bar = min(group / 3, 40)
+    parts = []
+    for i, (month, income, expenses) in enumerate(history):
+        x = i * group + (group - 2 * bar) / 2
+        for j, (amount, color) in enumerate(((income, "#00b894"), (expenses, "#e17055"))):
+            bar_height = amount / top * (height - bottom - 10)
+            parts.append(f'<rect x="{x + j * bar:.1f}" y="{height - bottom - bar_height:.1f}" width="{bar - 2:.1f}" '
+                         f'height="{bar_height:.1f}" fill="{color}"><title>{html.escape(format_amount(amount))}</title></rect>')
+        parts.append(f'<text x="{i * group + group / 2:.1f}" y="{height - 6}" text-anchor="middle">{month}</text>')
+    return (f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+            f'viewBox="0 0 {width} {height}" font-size="11">{"".join(parts)}</svg>'
+            '<p class="legend"><span style="color:#00b894">■</span> Ingresos '
+            '<span style="color:#e17055">■</span> Gastos</p>')
+
+
+def _markdown_to_html(text: str) -> str:
+    """Convierte el markdown sencillo de las respuestas de Gemini (títulos, listas, negritas)"""
+    blocks = []
+    in_list = False
+    for line in text.splitlines():
+        stripped = line.strip()
+        is_item = stripped[:2] in ("- ", "* ") or bool(re.match(r"\d+\.\s", stripped))
+        text_only = re.sub(r"^(#+\s*|[-*]\s+|\d+\.\s+)", "", stripped)
+        content = re.sub(r"\*\*(.+?)\*\*", r"<strong>\1</strong>", html.escape(text_only))
+        if in_list and not is_item:
+            blocks.append("</ul>")
+            in_list = False
+        if not stripped:
+            continue
+        if is_item:
+            if not in_list:
+                blocks.append("<ul>")
+                in_list = True
+            blocks.append(f"<li>{content}</li>")
+        elif stripped.startswith("#"):
+            blocks.append(f"<h3>{content}</h3>")
+        else:
+            blocks.append(f"<p>{content}</p>")
+    if in_list:
+        blocks.append("</ul>")
+    return "\n".join(blocks)
+
+
+STYLE = """
+body { font-family: Helvetica, Arial, sans-serif; color: #2c3e50; max-width: 760px; margin: 2rem auto; }
+h1 { margin-bottom: 0; } .subtitle { color: #6c757d; margin-top: 0.2rem; }
+.cards { display: flex; gap: 1rem; margin: 1.5rem 0; }
+.card { flex: 1; border-radius: 10px; padding: 0.8rem 1rem; background: #f5f6fa; }
+.card .value { font-size: 1.3rem; font-weight: bold; }
+table { border-collapse: collapse; width: 100%; } td, th { padding: 0.4rem; border-bottom: 1px solid #dfe6e9; text-align: left; }
+td.num, th.num { text-align: right; } .over { color: #d63031; font-weight: bold; }
+.legend { font-size: 0.8rem; color: #6c757d; } footer { margin-top: 2rem; font-size: 0.8rem; color: #6c757d; }
+"""
+
+
+def render_statement_html(period: Dict) -> str:
+    """Estado de cuenta del mes como un HTML autocontenido"""
+    title = f"Estado de cuenta · {month_label(period['month'])}"
+    owner = f" · {html.escape(period['owner'])}" if period["owner"] else ""
+    cards = "".join(
+        f'<div class="card"><div>{label}</div><div class="value">{html.escape(format_amount(value))}</div></div>'
+        for label, value in (("💰 Ingresos", period["income"]), ("💸 Gastos", period["expenses"]),
+                             ("📊 Balance", period["balance"]))
+    )
+    budget_rows = "".join(
+        f'<tr><td>{html.escape(item["category"])}</td><td class="num">{html.escape(format_amount(item["spent"]))}</td>'
+        f'<td class="num">{html.escape(format_amount(item["limit"]))}</td>'
+        f'<td class="num{" over" if item["percentage"] > 100 else ""}">{item["percentage"]:.0f}%</td></tr>'
+        for item in period["budgets"]
+    )
+    budgets = (f'<h2>🎯 Presupuestos</h2><table><tr><th>Categoría</th><th class="num">Gastado</th>'
+               f'<th class="num">Límite</th><th class="num">Uso</th></tr>{budget_rows}</table>') if budget_rows else ""
+    analysis = (f"<h2>🧠 Análisis</h2>{_markdown_to_html(period['analysis'])}" if period["analysis"]
+                else "<h2>🧠 Análisis</h2><p>Aún no hay un análisis guardado para este mes "
+                     "(<code>python -m financeia analyze</code>).</p>")
+    return f"""<!DOCTYPE html>
+<html lang="es">
+<head><meta charset="utf-8"><title>{title}</title><style>{STYLE}</style></head>
+<body>
+<h1>💰 FinanceIA</h1>
+<p class="subtitle">{title}{owner}</p>
+<div class="cards">{cards}</div>
+<p>Tasa de ahorro: <strong>{period['savings_rate']:.1f}%</strong> ·
+Recurrentes: {html.escape(format_amount(period['recurring_income']))} en ingresos y
+{html.escape(format_amount(period['recurring_expenses']))} en gastos</p>
+<h2>🏷️ Gastos por categoría</h2>
+{_category_svg(period['categories'])}
+<h2>📈 Ingresos y gastos de los últimos meses</h2>
+{_history_svg(period['history'])}
+{budgets}
+{analysis}
+<footer>Generado el {datetime.now().strftime('%Y-%m-%d %H:%M')} con FinanceIA. Montos en soles (S/).</footer>
+</body>
+</html>
+"""
+
+
+def render_statement_pdf(document: str) -> bytes:
+    """PDF del HTML de un estado (requiere weasyprint, ver pdf_available)"""
+    from weasyprint import HTML
+    return HTML(string=document).write_pdf()
+
+
+def write_statement(period: Dict, out_dir: str, pdf: bool = False) -> List[str]:
+    """Escribe el HTML (y el PDF si se pide y hay renderizador) de un mes; devuelve las rutas"""
+    prefix = f"{period['owner']}_" if period["owner"] else ""
+    base = os.path.join(out_dir, f"{prefix}estado_{period['month']}")
+    document = render_statement_html(period)
+    with open(f"{base}.html", "w", encoding="utf-8") as f:
+        f.write(document)
+    paths = [f"{base}.html"]
+    if pdf and pdf_available():
+        with open(f"{base}.pdf", "wb") as f:
+            f.write(render_statement_pdf(document))
+        paths.append(f"{base}.pdf")
+    return paths
+
+
+def generate_statements(periods: List[Dict], out_dir: str, pdf: bool = False,
+                        workers: Optional[int] = None) -> List[str]:
+    """Renderiza muchos estados en paralelo; con uno solo (o workers=1) no se crea el pool"""
+    os.makedirs(out_dir, exist_ok=True)
+    if len(periods) <= 1 or workers == 1:
+        return [path for period in periods for path in write_statement(period, out_dir, pdf)]
+    # multiprocessing es costoso de importar: solo se carga para los lotes
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Los períodos ya vienen agregados: cada proceso recibe solo unos cientos de bytes
+        results = pool.map(write_statement, periods, repeat(out_dir), repeat(pdf), chunksize=4)
+        return [path for paths in results for path in paths]
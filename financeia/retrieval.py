@@ -0,0 +1,228 @@
+"""Recuperación local de movimientos relevantes para una pregunta (BM25 + rango de fechas).
+
+Permite responder preguntas como "¿cuánto gasté en cine el último semestre?" enviando
+a Gemini solo las filas y totales pertinentes en lugar de todo el historial.
+"""
+import calendar
+import math
+import re
+import unicodedata
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from .categorizer import ExpenseCategorizer
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+MONTHS = {"enero": 1, "febrero": 2, "marzo": 3, "abril": 4, "mayo": 5, "junio": 6, "julio": 7,
+          "agosto": 8, "septiembre": 9, "setiembre": 9, "octubre": 10, "noviembre": 11, "diciembre": 12}
+
+# Palabras frecuentes en las preguntas que no ayudan a encontrar movimientos
+STOPWORDS = {
+    "cuanto", "cuantos", "cuanta", "cuantas", "que", "cual", "cuales", "como", "donde", "cuando", "por",
+    "para", "con", "sin", "los", "las", "del", "una", "uno", "unos", "unas", "mis", "mi", "me", "en", "el",
+    "la", "de", "al", "lo", "le", "es", "son", "fue", "ha", "he", "mas", "menos", "muy", "gaste", "gasto",
+    "gastos", "gastado", "ingreso", "ingresos", "recibi", "dinero", "total", "mes", "meses", "ano", "anos",
+    "semana", "semanas", "dia", "dias", "ultimo", "ultimos", "ultima", "ultimas", "pasado", "pasada",
+    "este", "esta", "estos", "semestre", "desde", "hasta", "entre", "todo", "toda", "todos", "hay", "tengo",
+    "puedo", "debo", "deberia", "hice", "hecho", "cuant*", "gasta*", "ingre*", "ultim*", "seman*",
+    "semes*", "pasad*", "deber*"
+} | set(MONTHS) | {name[:5] + "*" for name in MONTHS if len(name) > 5}
+
+
+def _normalize(text: str) -> str:
+    normalized = unicodedata.normalize("NFKD", text.lower())
+    return "".join(char for char in normalized if not unicodedata.combining(char))
+
+
+def _month_range(year: int, month: int) -> Tuple[date, date]:
+    return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+
+
+def _valid_date(text: str) -> bool:
+    try:
+        date.fromisoformat(text)
+    except ValueError:
+        return False
+    return True
+
+
+def _shift_months(day: date, months: int) -> date:
+    month_index = day.month - 1 + months
+    year, month = day.year + month_index // 12, month_index % 12 + 1
+    return date(year, month, min(day.day, calendar.monthrange(year, month)[1]))
+
+
+def parse_date_range(question: str, today: Optional[date] = None) -> Optional[Tuple[str, str]]:
+    """Interpreta expresiones de tiempo en español ("mes pasado", "en marzo", "últimos 3 meses"...)"""
+    today = today or date.today()
+    text = _normalize(question)
+
+    explicit = [day for day in re.findall(r"\d{4}-\d{2}-\d{2}", text) if _valid_date(day)]
+    if len(explicit) >= 2:
+        return min(explicit[:2]), max(explicit[:2])
+    match = re.search(r"ultim[oa]s\s+(\d+)\s+(dia|semana|mes)", text)
+    if match:
+        amount, unit = int(match.group(1)), match.group(2)
+        start = _shift_months(today, -amount) if unit == "mes" else today - timedelta(days=amount * (7 if unit == "semana" else 1))
+        return start.isoformat(), today.isoformat()
+    if re.search(r"(ultimo|este|pasado)\s+semestre|semestre\s+pasado", text):
+        return _shift_months(today, -6).isoformat(), today.isoformat()
+    if "mes pasado" in text or "ultimo mes" in text:
+        previous = _shift_months(today.replace(day=1), -1)
+        start, end = _month_range(previous.year, previous.month)
+        return start.isoformat(), end.isoformat()
+    if "este mes" in text:
+        return _month_range(today.year, today.month)[0].isoformat(), today.isoformat()
+    if "semana pasada" in text:
+        start = today - timedelta(days=today.weekday() + 7)
+        return start.isoformat(), (start + timedelta(days=6)).isoformat()
+    if "esta semana" in text:
+        return (today - timedelta(days=today.weekday())).isoformat(), today.isoformat()
+    if "ano pasado" in text:
+        return f"{today.year - 1}-01-01", f"{today.year - 1}-12-31"
+    if "este ano" in text:
+        return f"{today.year}-01-01", today.isoformat()
+
+    year_match = re.search(r"\b(20\d{2})\b", text)
+    for name, month in MONTHS.items():
+        if re.search(rf"\b{name}\b", text):
+            if year_match:
+                year = int(year_match.group(1))
+            else:
+                # Sin año explícito se toma la última vez que ocurrió ese mes
+                year = today.year if month <= today.month else today.year - 1
+            start, end = _month_range(year, month)
+            return start.isoformat(), end.isoformat()
+    if year_match:
+        return f"{year_match.group(1)}-01-01", f"{year_match.group(1)}-12-31"
+    return None
+
+
+class TransactionIndex:
+    """Índice invertido BM25 sobre ingresos y gastos, actualizado en cada inserción/borrado"""
+
+    def __init__(self):
+        self.postings: Dict[str, Dict[Tuple[str, int], int]] = {}
+        self.documents: Dict[Tuple[str, int], Dict] = {}
+        self.doc_lengths: Dict[Tuple[str, int], int] = {}
+        self.total_length = 0
+        # Totales por día: con los agregados mensuales dan el total de un período sin recorrer filas
+        self.daily_totals: Dict[str, Dict[str, float]] = {}
+
+    @staticmethod
+    def _document_tokens(kind: str, entry: Dict) -> List[str]:
+        text = entry.get("description") or entry.get("source") or ""
+        return ExpenseCategorizer.tokenize(f"{text} {entry['category']}")
+
+    def add(self, kind: str, entry: Dict):
+        key = (kind, entry["id"])
+        tokens = self._document_tokens(kind, entry)
+        self.documents[key] = entry
+        self.doc_lengths[key] = len(tokens)
+        self.total_length += len(tokens)
+        day = self.daily_totals.setdefault(entry["date"], {"income": 0.0, "expenses": 0.0})
+        day[kind] += entry["amount"]
+        for token in tokens:
+            postings = self.postings.setdefault(token, {})
+            postings[key] = postings.get(key, 0) + 1
+
+    def remove(self, kind: str, entry: Dict):
+        key = (kind, entry["id"])
+        if key not in self.documents:
+            return
+        for token in set(self._document_tokens(kind, entry)):
+            postings = self.postings.get(token, {})
+            postings.pop(key, None)
+            if not postings:
+                self.postings.pop(token, None)
+        self.total_length -= self.doc_lengths.pop(key)
+        del self.documents[key]
+        self.daily_totals[entry["date"]][kind] -= entry["amount"]
+
+    def search(self, question: str, start: Optional[str] = None, end: Optional[str] = None) -> List[Tuple[float, str, Dict]]:
+        """Movimientos que coinciden con la pregunta dentro del rango, ordenados por relevancia"""
+        terms = [token for token in set(ExpenseCategorizer.tokenize(question)) if token not in STOPWORDS]
+        if not self.documents or not terms:
+            return []
+        doc_count = len(self.documents)
+        average_length = self.total_length / doc_count or 1
+        scores: Dict[Tuple[str, int], float] = {}
+        for term in terms:
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for key, frequency in postings.items():
+                entry = self.documents[key]
+                if (start and entry["date"] < start) or (end and entry["date"] > end):
+                    continue
+                length_norm = 1 - BM25_B + BM25_B * self.doc_lengths[key] / average_length
+                scores[key] = scores.get(key, 0.0) + idf * frequency * (BM25_K1 + 1) / (frequency + BM25_K1 * length_norm)
+        # A igual relevancia, primero los más recientes
+        ranked = sorted(scores.items(), key=lambda x: (x[1], self.documents[x[0]]["date"]), reverse=True)
+        return [(score, key[0], self.documents[key]) for key, score in ranked]
+
+    def period_totals(self, start: str, end: str,
+                      monthly_aggregates: Optional[Dict[str, Dict]] = None) -> Dict[str, float]:
+        """Ingresos y gastos del rango: meses completos desde los agregados y días sueltos de los extremos"""
+        totals = {"income": 0.0, "expenses": 0.0}
+        day, last = date.fromisoformat(start), date.fromisoformat(end)
+        while day <= last:
+            month_start, month_end = _month_range(day.year, day.month)
+            if monthly_aggregates is not None and day == month_start and month_end <= last:
+                period = monthly_aggregates.get(day.strftime("%Y-%m"))
+                day = month_end + timedelta(days=1)
+            else:
+                period = self.daily_totals.get(day.isoformat())
+                day += timedelta(days=1)
+            if period:
+                totals["income"] += period["income"]
+                totals["expenses"] += period["expenses"]
+        return totals
+
+    def build_context(self, question: str, limit: int = 15, today: Optional[date] = None,
+                      monthly_aggregates: Optional[Dict[str, Dict]] = None) -> str:
+        """Bloque de texto con totales precalculados y las filas más relevantes para el prompt"""
+        date_range = parse_date_range(question, today)
+        start, end = date_range or (None, None)
+        matches = self.search(question, start, end)
+        if not matches and not date_range:
+            return ""
+
+        context = "\nMOVIMIENTOS RELEVANTES PARA LA PREGUNTA"
+        context += f" (período {start} a {end}):\n" if date_range else " (todo el historial):\n"
+        if date_range:
+            # Totales del período completo, coincidan o no con las palabras de la pregunta
+            period_totals = self.period_totals(start, end, monthly_aggregates)
+            context += f"- Total del período: ingresos S/{period_totals['income']:,.2f}, gastos S/{period_totals['expenses']:,.2f}\n"
+
+        if matches:
+            totals = {"income": [0, 0.0], "expenses": [0, 0.0]}
+            by_category: Dict[str, float] = {}
+            by_month: Dict[str, float] = {}
+            for _, kind, entry in matches:
+                totals[kind][0] += 1
+                totals[kind][1] += entry["amount"]
+                if kind == "expenses":
+                    by_category[entry["category"]] = by_category.get(entry["category"], 0.0) + entry["amount"]
+                    by_month[entry["date"][:7]] = by_month.get(entry["date"][:7], 0.0) + entry["amount"]
+            context += (f"- Coincidencias: {totals['expenses'][0]} gastos por S/{totals['expenses'][1]:,.2f} y "
+                        f"{totals['income'][0]} ingresos por S/{totals['income'][1]:,.2f}\n")
+            if by_category:
+                context += "- Gastos coincidentes por categoría: " + ", ".join(
+                    f"{category} S/{amount:,.2f}" for category, amount in sorted(by_category.items(), key=lambda x: x[1], reverse=True)
+                ) + "\n"
+            if by_month:
+                context += "- Gastos coincidentes por mes: " + ", ".join(
+                    f"{month} S/{amount:,.2f}" for month, amount in sorted(by_month.items())
+                ) + "\n"
+            context += f"- Detalle (los {min(limit, len(matches))} más relevantes):\n"
+            for _, kind, entry in matches[:limit]:
+                sign = "+" if kind == "income" else "-"
+                text = entry.get("description") or entry.get("source")
+                context += f"  - {entry['date']}: {text} {sign}S/{entry['amount']:,.2f} ({entry['category']})\n"
+        else:
+            context += "- Ningún movimiento coincide con las palabras de la pregunta en ese período\n"
+        return context
@@ -0,0 +1,152 @@
+"""Edición concurrente del mismo archivo de datos desde varias pestañas, sesiones o procesos.
+
+Cada sesión tiene su propia copia del libro. Al guardar se compara la versión del archivo
+(su ETag: inodo, fecha y tamaño) con la que la sesión vio por última vez; si otra sesión
+escribió antes, se incorporan sus cambios y se vuelven a aplicar los propios encima en vez
+de sobrescribirlos. Las sesiones del mismo proceso publican sus cambios en un registro
+compartido, así las demás solo aplican lo nuevo; un cambio hecho por otro proceso (la CLI,
+la API) obliga a releer el archivo completo.
+"""
+import os
+import threading
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: solo se coordinan las sesiones del mismo proceso
+    fcntl = None
+
+# Secciones del libro que se sincronizan completas; income y expenses van como operaciones
+SYNC_SECTIONS = ("goals", "budgets", "recurring", "analyses", "exchange_rates", "ignored_duplicates", "user_profile")
+LOG_SIZE = 500   # escrituras recordadas; una sesión más atrasada relee el archivo
+
+_stores: Dict[str, "SharedStore"] = {}
+_stores_lock = threading.Lock()
+
+
+def new_uid() -> str:
+    """Identificador estable de un movimiento o regla recurrente (los IDs numéricos se renumeran o reutilizan)"""
+    return uuid.uuid4().hex[:12]
+
+
+def file_etag(path: str) -> Optional[str]:
+    """Versión del archivo en disco; cambia con cada reemplazo atómico"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return f"{stat.st_ino}-{stat.st_mtime_ns}-{stat.st_size}"
+
+
+class SharedStore:
+    """Versión y registro de escrituras de un archivo de datos, compartidos por las sesiones del proceso"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.version = 0
+        self.etag = file_etag(path)
+        # Las sesiones con una versión menor a floor ya no pueden ponerse al día con el registro
+        self.floor = 0
+        self.log: deque = deque(maxlen=LOG_SIZE)
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+
+    def changes_since(self, version: int) -> Tuple[Optional[str], int, Optional[List[Tuple]]]:
+        """(etag, versión actual, escrituras posteriores a version); None si hay que releer el archivo"""
+        with self.lock:
+            if version == self.version:
+                return self.etag, self.version, []
+            if version < self.floor or not self.log or self.log[0][0] > version + 1:
+                return self.etag, self.version, None
+            return self.etag, self.version, [entry for entry in self.log if entry[0] > version]
+
+    def publish(self, base_etag: Optional[str], etag: Optional[str], ops: List[Tuple],
+                sections: Dict[str, str]) -> int:
+        """Registra una escritura hecha sobre base_etag y devuelve la nueva versión"""
+        with self.lock:
+            self.version += 1
+            if base_etag != self.etag:
+                # El archivo cambió fuera del registro (otro proceso): los atrasados deben releerlo
+                self.log.clear()
+                self.floor = self.version
+            self.log.append((self.version, ops, sections))
+            self.etag = etag
+            return self.version
+
+
+def get_store(path: str) -> SharedStore:
+    """Registro compartido del archivo (uno por ruta en todo el proceso)"""
+    key = os.path.abspath(path)
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = SharedStore(key)
+        return _stores[key]
+
+
+@contextmanager
+def file_lock(path: str):
+    """Excluye a otros escritores del archivo: hilos del proceso y, donde hay fcntl, otros procesos"""
+    store = get_store(path)
+    with store.write_lock:
+        if fcntl is None:
+            yield
+            return
+        with open(f"{path}.lock", "a") as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def _merge_dict(base: Dict, local: Dict, remote: Dict) -> Dict:
+    """Aplica sobre remote las claves que cambiaron o se borraron localmente respecto de base"""
+    merged = dict(remote)
+    for key in base.keys() - local.keys():
+        merged.pop(key, None)
+    for key, value in local.items():
+        if key not in base or base[key] != value:
+            merged[key] = value
+    return merged
+
+
+def merge_section(name: str, base, local, remote):
+    """Fusión a tres bandas de una sección editada aquí y en otra sesión desde la versión base.
+
+    Los cambios de la otra sesión se conservan y los locales se aplican encima; si ambas
+    cambiaron el mismo elemento gana el local.
+    """
+    if name == "exchange_rates":
+        merged = {}
+        for currency in set(base) | set(local) | set(remote):
+            rates = _merge_dict(dict(base.get(currency, [])), dict(local.get(currency, [])),
+                                dict(remote.get(currency, [])))
+            if rates:
+                merged[currency] = [[day, rates[day]] for day in sorted(rates)]
+        return merged
+    if name in ("goals", "recurring"):
+        # Las reglas se siguen por su UID (los movimientos generados apuntan a él); las metas, por su ID
+        key = "uid" if name == "recurring" else "id"
+        base_items = {item[key]: item for item in base}
+        local_items = {item[key]: item for item in local}
+        merged = {item[key]: item for item in remote}
+        for item_key in base_items.keys() - local_items.keys():
+            merged.pop(item_key, None)
+        remote_ids = {item["id"] for item in merged.values()}
+        next_id = max(list(remote_ids) + [item["id"] for item in local], default=0) + 1
+        for item_key, item in local_items.items():
+            if base_items.get(item_key) == item:
+                continue
+            if item_key not in base_items and item["id"] in remote_ids and merged.get(item_key) != item:
+                # Las dos sesiones crearon un elemento con el mismo ID: el local toma uno nuevo
+                item = {**item, "id": next_id}
+                next_id += 1
+            merged[item[key]] = item
+        return sorted(merged.values(), key=lambda x: x["id"])
+    if name == "ignored_duplicates":
+        return [item for item in remote if item in local or item not in base] + \
+            [item for item in local if item not in remote and item not in base]
+    return _merge_dict(base, local, remote)
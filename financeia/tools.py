@@ -0,0 +1,184 @@
+"""Funciones de consulta locales que Gemini puede invocar (function calling).
+
+En lugar de recibir todo el historial como texto, el modelo pide los totales, rankings o
+tendencias que necesita y las cifras se calculan aquí sobre el libro indexado por fecha.
+"""
+import calendar
+import heapq
+from bisect import bisect_left, bisect_right
+from datetime import date
+from itertools import accumulate
+from typing import Dict, List, Optional, Tuple
+
+# Máximo de funciones que Gemini puede invocar para responder una sola pregunta
+TOOL_CALL_BUDGET = 6
+TOP_LIMIT = 20
+TREND_MONTHS_LIMIT = 60
+
+KIND_NAMES = {"gastos": "expenses", "ingresos": "income"}
+
+_PERIOD_PROPERTIES = {
+    "desde": {"type": "string", "description": "Fecha inicial AAAA-MM-DD (opcional)"},
+    "hasta": {"type": "string", "description": "Fecha final AAAA-MM-DD o mes AAAA-MM (opcional)"},
+}
+
+TOOL_DECLARATIONS = [
+    {
+        "name": "total_por_periodo",
+        "description": "Suma y cantidad de gastos o ingresos en un rango de fechas, opcionalmente de una categoría",
+        "parameters": {"type": "object", "properties": {
+            "tipo": {"type": "string", "enum": ["gastos", "ingresos"]},
+            **_PERIOD_PROPERTIES,
+            "categoria": {"type": "string", "description": "Categoría exacta (opcional)"},
+        }, "required": ["tipo"]},
+    },
+    {
+        "name": "gastos_por_categoria",
+        "description": "Total de gastos de cada categoría en un rango de fechas",
+        "parameters": {"type": "object", "properties": dict(_PERIOD_PROPERTIES)},
+    },
+    {
+        "name": "top_gastos",
+        "description": f"Los n gastos más grandes (máximo {TOP_LIMIT}) en un rango de fechas, opcionalmente de una categoría",
+        "parameters": {"type": "object", "properties": {
+            "n": {"type": "integer"},
+            **_PERIOD_PROPERTIES,
+            "categoria": {"type": "string"},
+        }},
+    },
+    {
+        "name": "tendencia_mensual",
+        "description": "Total mensual de gastos o ingresos de los últimos meses (incluye el mes actual)",
+        "parameters": {"type": "object", "properties": {
+            "meses": {"type": "integer", "description": f"Cantidad de meses, por defecto 6 (máximo {TREND_MONTHS_LIMIT})"},
+            "tipo": {"type": "string", "enum": ["gastos", "ingresos"]},
+            "categoria": {"type": "string", "description": "Categoría de gasto o de ingreso según tipo (opcional)"},
+        }},
+    },
+    {
+        "name": "buscar_movimientos",
+        "description": "Movimientos cuya descripción coincide con un texto (p. ej. 'cine', 'uber'), con su total",
+        "parameters": {"type": "object", "properties": {
+            "texto": {"type": "string"},
+            **_PERIOD_PROPERTIES,
+        }, "required": ["texto"]},
+    },
+]
+
+
+def _period_end(end: Optional[str]) -> Optional[str]:
+    """Un límite superior "AAAA-MM" incluye todo el mes ("2026-10" < "2026-10-05" al comparar fechas)"""
+    if end and len(end) == 7:
+        year, month = int(end[:4]), int(end[5:])
+        return f"{end}-{calendar.monthrange(year, month)[1]:02d}"
+    return end
+
+
+class LedgerTools:
+    """Ejecuta las funciones declaradas sobre el libro; índices y resultados se cachean por versión de los datos"""
+
+    def __init__(self, ai):
+        self.ai = ai
+        self.version = None
+        # (tipo, categoría o None) -> (fechas ordenadas, sumas acumuladas, movimientos en el mismo orden)
+        self.series: Dict[Tuple[str, Optional[str]], Tuple[List[str], List[float], List[Dict]]] = {}
+        self.results: Dict[Tuple, Dict] = {}
+
+    def _refresh(self):
+        if self.version == self.ai.data_version:
+            return
+        self.series = {}
+        for kind in ("income", "expenses"):
+            entries = sorted(self.ai.data[kind], key=lambda x: x["date"])
+            groups: Dict[Optional[str], List[Dict]] = {None: entries}
+            for entry in entries:
+                groups.setdefault(entry["category"], []).append(entry)
+            for category, items in groups.items():
+                self.series[(kind, category)] = (
+                    [item["date"] for item in items],
+                    [0.0] + list(accumulate(item["amount"] for item in items)),
+                    items
+                )
+        self.results = {}
+        self.version = self.ai.data_version
+
+    def _range(self, kind: str, category: Optional[str], start: Optional[str], end: Optional[str]) -> Tuple[int, int, Tuple]:
+        """Posiciones [i, j) de los movimientos dentro del rango, por búsqueda binaria"""
+        series = self.series.get((kind, category), ([], [0.0], []))
+        dates = series[0]
+        end = _period_end(end)
+        i = bisect_left(dates, start) if start else 0
+        j = bisect_right(dates, end) if end else len(dates)
+        return i, max(i, j), series
+
+    def execute(self, name: str, args: Dict) -> Dict:
+        """Ejecuta una función por nombre; los errores se devuelven al modelo en lugar de lanzarse"""
+        self._refresh()
+        key = (name, tuple(sorted((k, str(v)) for k, v in args.items())))
+        if key not in self.results:
+            method = getattr(self, f"_tool_{name}", None)
+            if method is None:
+                return {"error": f"Función desconocida: {name}"}
+            try:
+                self.results[key] = method(**args)
+            except (TypeError, ValueError, KeyError) as e:
+                return {"error": f"Argumentos inválidos para {name}: {e}"}
+        return self.results[key]
+
+    def _tool_total_por_periodo(self, tipo: str, desde: Optional[str] = None, hasta: Optional[str] = None,
+                                categoria: Optional[str] = None) -> Dict:
+        i, j, (_, sums, _) = self._range(KIND_NAMES[tipo], categoria, desde, hasta)
+        return {"tipo": tipo, "categoria": categoria or "todas", "desde": desde or "inicio", "hasta": hasta or "hoy",
+                "total": round(sums[j] - sums[i], 2), "cantidad": j - i}
+
+    def _tool_gastos_por_categoria(self, desde: Optional[str] = None, hasta: Optional[str] = None) -> Dict:
+        totals = {}
+        for (kind, category) in self.series:
+            if kind == "expenses" and category is not None:
+                i, j, (_, sums, _) = self._range(kind, category, desde, hasta)
+                if j > i:
+                    totals[category] = round(sums[j] - sums[i], 2)
+        return {"desde": desde or "inicio", "hasta": hasta or "hoy",
+                "categorias": dict(sorted(totals.items(), key=lambda x: x[1], reverse=True))}
+
+    def _tool_top_gastos(self, n: int = 5, desde: Optional[str] = None, hasta: Optional[str] = None,
+                         categoria: Optional[str] = None) -> Dict:
+        i, j, (_, _, items) = self._range("expenses", categoria, desde, hasta)
+        top = heapq.nlargest(min(int(n), TOP_LIMIT), items[i:j], key=lambda x: x["amount"])
+        return {"gastos": [{"fecha": item["date"], "descripcion": item["description"], "monto": item["amount"],
+                            "categoria": item["category"]} for item in top]}
+
+    def _tool_tendencia_mensual(self, meses: int = 6, tipo: str = "gastos", categoria: Optional[str] = None) -> Dict:
+        today = date.today()
+        trend = []
+        for offset in range(min(max(int(meses), 1), TREND_MONTHS_LIMIT) - 1, -1, -1):
+            month_index = today.month - 1 - offset
+            month = f"{today.year + month_index // 12}-{month_index % 12 + 1:02d}"
+            period = self.ai.monthly_aggregates.get(month)
+            if not period:
+                total = 0.0
+            elif categoria and tipo == "ingresos":
+                # Los agregados solo guardan categorías de gastos: los ingresos se suman desde la serie
+                i, j, (_, sums, _) = self._range("income", categoria, month, month)
+                total = sums[j] - sums[i]
+            elif categoria:
+                total = period["categories"].get(categoria, 0.0)
+            else:
+                total = period[KIND_NAMES[tipo]]
+            trend.append({"mes": month, "total": round(total, 2)})
+        return {"tipo": tipo, "categoria": categoria or "todas", "meses": trend}
+
+    def _tool_buscar_movimientos(self, texto: str, desde: Optional[str] = None, hasta: Optional[str] = None) -> Dict:
+        matches = self.ai.transaction_index.search(texto, desde, _period_end(hasta))
+        totals = {"gastos": 0.0, "ingresos": 0.0}
+        for _, kind, entry in matches:
+            totals["gastos" if kind == "expenses" else "ingresos"] += entry["amount"]
+        return {
+            "coincidencias": len(matches),
+            "total_gastos": round(totals["gastos"], 2),
+            "total_ingresos": round(totals["ingresos"], 2),
+            "detalle": [{"fecha": entry["date"], "descripcion": entry.get("description") or entry.get("source"),
+                         "monto": entry["amount"], "categoria": entry["category"],
+                         "tipo": "gasto" if kind == "expenses" else "ingreso"}
+                        for _, kind, entry in matches[:TOP_LIMIT]]
+        }